@@ -0,0 +1,144 @@
+"""
+Agent Bulk API - importação e exportação de agentes em lote (JSON/CSV)
+
+Onboarding de clientes com centenas de agentes:
+- Tudo é validado antes de gravar (AgentCreate por linha); qualquer erro
+  devolve 422 com a lista completa e nada é inserido
+- Slugs de todo o lote com uma consulta (allocate_slugs)
+- Um INSERT multi-linha, numa transação; slug tomado por um create
+  concorrente entre a alocação e o INSERT -> 409, basta repetir
+
+O formato de exportação é o mesmo aceito pela importação.
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from pydantic import ValidationError
+from typing import Dict, List, Literal
+import csv
+import io
+import os
+
+from app.api.agents import AgentCreate, agent_values, allocate_slugs
+from app.core.database import get_db, get_read_db
+from app.core.replicas import mark_written
+from app.core.serialization import FastJSONResponse, loads
+from app.models import Agent
+
+router = APIRouter()
+
+AGENT_IMPORT_MAX_ROWS = int(os.getenv("AGENT_IMPORT_MAX_ROWS", "1000"))
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_FIELDS = ["slug"] + list(AgentCreate.model_fields)
+
+def _parse_rows(body: bytes, content_type: str) -> List[Dict]:
+    if "csv" in content_type:
+        try:
+            reader = csv.DictReader(io.StringIO(body.decode("utf-8-sig")))
+            # Célula vazia = campo omitido (vale o default de AgentCreate)
+            return [{k: v for k, v in row.items() if k and v not in (None, "")} for row in reader]
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise HTTPException(status_code=400, detail=f"CSV inválido: {e}")
+
+    try:
+        data = loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"JSON inválido: {e}")
+    if isinstance(data, dict):
+        data = data.get("agents")
+    if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
+        raise HTTPException(status_code=400, detail="Esperado uma lista de agentes (ou {\"agents\": [...]})")
+    return data
+
+def _validate(rows: List[Dict]) -> List[AgentCreate]:
+    agents, errors = [], []
+    for index, row in enumerate(rows):
+        try:
+            agents.append(AgentCreate.model_validate(row))
+        except ValidationError as e:
+            errors.append({
+                "row": index,
+                "errors": [
+                    {"field": ".".join(str(part) for part in err["loc"]), "message": err["msg"]}
+                    for err in e.errors()
+                ]
+            })
+    if errors:
+        raise HTTPException(status_code=422, detail={"message": "Nenhum agente importado", "rows": errors})
+    return agents
+
+@router.post("/agents/bulk/import")
+async def import_agents(
+    request: Request,
+    dry_run: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Cria agentes em lote a partir de JSON (lista) ou CSV (Content-Type text/csv)
+
+    Colunas/campos: os de POST /api/agents; `slug` é sempre gerado a partir
+    do nome. `dry_run=true` valida e mostra os slugs sem gravar.
+    """
+    rows = _parse_rows(await request.body(), request.headers.get("content-type", ""))
+    if not rows:
+        raise HTTPException(status_code=400, detail="Nenhum agente enviado")
+    if len(rows) > AGENT_IMPORT_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"Máximo de {AGENT_IMPORT_MAX_ROWS} agentes por importação")
+
+    agents = _validate(rows)
+    slugs = allocate_slugs(db, [agent.name for agent in agents])
+
+    if dry_run:
+        db.rollback()
+        return FastJSONResponse({"dry_run": True, "count": len(agents), "slugs": slugs})
+
+    values = [agent_values(agent, slug) for agent, slug in zip(agents, slugs)]
+    try:
+        created = db.execute(insert(Agent).returning(Agent.id, Agent.slug), values).fetchall()
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Slug criado em paralelo durante a importação; tente novamente")
+
+    mark_written("agents", *[f"agent:{row.id}" for row in created], *[f"agent:{row.slug}" for row in created])
+
+    return FastJSONResponse({
+        "count": len(created),
+        "agents": [{"id": row.id, "slug": row.slug} for row in created]
+    })
+
+@router.get("/agents/bulk/export")
+async def export_agents(
+    format: Literal["json", "csv"] = "json",
+    include_inactive: bool = Query(default=False),
+    db: Session = Depends(get_read_db)
+):
+    """Agentes (não apagados) com os campos da importação, em JSON ou CSV"""
+    query = db.query(*[getattr(Agent, name) for name in EXPORT_FIELDS]).filter(Agent.deleted_at.is_(None))
+    if not include_inactive:
+        query = query.filter(Agent.is_active == True)
+    query = query.order_by(Agent.created_at, Agent.id)
+
+    if format == "json":
+        return FastJSONResponse([{name: getattr(row, name) for name in EXPORT_FIELDS} for row in query])
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        for row in query.yield_per(EXPORT_BATCH_SIZE):
+            writer.writerow({name: getattr(row, name) for name in EXPORT_FIELDS})
+            if buffer.tell() > 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="agents.csv"'}
+    )
@@ -0,0 +1,76 @@
+"""
+Agent Conversations API - navegador de conversas do admin
+
+Uma única consulta em conversations por página: quantidade de mensagens,
+última atividade, tokens e custo vêm dos contadores mantidos na própria
+conversa (ConversationService.add_message; backfill em
+app.core.conversation_counters), sem COUNT/SUM em messages por conversa.
+
+Ordem: última atividade (COALESCE(last_message_at, created_at)) DESC, com
+cursor (atividade, id) servido pelo índice idx_conversations_agent_activity.
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import Optional
+import uuid
+
+from app.core.database import read_db_for
+from app.core.pagination import apply_keyset, decode_cursor, parse_fields, split_page
+from app.core.serialization import FastJSONResponse
+from app.models import Agent, Conversation, ConversationStatus
+
+router = APIRouter()
+
+last_activity = func.coalesce(Conversation.last_message_at, Conversation.created_at).label("last_activity_at")
+
+CONVERSATION_COLUMNS = {
+    "id": Conversation.id,
+    "user_identifier": Conversation.user_identifier,
+    "channel": Conversation.channel,
+    "status": Conversation.status,
+    "message_count": Conversation.message_count,
+    "total_tokens": Conversation.total_tokens,
+    "total_cost": Conversation.total_cost,
+    "created_at": Conversation.created_at,
+    "last_activity_at": last_activity
+}
+
+CONVERSATION_LIST_FIELDS = list(CONVERSATION_COLUMNS)
+
+@router.get("/agents/{agent_id}/conversations")
+async def list_agent_conversations(
+    agent_id: uuid.UUID,
+    channel: Optional[str] = None,
+    status: Optional[ConversationStatus] = None,
+    limit: int = Query(default=50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(read_db_for(lambda request: f"agent:{request.path_params['agent_id']}"))
+):
+    """
+    Conversas do agente, mais recentes (por atividade) primeiro
+
+    - Filtros: `channel`, `status` (active/paused/closed)
+    - `fields=id,message_count,total_cost` seleciona colunas
+    - Próxima página no header `X-Next-Cursor`
+    """
+    if not db.query(Agent.id).filter(Agent.id == agent_id).first():
+        raise HTTPException(status_code=404, detail="Agente não encontrado")
+
+    selected = parse_fields(fields, CONVERSATION_LIST_FIELDS)
+    columns = list(dict.fromkeys(selected + ["id", "last_activity_at"]))
+
+    query = db.query(*[CONVERSATION_COLUMNS[name] for name in columns]).filter(Conversation.agent_id == agent_id)
+    if channel is not None:
+        query = query.filter(Conversation.channel == channel)
+    if status is not None:
+        query = query.filter(Conversation.status == status)
+
+    rows = apply_keyset(query, last_activity, Conversation.id, decode_cursor(cursor), limit).all()
+    page, next_cursor = split_page(rows, limit, created_attr="last_activity_at")
+
+    items = [{name: getattr(row, name) for name in selected} for row in page]
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+
+    return FastJSONResponse(items, headers=headers)
@@ -1,13 +1,17 @@
 """Agents API"""
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
+from sqlalchemy import text
 from pydantic import BaseModel, ConfigDict, Field
-from typing import List, Optional
+from typing import List, Optional, Sequence
 from datetime import datetime
 import uuid
 import re
 
 from app.core.database import get_db
+from app.core.http_cache import public_agent_cache
+from app.core.replicas import mark_written
+from app.core.serialization import FastJSONResponse, row_to_dict
 from app.models import Agent, AgentStatus
 
 router = APIRouter()
@@ -50,6 +54,9 @@ class AgentUpdate(BaseModel):
     input_placeholder: Optional[str] = None
     is_active: Optional[bool] = None
     allow_public_access: Optional[bool] = None
+    hedging_enabled: Optional[bool] = None
+    hedging_fallback_model: Optional[str] = None
+    idle_timeout_minutes: Optional[int] = Field(default=None, ge=0)
 
 class AgentResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
@@ -74,6 +81,9 @@ class AgentResponse(BaseModel):
     rag_enabled: bool
     whatsapp_enabled: bool
     email_enabled: bool
+    hedging_enabled: bool = False
+    hedging_fallback_model: Optional[str] = None
+    idle_timeout_minutes: Optional[int] = None
     status: str
     created_at: datetime
     updated_at: datetime
@@ -93,6 +103,8 @@ class PublicAgentResponse(BaseModel):
     meta_description: Optional[str]
     og_image_url: Optional[str]
 
+AGENT_LIST_FIELDS = list(AgentResponse.model_fields)
+
 @router.get("/agents", response_model=List[AgentResponse])
 async def list_agents(db: Session = Depends(get_db)):
     agents = db.query(Agent).all()
@@ -107,42 +119,59 @@ async def get_agent(agent_id: uuid.UUID, db: Session = Depends(get_db)):
     
     return agent
 
+def allocate_slugs(db: Session, names: Sequence[str]) -> List[str]:
+    """
+    Slugs únicos para `names`, na ordem, com uma consulta só
+
+    Busca de uma vez os slugs existentes com os mesmos prefixos
+    (base ou base-N, incluindo agentes em soft-delete) e escolhe em memória
+    o primeiro livre: base, base-1, base-2... Nomes repetidos no mesmo lote
+    recebem slugs distintos.
+    """
+    bases = [generate_slug(name) for name in names]
+    unique_bases = list(dict.fromkeys(bases))
+    
+    patterns = [re.sub(r"([\\%_])", r"\\\1", base) + "-%" for base in unique_bases]
+    rows = db.execute(
+        text("SELECT slug FROM agents WHERE slug = ANY(:bases) OR slug LIKE ANY(:patterns)"),
+        {"bases": unique_bases, "patterns": patterns}
+    ).fetchall()
+    taken = {row.slug for row in rows}
+    
+    slugs = []
+    for base in bases:
+        slug = base
+        counter = 1
+        while slug in taken:
+            slug = f"{base}-{counter}"
+            counter += 1
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+def agent_values(agent_data: AgentCreate, slug: str) -> dict:
+    """Colunas de um agente novo (create_agent e importação em lote)"""
+    return {
+        **agent_data.model_dump(),
+        "slug": slug,
+        "status": AgentStatus.active,
+        "is_active": True,
+        "allow_public_access": True
+    }
+
 @router.post("/agents", response_model=AgentResponse)
 async def create_agent(agent_data: AgentCreate, db: Session = Depends(get_db)):
     # Gera slug único
-    base_slug = generate_slug(agent_data.name)
-    slug = base_slug
-    counter = 1
-    
-    while db.query(Agent).filter(Agent.slug == slug).first():
-        slug = f"{base_slug}-{counter}"
-        counter += 1
-    
-    agent = Agent(
-        slug=slug,
-        name=agent_data.name,
-        description=agent_data.description,
-        avatar_url=agent_data.avatar_url,
-        system_prompt=agent_data.system_prompt,
-        model=agent_data.model,
-        temperature=agent_data.temperature,
-        max_tokens=agent_data.max_tokens,
-        top_p=agent_data.top_p,
-        frequency_penalty=agent_data.frequency_penalty,
-        presence_penalty=agent_data.presence_penalty,
-        brand_color=agent_data.brand_color,
-        welcome_message=agent_data.welcome_message,
-        input_placeholder=agent_data.input_placeholder,
-        status=AgentStatus.active,
-        is_active=True,
-        allow_public_access=True
-    )
+    slug = allocate_slugs(db, [agent_data.name])[0]
+    agent = Agent(**agent_values(agent_data, slug))
     
     db.add(agent)
     db.commit()
     db.refresh(agent)
     
-    return agent
+    mark_written("agents", f"agent:{agent.id}", f"agent:{agent.slug}")
+    
+    return FastJSONResponse(row_to_dict(agent, AGENT_LIST_FIELDS))
 
 @router.put("/agents/{agent_id}", response_model=AgentResponse)
 async def update_agent(
@@ -157,6 +186,7 @@ async def update_agent(
     
     # Atualiza apenas campos fornecidos
     update_data = agent_data.model_dump(exclude_unset=True)
+    previous_slug = agent.slug
     
     # Se nome mudou, atualiza slug
     if "name" in update_data and update_data["name"] != agent.name:
@@ -176,7 +206,11 @@ async def update_agent(
     db.commit()
     db.refresh(agent)
     
-    return agent
+    public_agent_cache.invalidate_tag(previous_slug)
+    public_agent_cache.invalidate_tag(agent.slug)
+    mark_written("agents", f"agent:{agent.id}", f"agent:{previous_slug}", f"agent:{agent.slug}")
+    
+    return FastJSONResponse(row_to_dict(agent, AGENT_LIST_FIELDS))
 
 @router.delete("/agents/{agent_id}")
 async def delete_agent(agent_id: uuid.UUID, db: Session = Depends(get_db)):
@@ -185,10 +219,14 @@ async def delete_agent(agent_id: uuid.UUID, db: Session = Depends(get_db)):
     if not agent:
         raise HTTPException(status_code=404, detail="Agente não encontrado")
     
-    # Soft delete
+    # Soft delete (purge definitivo após PURGE_AGENT_GRACE_DAYS)
     agent.is_active = False
     agent.status = AgentStatus.archived
+    agent.deleted_at = datetime.utcnow()
     
     db.commit()
     
+    public_agent_cache.invalidate_tag(agent.slug)
+    mark_written("agents", f"agent:{agent.id}", f"agent:{agent.slug}")
+    
     return {"message": "Agente desativado com sucesso", "agent_id": str(agent_id)}
@@ -0,0 +1,92 @@
+"""
+Analytics API - uso de LLM por agente, dia e modelo
+
+Agrega as colunas tipadas de messages (app.core.message_usage) só das
+respostas do assistente; o índice de cobertura idx_messages_agent_usage
+atende o filtro por agente/período com index-only scan, e o filtro em
+created_at limita as partições lidas.
+"""
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from datetime import datetime
+from typing import Optional
+import uuid
+
+from app.core.database import get_read_db
+from app.core.periods import resolve_period
+
+router = APIRouter()
+
+MAX_USAGE_DAYS = 366
+
+USAGE_SQL = """
+    SELECT
+        agent_id,
+        CAST(date_trunc('day', created_at) AS DATE) AS day,
+        model,
+        COUNT(*) AS responses,
+        COALESCE(SUM(input_tokens), 0) AS input_tokens,
+        COALESCE(SUM(output_tokens), 0) AS output_tokens,
+        COALESCE(SUM(cached_tokens), 0) AS cached_tokens,
+        COALESCE(SUM(cost), 0) AS cost,
+        AVG(ttft_ms) AS avg_ttft_ms
+    FROM messages
+    WHERE role = 'assistant'
+      AND created_at >= :start AND created_at < :end
+      {agent_filter}
+    GROUP BY 1, 2, 3
+    ORDER BY 2, 1, 3
+"""
+
+@router.get("/analytics/usage")
+async def get_usage(
+    agent_id: Optional[uuid.UUID] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    days: int = Query(default=7, ge=1, le=MAX_USAGE_DAYS),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Tokens, custo e TTFT médio por dia/agente/modelo
+
+    Período: [start, end) em UTC ou os últimos `days` dias até agora.
+    """
+    start, end = resolve_period(start, end, days, MAX_USAGE_DAYS)
+
+    params = {"start": start, "end": end}
+    agent_filter = ""
+    if agent_id is not None:
+        agent_filter = "AND agent_id = :agent_id"
+        params["agent_id"] = agent_id
+
+    rows = db.execute(text(USAGE_SQL.format(agent_filter=agent_filter)), params).fetchall()
+
+    usage = [
+        {
+            "agent_id": str(row.agent_id) if row.agent_id else None,
+            "day": row.day.isoformat(),
+            "model": row.model,
+            "responses": row.responses,
+            "input_tokens": int(row.input_tokens),
+            "output_tokens": int(row.output_tokens),
+            "cached_tokens": int(row.cached_tokens),
+            "cost": round(float(row.cost), 6),
+            "avg_ttft_ms": round(float(row.avg_ttft_ms), 1) if row.avg_ttft_ms is not None else None
+        }
+        for row in rows
+    ]
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "agent_id": str(agent_id) if agent_id else None,
+        "totals": {
+            "responses": sum(r["responses"] for r in usage),
+            "input_tokens": sum(r["input_tokens"] for r in usage),
+            "output_tokens": sum(r["output_tokens"] for r in usage),
+            "cached_tokens": sum(r["cached_tokens"] for r in usage),
+            "cost": round(sum(r["cost"] for r in usage), 6)
+        },
+        "usage": usage
+    }
@@ -5,6 +5,7 @@ from pydantic import BaseModel
 import uuid
 
 from app.core.database import get_db
+from app.core.serialization import FastJSONResponse
 from app.services.conversation_service import ConversationService
 
 router = APIRouter()
@@ -36,7 +37,8 @@ async def send_message(
             channel=request.channel
         )
         
-        return ChatResponse(**result)
+        # result já tem exatamente os campos de ChatResponse
+        return FastJSONResponse(result)
         
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
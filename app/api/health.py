@@ -1,51 +1,49 @@
-"""Health Check API"""
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import text
-import os
+"""
+Health Check API
 
-from app.core.database import get_db
+- /health/live: processo de pé (liveness); nunca depende de banco ou LLM
+- /health/ready: pool com conexão livre, última checagem de banco recente
+  e cliente LLM inicializado; 503 se algo falhar (tira a réplica do balanceador)
+- /health/db: estado do banco e tamanho das tabelas por estimativa
+  (pg_class.reltuples, atualizado pelo job "db_health")
+
+Nenhum probe executa SQL: tudo vem de app.core.health.
+"""
+from fastapi import APIRouter
+
+from app.core import health
+from app.core.serialization import FastJSONResponse
+from app.services.llm_service import llm_client_ready
 
 router = APIRouter()
 
+VERSION = "3.0.0-FIXED"
+
 @router.get("/health")
-async def health_check(db: Session = Depends(get_db)):
-    try:
-        db.execute(text("SELECT 1"))
-        db_status = "healthy"
-    except Exception as e:
-        db_status = f"unhealthy: {str(e)}"
-    
-    openai_configured = bool(os.getenv("OPENAI_API_KEY"))
-    
-    return {
-        "status": "online",
-        "database": db_status,
-        "openai_configured": openai_configured,
-        "version": "3.0.0"
+@router.get("/health/live")
+async def liveness():
+    return {"status": "ok", "version": VERSION}
+
+@router.get("/health/ready")
+async def readiness():
+    checks = {
+        "database": health.db_status(),
+        "pool": health.pool_status(),
+        "llm_client": {"ok": llm_client_ready()}
     }
+    ready = checks["database"]["ok"] and checks["pool"]["available"] and checks["llm_client"]["ok"]
+
+    return FastJSONResponse(
+        {"status": "ready" if ready else "not_ready", "checks": checks},
+        status_code=200 if ready else 503
+    )
 
 @router.get("/health/db")
-async def database_health(db: Session = Depends(get_db)):
-    try:
-        result = db.execute(text("SELECT COUNT(*) FROM agents"))
-        agent_count = result.fetchone()[0]
-        
-        result = db.execute(text("SELECT COUNT(*) FROM conversations"))
-        conversation_count = result.fetchone()[0]
-        
-        result = db.execute(text("SELECT COUNT(*) FROM messages"))
-        message_count = result.fetchone()[0]
-        
-        return {
-            "status": "healthy",
-            "agents": agent_count,
-            "conversations": conversation_count,
-            "messages": message_count
-        }
-        
-    except Exception as e:
-        return {
-            "status": "unhealthy",
-            "error": str(e)
-        }
+async def database_health():
+    db = health.db_status()
+    return {
+        "status": "healthy" if db["ok"] else "unhealthy",
+        "database": db,
+        "pool": health.pool_status(),
+        **health.table_estimates()
+    }
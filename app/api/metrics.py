@@ -0,0 +1,37 @@
+"""
+Metrics API
+
+GET /metrics exige `Authorization: Bearer <METRICS_TOKEN>` (no Prometheus:
+`authorization: {credentials: ...}` no scrape_config). Sem METRICS_TOKEN
+configurado o endpoint fica fechado: os contadores expõem agentes, modelos
+e volume de uso.
+"""
+import hmac
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from app.core import metrics
+from app.core.serialization import FastJSONResponse
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+router = APIRouter()
+
+def require_metrics_token(authorization: Optional[str] = Header(default=None)):
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=403, detail="Métricas desabilitadas: defina METRICS_TOKEN")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Token de métricas inválido", headers={"WWW-Authenticate": "Bearer"})
+
+@router.get("/metrics", dependencies=[Depends(require_metrics_token)])
+async def get_metrics(format: str = "prometheus"):
+    data = metrics.collect()
+
+    if format == "json":
+        return FastJSONResponse(data)
+
+    return PlainTextResponse(metrics.render_prometheus(data))
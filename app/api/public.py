@@ -1,16 +1,40 @@
 """Public API - Chat sem autenticação"""
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional
+import asyncio
+import os
 import uuid
 
-from app.core.database import get_db
+from app.core import metrics
+from app.core.database import SessionLocal, get_db, read_db_for
+from app.core.http_cache import (
+    PUBLIC_AGENT_CACHE_CONTROL, cached_body_response, dump_json,
+    etag_json_response, public_agent_cache, strong_etag
+)
+from app.core.pagination import decode_cursor, encode_cursor
+from app.core.replicas import mark_written
+from app.core.serialization import dumps, loads
 from app.models import Agent
 from app.services.conversation_service import ConversationService
+from app.services.idempotency import (
+    IDEMPOTENCY_KEY_MAX_LENGTH, IdempotencyConflict, IdempotencyInProgress,
+    StoredResponse, fingerprint, idempotency_store
+)
 
 router = APIRouter()
 
+WS_HEARTBEAT_INTERVAL = float(os.getenv("WS_HEARTBEAT_INTERVAL", "25"))
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "120"))
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "30"))
+WS_PENDING_MESSAGES = int(os.getenv("WS_PENDING_MESSAGES", "4"))
+
+_ws_connections = 0
+
+metrics.register_collector(lambda: [("ws_connections_active", {}, _ws_connections)])
+
 class PublicAgentResponse(BaseModel):
     """Resposta pública (SEM system_prompt e dados sensíveis)"""
     slug: str
@@ -37,7 +61,11 @@ class PublicChatResponse(BaseModel):
     processing_time: float
 
 @router.get("/agents/{slug}", response_model=PublicAgentResponse)
-async def get_public_agent(slug: str, db: Session = Depends(get_db)):
+async def get_public_agent(
+    slug: str,
+    request: Request,
+    db: Session = Depends(read_db_for(lambda request: f"agent:{request.path_params['slug']}"))
+):
     """
     Retorna configuração pública do agente (SEM system_prompt)
     
@@ -45,15 +73,33 @@ async def get_public_agent(slug: str, db: Session = Depends(get_db)):
     - NÃO retorna system_prompt
     - NÃO retorna parâmetros internos
     - Apenas dados necessários para UI
-    """
-    agent = db.query(Agent).filter(Agent.slug == slug).first()
     
-    if not agent:
-        raise HTTPException(status_code=404, detail="Agente não encontrado")
+    Cache:
+    - Corpo pré-serializado em memória por slug (sem query no hit)
+    - ETag forte derivado de id + updated_at, 304 com If-None-Match
+    - Cache-Control com stale-while-revalidate para o widget
+    """
+    entry = public_agent_cache.get(("app", slug))
     
-    if not agent.is_active or not agent.allow_public_access:
-        raise HTTPException(status_code=404, detail="Agente não disponível")
+    if entry is None:
+        agent = db.query(Agent).filter(Agent.slug == slug).first()
+        
+        if not agent:
+            raise HTTPException(status_code=404, detail="Agente não encontrado")
+        
+        if not agent.is_active or not agent.allow_public_access:
+            raise HTTPException(status_code=404, detail="Agente não disponível")
+        
+        entry = public_agent_cache.set(
+            ("app", slug),
+            dump_json(build_public_agent_response(agent)),
+            strong_etag("app", agent.id, agent.updated_at),
+            tag=agent.slug
+        )
     
+    return cached_body_response(request, entry, PUBLIC_AGENT_CACHE_CONTROL)
+
+def build_public_agent_response(agent: Agent) -> PublicAgentResponse:
     return PublicAgentResponse(
         slug=agent.slug,
         name=agent.name,
@@ -71,7 +117,8 @@ async def get_public_agent(slug: str, db: Session = Depends(get_db)):
 async def public_chat(
     slug: str,
     request: PublicChatRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(default=None)
 ):
     """
     Endpoint público de chat (SEM autenticação)
@@ -81,6 +128,10 @@ async def public_chat(
         message: Mensagem do usuário
         session_id: UUID gerado no frontend para manter contexto
     
+    Header opcional `Idempotency-Key`: repetições com a mesma chave (retry
+    de timeout) recebem a resposta da 1ª execução, sem nova mensagem nem
+    nova chamada ao LLM (app.services.idempotency).
+    
     Returns:
         Resposta do agente + metadados
     """
@@ -93,42 +144,79 @@ async def public_chat(
     if not agent.is_active:
         raise HTTPException(status_code=403, detail="Agente não está ativo")
     
-    # Gera session_id se não existir
-    session_id = request.session_id or str(uuid.uuid4())
+    async def handle() -> StoredResponse:
+        # Gera session_id se não existir
+        session_id = request.session_id or str(uuid.uuid4())
+        
+        # Usa session_id como user_identifier para chat público
+        user_identifier = f"public_{session_id}"
+        
+        try:
+            result = await ConversationService.process_message(
+                db=db,
+                agent_id=agent.id,
+                user_identifier=user_identifier,
+                user_message=request.message,
+                channel="web"
+            )
+            mark_written(user_identifier)
+            
+            return StoredResponse(200, dumps({
+                "conversation_id": result["conversation_id"],
+                "session_id": session_id,
+                "response": result["response"],
+                "tokens": result["tokens"],
+                "cost": result["cost"],
+                "processing_time": result["processing_time"]
+            }))
+            
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Erro ao processar mensagem: {str(e)}")
     
-    # Usa session_id como user_identifier para chat público
-    user_identifier = f"public_{session_id}"
+    if not idempotency_key:
+        response = await handle()
+        return Response(content=response.body, status_code=response.status_code, media_type="application/json")
+    
+    if len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(status_code=400, detail="Idempotency-Key muito longa")
     
     try:
-        result = await ConversationService.process_message(
-            db=db,
-            agent_id=agent.id,
-            user_identifier=user_identifier,
-            user_message=request.message,
-            channel="web"
+        response, replayed = await idempotency_store.execute(
+            f"public_chat:{slug}:{idempotency_key}",
+            fingerprint(slug, request.session_id, request.message),
+            handle
         )
-        
-        return PublicChatResponse(
-            conversation_id=result["conversation_id"],
-            session_id=session_id,
-            response=result["response"],
-            tokens=result["tokens"],
-            cost=result["cost"],
-            processing_time=result["processing_time"]
-        )
-        
-    except ValueError as e:
-        raise HTTPException(status_code=404, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erro ao processar mensagem: {str(e)}")
+    except IdempotencyConflict:
+        raise HTTPException(status_code=422, detail="Idempotency-Key já usada com outra requisição")
+    except IdempotencyInProgress:
+        raise HTTPException(status_code=409, detail="Requisição com esta Idempotency-Key ainda em processamento")
+    
+    return Response(
+        content=response.body,
+        status_code=response.status_code,
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true" if replayed else "false"}
+    )
 
 @router.get("/agents/{slug}/history/{session_id}")
 async def get_public_conversation_history(
     slug: str,
     session_id: str,
-    db: Session = Depends(get_db)
+    request: Request,
+    limit: int = Query(default=50, ge=1, le=200),
+    before: Optional[str] = None,
+    db: Session = Depends(read_db_for(lambda request: f"public_{request.path_params['session_id']}"))
 ):
-    """Retorna histórico da conversa pública"""
+    """
+    Retorna histórico da conversa pública
+    
+    Paginação: `next_cursor` da resposta vai em `?before=` para buscar
+    mensagens mais antigas. Suporta `If-None-Match` (304).
+    """
+    cursor = decode_cursor(before)
+    
     agent = db.query(Agent).filter(Agent.slug == slug).first()
     
     if not agent:
@@ -138,19 +226,32 @@ async def get_public_conversation_history(
     
     from app.models import Conversation, Message
     
+    # A mais recente: depois do reaper, a mesma sessão pode ter outra conversa
     conversation = db.query(Conversation).filter(
         Conversation.agent_id == agent.id,
         Conversation.user_identifier == user_identifier
-    ).first()
+    ).order_by(Conversation.created_at.desc()).first()
     
     if not conversation:
         return {"messages": []}
     
-    messages = ConversationService.get_conversation_history(
-        db, conversation.id, limit=50
-    )
+    if cursor is None:
+        # Primeira página: janela recente do cache quando a versão confere
+        messages = ConversationService.get_recent_messages(
+            db, conversation.id, conversation.message_count, limit=limit + 1, since=conversation.created_at
+        )
+    else:
+        messages = ConversationService.get_conversation_history(
+            db, conversation.id, limit=limit + 1, since=conversation.created_at, before=cursor
+        )
+    
+    # Histórico vem em ordem cronológica: o item extra (mais antigo) fica no início
+    next_cursor = None
+    if len(messages) > limit:
+        messages = messages[1:]
+        next_cursor = encode_cursor(messages[0].created_at, messages[0].id)
     
-    return {
+    return etag_json_response(request, {
         "conversation_id": str(conversation.id),
         "messages": [
             {
@@ -159,5 +260,128 @@ async def get_public_conversation_history(
                 "created_at": msg.created_at.isoformat()
             }
             for msg in messages
-        ]
-    }
+        ],
+        "next_cursor": next_cursor
+    })
+
+@router.websocket("/agents/{slug}/ws")
+async def public_chat_ws(websocket: WebSocket, slug: str, session_id: Optional[str] = None):
+    """
+    Chat público por WebSocket (sessões longas do widget)
+    
+    Agente e conversa são resolvidos uma vez no connect e ficam no estado
+    da conexão; cada turno só grava mensagens e chama o LLM em streaming.
+    Mudanças na configuração do agente valem a partir da próxima conexão.
+    
+    Protocolo (JSON por frame):
+    - cliente: {"type": "message", "content": "..."} | {"type": "ping"} | {"type": "pong"}
+    - servidor: ready, delta, done, error, ping, pong
+    
+    Heartbeat: o servidor manda ping a cada WS_HEARTBEAT_INTERVAL e fecha a
+    conexão após WS_IDLE_TIMEOUT sem nenhum frame do cliente.
+    Backpressure: saída por fila limitada; cliente que não consome por
+    WS_SEND_TIMEOUT é desconectado. No máximo WS_PENDING_MESSAGES mensagens
+    aguardam enquanto um turno está em andamento (além disso: erro "busy").
+    """
+    global _ws_connections
+    await websocket.accept()
+    
+    db = SessionLocal()
+    try:
+        agent = db.query(Agent).filter(Agent.slug == slug).first()
+        
+        if not agent or not agent.is_active or not agent.allow_public_access:
+            await websocket.close(code=4404, reason="Agente não disponível")
+            return
+        
+        session_id = session_id or str(uuid.uuid4())
+        context = ConversationService.open_context(db, agent, f"public_{session_id}", "web")
+    finally:
+        db.close()
+    
+    outbox: asyncio.Queue = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+    inbox: asyncio.Queue = asyncio.Queue(maxsize=WS_PENDING_MESSAGES)
+    
+    async def send(event: dict):
+        await asyncio.wait_for(outbox.put(event), timeout=WS_SEND_TIMEOUT)
+    
+    async def sender():
+        while True:
+            event = await outbox.get()
+            await websocket.send_text(dumps(event).decode())
+    
+    async def receiver():
+        while True:
+            try:
+                raw = await asyncio.wait_for(websocket.receive_text(), timeout=WS_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                metrics.inc("ws_disconnects_total", reason="idle")
+                return
+            
+            try:
+                frame = loads(raw)
+                kind = frame.get("type")
+            except Exception:
+                await send({"type": "error", "detail": "Frame inválido"})
+                continue
+            
+            if kind == "ping":
+                await send({"type": "pong"})
+            elif kind == "message" and frame.get("content"):
+                try:
+                    inbox.put_nowait(frame["content"])
+                except asyncio.QueueFull:
+                    await send({"type": "error", "detail": "busy"})
+    
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(WS_HEARTBEAT_INTERVAL)
+            await send({"type": "ping"})
+    
+    async def turns():
+        while True:
+            content = await inbox.get()
+            turn_db = SessionLocal()
+            try:
+                async for event in ConversationService.stream_message(turn_db, context, content):
+                    if event["type"] == "done":
+                        event = {
+                            "type": "done",
+                            "conversation_id": event["conversation_id"],
+                            "response": event["content"],
+                            "tokens": event["tokens"],
+                            "cost": event["cost"],
+                            "processing_time": event["processing_time"]
+                        }
+                    await send(event)
+                mark_written(f"public_{session_id}")
+                metrics.inc("ws_turns_total", status="ok")
+            except asyncio.TimeoutError:
+                metrics.inc("ws_disconnects_total", reason="slow_consumer")
+                return
+            except Exception as e:
+                metrics.inc("ws_turns_total", status="error")
+                await send({"type": "error", "detail": f"Erro ao processar mensagem: {str(e)}"})
+            finally:
+                turn_db.close()
+    
+    _ws_connections += 1
+    metrics.inc("ws_connections_total")
+    tasks = [asyncio.create_task(task()) for task in (sender, receiver, heartbeat, turns)]
+    try:
+        await send({
+            "type": "ready",
+            "conversation_id": str(context.conversation_id),
+            "session_id": session_id
+        })
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        _ws_connections -= 1
+        for task in tasks:
+            task.cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        if not any(isinstance(r, WebSocketDisconnect) for r in results):
+            try:
+                await websocket.close()
+            except RuntimeError:
+                pass
@@ -0,0 +1,103 @@
+"""Replay API - avaliação de configs de agente em lote"""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+import asyncio
+import os
+
+from app.core.database import get_db
+from app.services.replay import (
+    REPLAY_CONCURRENCY, REPLAY_DIR, ReplayRunner, export_dataset, load_configs,
+    load_dataset, new_run_id, read_results, summarize, write_jsonl
+)
+
+router = APIRouter()
+
+# Execuções deste processo (as anteriores ficam só nos arquivos de resultado)
+_runs: Dict[str, ReplayRunner] = {}
+_tasks: Dict[str, asyncio.Task] = {}
+
+class ReplayRequest(BaseModel):
+    configs: List[Dict]
+    dataset: Optional[List[Dict]] = None
+    agent_id: Optional[str] = None
+    limit: int = Field(default=500, ge=1, le=10000)
+    concurrency: int = Field(default=REPLAY_CONCURRENCY, ge=1, le=64)
+    dry_run: bool = False
+    run_id: Optional[str] = Field(default=None, pattern=r"^[A-Za-z0-9_-]{1,64}$")
+
+def _paths(run_id: str):
+    return (
+        os.path.join(REPLAY_DIR, f"{run_id}.dataset.jsonl"),
+        os.path.join(REPLAY_DIR, f"{run_id}.jsonl")
+    )
+
+@router.post("/replays", status_code=202)
+async def start_replay(request: ReplayRequest, db: Session = Depends(get_db)):
+    """
+    Inicia um replay em background
+
+    Dataset: `dataset` explícito, ou exportado das mensagens de usuário
+    (`agent_id`, `limit`). Reenviar com o mesmo `run_id` retoma a execução
+    a partir do arquivo de resultados, reaproveitando o dataset salvo.
+    """
+    run_id = request.run_id or new_run_id()
+    if run_id in _runs and _runs[run_id].status == "running":
+        raise HTTPException(status_code=409, detail="Replay já em execução")
+
+    try:
+        configs = load_configs(request.configs, db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    os.makedirs(REPLAY_DIR, exist_ok=True)
+    dataset_path, results_path = _paths(run_id)
+
+    if request.dataset is not None:
+        dataset = [{"id": str(i), **item} for i, item in enumerate(request.dataset)]
+        if any(not item.get("message") for item in dataset):
+            raise HTTPException(status_code=400, detail="Item do dataset sem 'message'")
+        write_jsonl(dataset_path, dataset)
+    elif os.path.exists(dataset_path):
+        dataset = load_dataset(dataset_path)
+    else:
+        dataset = export_dataset(db, request.agent_id, request.limit)
+        write_jsonl(dataset_path, dataset)
+
+    if not dataset:
+        raise HTTPException(status_code=400, detail="Dataset vazio")
+
+    runner = ReplayRunner(configs, dataset, results_path, request.concurrency, request.dry_run)
+    _runs[run_id] = runner
+    task = asyncio.create_task(runner.run())
+    _tasks[run_id] = task
+
+    def on_done(finished: asyncio.Task):
+        _tasks.pop(run_id, None)
+        if not finished.cancelled() and finished.exception():
+            runner.status = "failed"
+            print(f"❌ Replay {run_id} falhou: {finished.exception()}")
+
+    task.add_done_callback(on_done)
+
+    return {"run_id": run_id, **runner.progress()}
+
+@router.get("/replays/{run_id}")
+async def get_replay(run_id: str):
+    """Progresso da execução e resumo por config (latência, tokens, custo)"""
+    runner = _runs.get(run_id)
+    if runner is not None:
+        if runner.status == "finished":
+            return runner.report()
+        return {"run_id": run_id, **runner.progress()}
+
+    if not run_id.replace("-", "").replace("_", "").isalnum():
+        raise HTTPException(status_code=404, detail="Replay não encontrado")
+
+    _, results_path = _paths(run_id)
+    results = read_results(results_path)
+    if not results:
+        raise HTTPException(status_code=404, detail="Replay não encontrado")
+
+    return {"run_id": run_id, "status": "stored", "results_path": results_path, "configs": summarize(results)}
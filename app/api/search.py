@@ -0,0 +1,181 @@
+"""
+Search API - busca full-text no histórico de conversas (painel de suporte)
+
+Usa messages.search_vector e o índice GIN idx_messages_search
+(app.core.message_search), nunca ILIKE em content. O período é sempre
+limitado (start/end ou últimos `days` dias), então só as partições mensais
+do período são lidas. ts_headline (caro: relê o texto) roda só nas linhas
+da página.
+
+`snippet` é HTML pronto para o painel: o conteúdo (texto livre do chat
+público) é escapado no SQL antes do ts_headline, então as únicas tags no
+resultado são os <mark> inseridos aqui.
+
+Ordenação:
+- rank (default): ts_rank DESC, depois mais recentes; cursor (rank, created_at, id)
+- recent: created_at DESC; cursor (created_at, id)
+"""
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from datetime import datetime
+from typing import Literal, Optional
+import uuid
+
+from app.core.database import get_read_db
+from app.core.message_search import SEARCH_TEXT_CONFIG
+from app.core.pagination import decode_cursor, decode_rank_cursor, encode_cursor, encode_rank_cursor
+from app.core.periods import resolve_period
+from app.core.serialization import FastJSONResponse
+from app.models import MessageRole
+
+router = APIRouter()
+
+MAX_SEARCH_DAYS = 366
+MAX_QUERY_LENGTH = 200
+HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxWords=35, MinWords=15, MaxFragments=2, FragmentDelimiter= … "
+# &, <, >, aspas -> entidades; & primeiro para não escapar duas vezes
+ESCAPED_CONTENT = (
+    "replace(replace(replace(replace(replace(m.content, '&', '&amp;'), "
+    "'<', '&lt;'), '>', '&gt;'), '\"', '&quot;'), '''', '&#39;')"
+)
+
+ORDER_BY = {
+    "rank": "rank DESC, created_at DESC, id DESC",
+    "recent": "created_at DESC, id DESC"
+}
+
+CURSOR_FILTER = {
+    "rank": "AND (rank, created_at, id) < (CAST(:cursor_rank AS real), :cursor_created_at, CAST(:cursor_id AS uuid))",
+    "recent": "AND (created_at, id) < (:cursor_created_at, CAST(:cursor_id AS uuid))"
+}
+
+SEARCH_SQL = """
+    WITH q AS (
+        SELECT websearch_to_tsquery('{config}', :q) AS query
+    ),
+    hits AS (
+        SELECT m.id, m.conversation_id, m.agent_id, m.role, m.created_at,
+               ts_rank(m.search_vector, q.query) AS rank
+        FROM messages m
+        CROSS JOIN q
+        {channel_join}
+        WHERE m.search_vector @@ q.query
+          AND m.created_at >= :start AND m.created_at < :end
+          {filters}
+    ),
+    page AS (
+        SELECT * FROM hits
+        WHERE TRUE {cursor_filter}
+        ORDER BY {order_by}
+        LIMIT :limit
+    )
+    SELECT p.id, p.conversation_id, p.agent_id, p.role, p.created_at, p.rank,
+           c.user_identifier, c.channel,
+           ts_headline('{config}', {escaped_content}, q.query, :headline_options) AS snippet
+    FROM page p
+    CROSS JOIN q
+    JOIN messages m ON m.id = p.id AND m.created_at = p.created_at
+    JOIN conversations c ON c.id = p.conversation_id
+    ORDER BY {order_by}
+"""
+
+@router.get("/search/messages")
+async def search_messages(
+    q: str = Query(..., min_length=2, max_length=MAX_QUERY_LENGTH),
+    agent_id: Optional[uuid.UUID] = None,
+    channel: Optional[str] = None,
+    role: Optional[MessageRole] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    days: int = Query(default=30, ge=1, le=MAX_SEARCH_DAYS),
+    sort: Literal["rank", "recent"] = "rank",
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Busca mensagens por texto (sintaxe de websearch: "frase exata", -termo, or)
+
+    Filtros: agent_id, channel, role e período [start, end) ou últimos `days`
+    dias. Cada resultado traz `snippet` com os termos em <mark>. Próxima
+    página em `next_cursor` (e no header `X-Next-Cursor`), com o mesmo `sort`.
+    """
+    start, end = resolve_period(start, end, days, MAX_SEARCH_DAYS)
+
+    params = {
+        "q": q,
+        "start": start,
+        "end": end,
+        "limit": limit + 1,
+        "headline_options": HEADLINE_OPTIONS
+    }
+
+    filters = []
+    if agent_id is not None:
+        filters.append("AND m.agent_id = :agent_id")
+        params["agent_id"] = agent_id
+    if role is not None:
+        filters.append("AND m.role = :role")
+        params["role"] = role.value
+
+    channel_join = ""
+    if channel is not None:
+        channel_join = "JOIN conversations fc ON fc.id = m.conversation_id AND fc.channel = :channel"
+        params["channel"] = channel
+
+    cursor_filter = ""
+    if sort == "rank":
+        decoded = decode_rank_cursor(cursor)
+        if decoded is not None:
+            params["cursor_rank"], params["cursor_created_at"], params["cursor_id"] = decoded
+            cursor_filter = CURSOR_FILTER["rank"]
+    else:
+        decoded = decode_cursor(cursor)
+        if decoded is not None:
+            params["cursor_created_at"], params["cursor_id"] = decoded
+            cursor_filter = CURSOR_FILTER["recent"]
+
+    sql = SEARCH_SQL.format(
+        config=SEARCH_TEXT_CONFIG,
+        channel_join=channel_join,
+        filters="\n          ".join(filters),
+        cursor_filter=cursor_filter,
+        order_by=ORDER_BY[sort],
+        escaped_content=ESCAPED_CONTENT
+    )
+    rows = db.execute(text(sql), params).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if sort == "rank":
+            next_cursor = encode_rank_cursor(last.rank, last.created_at, last.id)
+        else:
+            next_cursor = encode_cursor(last.created_at, last.id)
+
+    results = [
+        {
+            "message_id": row.id,
+            "conversation_id": row.conversation_id,
+            "agent_id": row.agent_id,
+            "role": row.role,
+            "user_identifier": row.user_identifier,
+            "channel": row.channel,
+            "created_at": row.created_at,
+            "rank": round(float(row.rank), 6),
+            "snippet": row.snippet
+        }
+        for row in rows
+    ]
+
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return FastJSONResponse({
+        "query": q,
+        "sort": sort,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "results": results,
+        "next_cursor": next_cursor
+    }, headers=headers)
@@ -0,0 +1,50 @@
+"""WhatsApp Webhook API"""
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+from app.core.serialization import FastJSONResponse, loads
+from app.services.whatsapp_service import (
+    WHATSAPP_VERIFY_TOKEN, QueueFullError, parse_webhook,
+    verify_signature, whatsapp_dispatcher
+)
+
+router = APIRouter()
+
+@router.get("/webhooks/whatsapp")
+async def verify_webhook(request: Request):
+    """Handshake de verificação do provedor (hub.challenge)"""
+    params = request.query_params
+    
+    if (
+        params.get("hub.mode") == "subscribe"
+        and WHATSAPP_VERIFY_TOKEN
+        and params.get("hub.verify_token") == WHATSAPP_VERIFY_TOKEN
+    ):
+        return PlainTextResponse(params.get("hub.challenge", ""))
+    
+    raise HTTPException(status_code=403, detail="Token de verificação inválido")
+
+@router.post("/webhooks/whatsapp")
+async def receive_webhook(request: Request):
+    """
+    Recebe mensagens do WhatsApp
+    
+    Só valida, deduplica e enfileira: o processamento (LLM + resposta)
+    acontece nos workers, então o ACK volta em milissegundos.
+    """
+    body = await request.body()
+    
+    if not verify_signature(body, request.headers.get("x-hub-signature-256")):
+        raise HTTPException(status_code=401, detail="Assinatura inválida")
+    
+    try:
+        payload = loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="JSON inválido")
+    
+    try:
+        result = whatsapp_dispatcher.enqueue(parse_webhook(payload))
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    
+    return FastJSONResponse({"status": "accepted", **result})
@@ -0,0 +1,82 @@
+"""
+Contadores por conversa (message_count, last_message_at, total_tokens, total_cost)
+
+A listagem de conversas do admin lê message_count, last_message_at e os
+totais direto de conversations, sem agregar messages por conversa. Novas
+mensagens atualizam os contadores em ConversationService.add_message;
+conversas anteriores às colunas são preenchidas por este backfill - rode-o
+depois do deploy: purge e reaper também dependem de last_message_at.
+
+Backfill em lotes por id (keyset): cada lote trava as conversas
+(FOR UPDATE) antes de somar as mensagens, então um add_message concorrente
+espera e soma por cima do valor recalculado, sem perder incremento.
+Mensagens removidas depois pela retenção não reduzem os totais, e
+message_count nunca diminui (GREATEST): é a versão das janelas em cache
+(app.services.conversation_cache) e precisa ser monotônica.
+
+Uso manual:
+    python -m app.core.conversation_counters [batch_size]
+"""
+import os
+import sys
+import time
+from typing import Dict
+
+from sqlalchemy import text
+
+COUNTERS_BATCH_SIZE = int(os.getenv("CONVERSATION_COUNTERS_BATCH_SIZE", "500"))
+COUNTERS_PAUSE = float(os.getenv("CONVERSATION_COUNTERS_PAUSE", "0.05"))
+
+LOCK_SQL = text("""
+    SELECT id FROM conversations
+    WHERE id > :last
+    ORDER BY id
+    LIMIT :batch_size
+    FOR UPDATE
+""")
+
+UPDATE_SQL = text("""
+    UPDATE conversations c SET
+        total_tokens = COALESCE(s.tokens, 0),
+        total_cost = COALESCE(s.cost, 0),
+        message_count = GREATEST(c.message_count, s.messages),
+        last_message_at = GREATEST(c.last_message_at, s.last_message_at)
+    FROM (
+        SELECT conversation_id, SUM(tokens) AS tokens, SUM(cost) AS cost,
+               COUNT(*) AS messages, MAX(created_at) AS last_message_at
+        FROM messages
+        WHERE conversation_id = ANY(CAST(:ids AS uuid[]))
+        GROUP BY conversation_id
+    ) s
+    WHERE c.id = s.conversation_id
+""")
+
+def backfill_counters(engine, batch_size: int = COUNTERS_BATCH_SIZE, pause: float = COUNTERS_PAUSE) -> Dict:
+    start = time.time()
+    scanned = updated = 0
+    last = "00000000-0000-0000-0000-000000000000"
+    with engine.connect() as conn:
+        while True:
+            ids = [str(row[0]) for row in conn.execute(LOCK_SQL, {"last": last, "batch_size": batch_size})]
+            if not ids:
+                conn.commit()
+                break
+            updated += conn.execute(UPDATE_SQL, {"ids": ids}).rowcount
+            conn.commit()
+            scanned += len(ids)
+            last = ids[-1]
+            if len(ids) < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+    return {
+        "scanned": scanned,
+        "updated": updated,
+        "duration": round(time.time() - start, 3)
+    }
+
+if __name__ == "__main__":
+    from app.core.database import migration_engine
+
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else COUNTERS_BATCH_SIZE
+    print(backfill_counters(migration_engine(), size))
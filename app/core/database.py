@@ -6,6 +6,18 @@ import sys
 from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from fastapi import Request
+from typing import Callable
+
+from app.core.message_usage import USAGE_COLUMNS, ensure_parent_index
+from app.core.message_search import SEARCH_COLUMNS, ensure_search_parent_index, ensure_search_trigger
+from app.core.pooling import engine_kwargs, is_pgbouncer, migration_url
+from app.core.replicas import read_session
+from app.core.partitions import (
+    AUTO_PARTITION, messages_table_exists, is_messages_partitioned,
+    create_partitioned_messages_table, ensure_message_partitions, run_migration_partitioning
+)
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
@@ -13,10 +25,39 @@ if not DATABASE_URL:
     print("❌ DATABASE_URL não configurada!")
     sys.exit(1)
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+engine = create_engine(DATABASE_URL, **engine_kwargs())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+_migration_engine = None
+
+def migration_engine():
+    """
+    Engine para DDL/migrations/COPY: conexão direta no Postgres
+    (MIGRATION_DATABASE_URL), nunca via PgBouncer em modo transaction
+    """
+    global _migration_engine
+    url = migration_url(DATABASE_URL)
+    if url == DATABASE_URL and not is_pgbouncer():
+        return engine
+    if _migration_engine is None:
+        _migration_engine = create_engine(url, poolclass=NullPool)
+    return _migration_engine
+
+def dispose_engines(close: bool = True):
+    """
+    Descarta os pools (primário, migrations e réplicas)
+
+    close=False depois de fork (gunicorn preload_app): abandona as conexões
+    herdadas do master sem fechá-las, para não derrubar o socket que o
+    master ainda usa; o worker abre as suas.
+    """
+    from app.core import replicas
+    engine.dispose(close=close)
+    if _migration_engine is not None:
+        _migration_engine.dispose(close=close)
+    replicas.dispose_engines(close=close)
+
 def run_migration_v4(conn):
     """Migration v4.0.0 - Adiciona campos para Dual-Frontend"""
     
@@ -128,19 +169,86 @@ def run_migration_v4(conn):
     
     print("  ✅ Migration v4.0.0 concluída!")
 
+def run_schema_upgrades(conn):
+    """Alterações incrementais de schema (idempotentes) aplicadas a cada startup"""
+    upgrades = [
+        "ALTER TABLE agents ADD COLUMN IF NOT EXISTS message_retention_days INTEGER",
+        # Soft delete (routes/agents.py já usava; schema criado pelo app não tinha)
+        "ALTER TABLE agents ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP",
+        # Paginação keyset (created_at, id)
+        "CREATE INDEX IF NOT EXISTS idx_agents_created_id ON agents(created_at DESC, id DESC)",
+        # Versão das conversas para o cache de janelas (app.services.conversation_cache)
+        "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS message_count INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS last_message_at TIMESTAMP",
+        # Hedged requests por agente
+        "ALTER TABLE agents ADD COLUMN IF NOT EXISTS hedging_enabled BOOLEAN NOT NULL DEFAULT false",
+        "ALTER TABLE agents ADD COLUMN IF NOT EXISTS hedging_fallback_model VARCHAR(100)",
+        # Reaper de conversas ociosas (app.services.reaper): conjunto ativo pequeno
+        "ALTER TABLE agents ADD COLUMN IF NOT EXISTS idle_timeout_minutes INTEGER",
+        "CREATE INDEX IF NOT EXISTS idx_conversations_active_lookup ON conversations(agent_id, user_identifier, channel) WHERE status = 'active'",
+        "CREATE INDEX IF NOT EXISTS idx_conversations_active_idle ON conversations(agent_id, (COALESCE(last_message_at, created_at))) WHERE status = 'active'",
+        # Totais por conversa para o admin (app.core.conversation_counters)
+        "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS total_tokens BIGINT NOT NULL DEFAULT 0",
+        "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS total_cost DOUBLE PRECISION NOT NULL DEFAULT 0",
+        "CREATE INDEX IF NOT EXISTS idx_conversations_agent_activity ON conversations(agent_id, (COALESCE(last_message_at, created_at)) DESC, id DESC)",
+        # Idempotency-Key entre réplicas (app.services.idempotency)
+        """CREATE TABLE IF NOT EXISTS idempotency_keys (
+            key VARCHAR(400) PRIMARY KEY,
+            fingerprint VARCHAR(64) NOT NULL,
+            status_code INTEGER,
+            response TEXT,
+            created_at TIMESTAMP NOT NULL DEFAULT now(),
+            expires_at TIMESTAMP NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON idempotency_keys(expires_at)",
+    ]
+    
+    for sql in upgrades:
+        try:
+            conn.execute(text(sql))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"    ⚠️ Erro (não crítico): {e}")
+    
+    # Particionamento mensal de messages
+    if messages_table_exists(conn):
+        if not is_messages_partitioned(conn) and AUTO_PARTITION:
+            print("🚀 Executando migration de particionamento...")
+            run_migration_partitioning(conn)
+        if is_messages_partitioned(conn):
+            created = ensure_message_partitions(conn)
+            conn.commit()
+            if created:
+                print(f"📅 Partições criadas: {', '.join(created)}")
+        
+        # Colunas tipadas de uso (app.core.message_usage)
+        for sql in USAGE_COLUMNS:
+            conn.execute(text(sql))
+        ensure_parent_index(conn)
+        conn.commit()
+        
+        # Busca full-text (app.core.message_search)
+        for sql in SEARCH_COLUMNS:
+            conn.execute(text(sql))
+        ensure_search_trigger(conn)
+        ensure_search_parent_index(conn)
+        conn.commit()
+
 def init_database():
     """Inicializa banco de dados com SQL inline"""
     
     print("🔍 Verificando banco de dados...")
     
     try:
-        with engine.connect() as conn:
-            # Verificar se já foi inicializado
+        with migration_engine().connect() as conn:
+            # Verificar se já foi inicializado - por conversations, não agents:
+            # o create_all legado (database.init_db) só cria agents
             result = conn.execute(text("""
                 SELECT EXISTS (
                     SELECT FROM information_schema.tables 
                     WHERE table_schema = 'public' 
-                    AND table_name = 'agents'
+                    AND table_name = 'conversations'
                 );
             """))
             
@@ -169,6 +277,8 @@ def init_database():
                 else:
                     print("✅ Migration v4 já aplicada")
                 
+                run_schema_upgrades(conn)
+                
                 result = conn.execute(text("SELECT COUNT(*) FROM agents"))
                 print(f"🤖 {result.fetchone()[0]} agente(s) no banco")
                 return
@@ -232,6 +342,8 @@ def init_database():
                     updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
                 )
             """))
+            # agents criada antes pelo create_all legado não tem status
+            conn.execute(text("ALTER TABLE agents ADD COLUMN IF NOT EXISTS status agentstatus NOT NULL DEFAULT 'active'"))
             
             # Criar tabela conversations
             conn.execute(text("""
@@ -248,20 +360,9 @@ def init_database():
                 )
             """))
             
-            # Criar tabela messages
-            conn.execute(text("""
-                CREATE TABLE IF NOT EXISTS messages (
-                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                    conversation_id UUID NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
-                    role messagerole NOT NULL,
-                    content TEXT NOT NULL,
-                    tokens INTEGER DEFAULT 0,
-                    cost FLOAT DEFAULT 0.0,
-                    processing_time FLOAT DEFAULT 0.0,
-                    extra_data JSONB DEFAULT '{}'::jsonb,
-                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-                )
-            """))
+            # Criar tabela messages (particionada por mês)
+            create_partitioned_messages_table(conn)
+            ensure_message_partitions(conn)
             
             # Criar tabela documents
             conn.execute(text("""
@@ -296,7 +397,6 @@ def init_database():
             conn.execute(text("CREATE INDEX IF NOT EXISTS idx_conversations_agent_id ON conversations(agent_id)"))
             conn.execute(text("CREATE INDEX IF NOT EXISTS idx_conversations_user_id ON conversations(user_identifier)"))
             conn.execute(text("CREATE INDEX IF NOT EXISTS idx_conversations_session_id ON conversations(session_id)"))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON messages(conversation_id)"))
             conn.execute(text("CREATE INDEX IF NOT EXISTS idx_documents_agent_id ON documents(agent_id)"))
             conn.execute(text("CREATE INDEX IF NOT EXISTS idx_channel_configs_agent_id ON channel_configs(agent_id)"))
             conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS idx_agents_slug_unique ON agents(slug)"))
@@ -357,6 +457,8 @@ def init_database():
             
             conn.commit()
             
+            run_schema_upgrades(conn)
+            
             print("✅ Schema criado com sucesso!")
             
             result = conn.execute(text("SELECT COUNT(*) FROM agents"))
@@ -374,3 +476,25 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_read_db():
+    """Sessão só de leitura: réplica saudável ou primário (app.core.replicas)"""
+    db = read_session(SessionLocal)
+    try:
+        yield db
+    finally:
+        db.close()
+
+def read_db_for(pin_key: Callable[[Request], str]):
+    """
+    get_read_db com read-your-writes: se a chave foi escrita há pouco
+    (replicas.mark_written), a leitura fica no primário
+    """
+    def dependency(request: Request):
+        db = read_session(SessionLocal, pin_key(request))
+        try:
+            yield db
+        finally:
+            db.close()
+    
+    return dependency
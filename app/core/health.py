@@ -0,0 +1,113 @@
+"""
+Health - estado para liveness/readiness sem tocar no banco na hora do probe
+
+Os probes (GET /health/live e /health/ready) só leem memória: capacidade do
+pool (contadores do QueuePool), cliente LLM inicializado e o resultado da
+última checagem em background. O job "db_health" do scheduler faz um
+SELECT 1 e lê as estimativas de linhas em pg_class.reltuples (somando as
+partições de messages) a cada HEALTH_CHECK_INTERVAL segundos, numa conexão
+do próprio pool - nada de COUNT(*) em tabela grande por probe.
+"""
+import os
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+
+from app.core import metrics
+from app.core.database import engine
+from app.core.scheduler import SCHEDULER_ENABLED
+
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "30"))
+# Sem checagem de banco bem-sucedida há mais que isso -> não pronto
+HEALTH_DB_MAX_AGE = float(os.getenv("HEALTH_DB_MAX_AGE", str(HEALTH_CHECK_INTERVAL * 3)))
+
+HEALTH_TABLES = ("agents", "conversations", "messages")
+
+# Tabela comum: o próprio reltuples. Particionada: soma das partições - o
+# reltuples do pai é 0/-1, ou já o total depois de ANALYZE no pai (PG14+),
+# e somar os dois dobraria. -1 = nunca analisada
+ESTIMATES_SQL = text("""
+    SELECT c.relname,
+           CASE WHEN c.relkind = 'p' THEN COALESCE((
+               SELECT SUM(GREATEST(p.reltuples, 0))
+               FROM pg_inherits i
+               JOIN pg_class p ON p.oid = i.inhrelid
+               WHERE i.inhparent = c.oid
+           ), 0) ELSE GREATEST(c.reltuples, 0) END AS estimate
+    FROM pg_class c
+    WHERE c.relnamespace = 'public'::regnamespace
+      AND c.relkind IN ('r', 'p')
+      AND c.relname = ANY(:tables)
+""")
+
+_state: Dict = {
+    "db_ok": None,
+    "db_error": None,
+    "checked_at": None,
+    "check_seconds": None,
+    "tables": {}
+}
+
+def refresh_db_health() -> Dict:
+    """Job do scheduler: SELECT 1 + estimativas do catálogo"""
+    start = time.monotonic()
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            rows = conn.execute(ESTIMATES_SQL, {"tables": list(HEALTH_TABLES)}).fetchall()
+        _state["tables"] = {name: int(estimate) for name, estimate in rows}
+        _state["db_ok"] = True
+        _state["db_error"] = None
+    except Exception as e:
+        _state["db_ok"] = False
+        _state["db_error"] = str(e).splitlines()[0]
+    _state["checked_at"] = time.time()
+    _state["check_seconds"] = round(time.monotonic() - start, 4)
+    return {"db_ok": _state["db_ok"], "tables": _state["tables"]}
+
+def db_age() -> Optional[float]:
+    if _state["checked_at"] is None:
+        return None
+    return time.time() - _state["checked_at"]
+
+def pool_status() -> Dict:
+    """Contadores do pool principal (NullPool não tem limite local)"""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"class": type(pool).__name__, "available": True}
+
+    limit = pool.size() + pool._max_overflow
+    checked_out = pool.checkedout()
+    return {
+        "class": "QueuePool",
+        "size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_out": checked_out,
+        "idle": pool.checkedin(),
+        "available": pool._max_overflow < 0 or checked_out < limit
+    }
+
+def db_status() -> Dict:
+    age = db_age()
+    return {
+        # Sem scheduler só há a checagem do startup; a idade não conta
+        "ok": bool(_state["db_ok"]) and (not SCHEDULER_ENABLED or age <= HEALTH_DB_MAX_AGE),
+        "error": _state["db_error"],
+        "checked_seconds_ago": round(age, 1) if age is not None else None,
+        "check_seconds": _state["check_seconds"]
+    }
+
+def table_estimates() -> Dict:
+    age = db_age()
+    return {
+        "estimated": True,
+        "tables": dict(_state["tables"]),
+        "refreshed_seconds_ago": round(age, 1) if age is not None else None
+    }
+
+metrics.register_collector(lambda: [
+    ("db_pool_checked_out", {}, pool_status().get("checked_out", 0)),
+    *(("db_table_rows_estimate", {"table": name}, value) for name, value in _state["tables"].items())
+])
@@ -0,0 +1,128 @@
+"""
+HTTP caching - ETag / If-None-Match + cache em memória de respostas prontas
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Hashable, Optional
+
+from fastapi import Request, Response
+
+from app.core.serialization import dumps as dump_json
+
+def make_etag(body: bytes, weak: bool = True) -> str:
+    digest = hashlib.sha1(body).hexdigest()
+    return f'W/"{digest}"' if weak else f'"{digest}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Compara If-None-Match (lista, '*' e W/ tratados como equivalentes)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    target = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == target for tag in header.split(","))
+
+def not_modified(etag: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(status_code=304, headers={**(headers or {}), "ETag": etag})
+
+def etag_json_response(
+    request: Request,
+    content,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """Serializa `content`, calcula ETag do corpo e responde 304 se o cliente já tem"""
+    body = dump_json(content)
+    etag = make_etag(body)
+
+    if etag_matches(request, etag):
+        return not_modified(etag, headers)
+
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={**(headers or {}), "ETag": etag}
+    )
+
+@dataclass
+class CachedBody:
+    body: bytes
+    etag: str
+    tag: Optional[str]
+    expires_at: float
+
+class ResponseCache:
+    """
+    LRU de corpos JSON já serializados, com TTL
+    
+    Por processo: invalidação explícita (invalidate_tag) só alcança o worker
+    local; os demais convergem pelo TTL.
+    """
+    
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, CachedBody]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Hashable) -> Optional[CachedBody]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry.expires_at < time.monotonic():
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry
+    
+    def set(self, key: Hashable, body: bytes, etag: str, tag: Optional[str] = None) -> CachedBody:
+        entry = CachedBody(body=body, etag=etag, tag=tag, expires_at=time.monotonic() + self.ttl)
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return entry
+    
+    def invalidate_tag(self, tag: Optional[str]):
+        if not tag:
+            return
+        with self._lock:
+            for key in [k for k, v in self._data.items() if v.tag == tag]:
+                del self._data[key]
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+def strong_etag(*parts) -> str:
+    """ETag forte a partir de identificadores de versão (ex.: id + updated_at)"""
+    raw = "|".join("" if p is None else str(p) for p in parts)
+    return f'"{hashlib.sha1(raw.encode()).hexdigest()}"'
+
+def cached_body_response(request: Request, entry: CachedBody, cache_control: str) -> Response:
+    headers = {"Cache-Control": cache_control}
+    if etag_matches(request, entry.etag):
+        return not_modified(entry.etag, headers)
+    return Response(
+        content=entry.body,
+        media_type="application/json",
+        headers={**headers, "ETag": entry.etag}
+    )
+
+# Configuração pública dos agentes (widget) - quase estática
+PUBLIC_AGENT_CACHE_CONTROL = "public, max-age={}, stale-while-revalidate={}".format(
+    int(os.getenv("PUBLIC_AGENT_MAX_AGE", "60")),
+    int(os.getenv("PUBLIC_AGENT_STALE_WHILE_REVALIDATE", "600"))
+)
+
+public_agent_cache = ResponseCache(
+    maxsize=int(os.getenv("PUBLIC_AGENT_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("PUBLIC_AGENT_CACHE_TTL", "30"))
+)
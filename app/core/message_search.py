@@ -0,0 +1,101 @@
+"""
+Busca full-text em messages (painel de suporte)
+
+messages.search_vector (tsvector, configuração SEARCH_TEXT_CONFIG,
+default portuguese) é mantida pelo próprio Postgres: um trigger BEFORE
+INSERT OR UPDATE OF content (tsvector_update_trigger) na tabela
+particionada vale para todas as partições, inclusive as criadas depois.
+A busca usa o índice GIN em vez de ILIKE varrendo content.
+
+- Coluna: ADD COLUMN sem default (só catálogo) em run_schema_upgrades
+- Trigger e índice pai (ON ONLY messages) no startup
+- Índice GIN nas partições existentes: CONCURRENTLY + ATTACH, comando `index`
+- Mensagens antigas: comando `backfill`, em lotes por id como em
+  app.core.message_usage (até lá, não aparecem na busca)
+
+Uso manual:
+    python -m app.core.message_search index
+    python -m app.core.message_search backfill [batch_size]
+"""
+import os
+import sys
+import time
+from typing import Dict, List
+
+from sqlalchemy import text
+
+from app.core.message_usage import BACKFILL_BATCH_SIZE, backfill_table, build_partitioned_index, message_tables
+from app.core.partitions import is_messages_partitioned
+
+SEARCH_TEXT_CONFIG = os.getenv("SEARCH_TEXT_CONFIG", "portuguese")
+
+SEARCH_INDEX = "idx_messages_search"
+SEARCH_INDEX_DEFINITION = "USING GIN (search_vector)"
+SEARCH_TRIGGER = "trg_messages_search_vector"
+
+SEARCH_COLUMNS = [
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector tsvector",
+]
+
+BACKFILL_SQL = f"""
+    UPDATE {{table}}
+    SET search_vector = to_tsvector('{SEARCH_TEXT_CONFIG}', content)
+    WHERE id = ANY(CAST(:ids AS uuid[]))
+      AND search_vector IS NULL
+"""
+
+def ensure_search_trigger(conn):
+    """Cria o trigger se ainda não existir (sem DROP: evita lock exclusivo a cada startup)"""
+    conn.execute(text(f"""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_trigger
+                WHERE tgname = '{SEARCH_TRIGGER}' AND tgrelid = 'messages'::regclass
+            ) THEN
+                CREATE TRIGGER {SEARCH_TRIGGER}
+                BEFORE INSERT OR UPDATE OF content ON messages
+                FOR EACH ROW EXECUTE FUNCTION
+                tsvector_update_trigger(search_vector, 'pg_catalog.{SEARCH_TEXT_CONFIG}', content);
+            END IF;
+        END $$
+    """))
+
+def ensure_search_parent_index(conn):
+    """Índice GIN na tabela particionada; novas partições já nascem com ele"""
+    if not is_messages_partitioned(conn):
+        return
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} ON ONLY messages {SEARCH_INDEX_DEFINITION}"))
+
+def build_search_indexes(engine) -> List[str]:
+    with engine.begin() as conn:
+        ensure_search_parent_index(conn)
+    return build_partitioned_index(engine, SEARCH_INDEX, SEARCH_INDEX_DEFINITION, "search_idx")
+
+def run_search_backfill(engine, batch_size: int = BACKFILL_BATCH_SIZE) -> Dict:
+    start = time.time()
+    updated = {}
+    with engine.connect() as conn:
+        for table in message_tables(conn):
+            updated[table] = backfill_table(conn, table, batch_size, sql=BACKFILL_SQL)
+            if updated[table]:
+                print(f"  🔎 {table}: {updated[table]} mensagem(ns) indexada(s)")
+    return {
+        "updated": sum(updated.values()),
+        "tables": updated,
+        "duration": round(time.time() - start, 3)
+    }
+
+if __name__ == "__main__":
+    from app.core.database import migration_engine
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "backfill"
+
+    if command == "index":
+        print(build_search_indexes(migration_engine()))
+    elif command == "backfill":
+        size = int(sys.argv[2]) if len(sys.argv) > 2 else BACKFILL_BATCH_SIZE
+        print(run_search_backfill(migration_engine(), size))
+    else:
+        print(f"Comando desconhecido: {command} (use index|backfill)")
+        sys.exit(1)
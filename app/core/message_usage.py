@@ -0,0 +1,164 @@
+"""
+Colunas tipadas de uso em messages (antes só em extra_data JSONB)
+
+messages.agent_id, model, input_tokens, output_tokens, cached_tokens e
+ttft_ms são gravadas direto pelo ConversationService; relatórios de custo e
+tokens agregam colunas simples, sem parse de JSONB por linha.
+
+- Colunas: ADD COLUMN sem default (só catálogo, instantâneo) em
+  run_schema_upgrades
+- Índice de cobertura idx_messages_agent_usage (agent_id, created_at)
+  INCLUDE (colunas de uso) WHERE role = 'assistant': criado ON ONLY na tabela
+  particionada no startup (novas partições já nascem com ele); nas partições
+  existentes é criado CONCURRENTLY e anexado pelo comando `index`
+- Backfill: por partição, em lotes por id (keyset) com commit e pausa entre
+  lotes - cada lote trava só as próprias linhas por pouco tempo
+
+Uso manual:
+    python -m app.core.message_usage index
+    python -m app.core.message_usage backfill [batch_size]
+"""
+import os
+import sys
+import time
+from typing import Dict, List
+
+from sqlalchemy import text
+
+from app.core.partitions import is_messages_partitioned, list_message_partitions, PARTITION_PREFIX
+
+BACKFILL_BATCH_SIZE = int(os.getenv("MESSAGE_USAGE_BACKFILL_BATCH_SIZE", "2000"))
+BACKFILL_PAUSE = float(os.getenv("MESSAGE_USAGE_BACKFILL_PAUSE", "0.05"))
+
+USAGE_INDEX = "idx_messages_agent_usage"
+USAGE_INDEX_COLUMNS = "(agent_id, created_at) INCLUDE (model, input_tokens, output_tokens, cached_tokens, cost, ttft_ms)"
+USAGE_INDEX_PREDICATE = "role = 'assistant'"
+
+USAGE_COLUMNS = [
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS agent_id UUID",
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS model VARCHAR(100)",
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS input_tokens INTEGER",
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS output_tokens INTEGER",
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS cached_tokens INTEGER",
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS ttft_ms INTEGER",
+]
+
+def ensure_parent_index(conn):
+    """
+    Índice na tabela particionada sem tocar nas partições existentes
+
+    Tabela não particionada fica para o comando `index` (CONCURRENTLY).
+    """
+    if not is_messages_partitioned(conn):
+        return
+    conn.execute(text(
+        f"CREATE INDEX IF NOT EXISTS {USAGE_INDEX} ON ONLY messages "
+        f"{USAGE_INDEX_COLUMNS} WHERE {USAGE_INDEX_PREDICATE}"
+    ))
+
+def message_tables(conn) -> List[str]:
+    """Partições de messages (ou a própria tabela, se não particionada)"""
+    if not is_messages_partitioned(conn):
+        return ["messages"]
+    names = [name for name, _, _ in list_message_partitions(conn)]
+    return names + [f"{PARTITION_PREFIX}default"]
+
+def build_partitioned_index(engine, index: str, definition: str, partition_suffix: str) -> List[str]:
+    """
+    CREATE INDEX CONCURRENTLY por partição + ATTACH no índice pai
+
+    `definition` é o que vem depois de "ON <tabela>" (colunas, USING,
+    WHERE); o índice pai (ON ONLY messages) já deve existir.
+    """
+    built = []
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        partitioned = is_messages_partitioned(conn)
+
+        for table in message_tables(conn):
+            name = index if table == "messages" else f"{table}_{partition_suffix}"
+            conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}"))
+            if partitioned:
+                attached = conn.execute(text("""
+                    SELECT EXISTS (
+                        SELECT 1 FROM pg_inherits i
+                        JOIN pg_class c ON c.oid = i.inhrelid
+                        WHERE c.relname = :name
+                    )
+                """), {"name": name}).scalar()
+                if not attached:
+                    conn.execute(text(f"ALTER INDEX {index} ATTACH PARTITION {name}"))
+            built.append(name)
+    return built
+
+def build_usage_indexes(engine) -> List[str]:
+    with engine.begin() as conn:
+        ensure_parent_index(conn)
+    return build_partitioned_index(
+        engine, USAGE_INDEX, f"{USAGE_INDEX_COLUMNS} WHERE {USAGE_INDEX_PREDICATE}", "agent_usage_idx"
+    )
+
+# Preenche a partir da conversa (agent_id) e de extra_data; linhas já
+# preenchidas (agent_id não nulo) são ignoradas
+BACKFILL_SQL = """
+    UPDATE {table} m SET
+        agent_id = c.agent_id,
+        model = COALESCE(m.model, m.extra_data->>'model'),
+        input_tokens = COALESCE(m.input_tokens, (m.extra_data->>'input_tokens')::int),
+        output_tokens = COALESCE(m.output_tokens, (m.extra_data->>'output_tokens')::int),
+        cached_tokens = COALESCE(m.cached_tokens, (m.extra_data->>'cached_tokens')::int),
+        ttft_ms = COALESCE(m.ttft_ms, ROUND((m.extra_data->>'first_token_time')::float * 1000)::int)
+    FROM conversations c
+    WHERE m.id = ANY(CAST(:ids AS uuid[]))
+      AND c.id = m.conversation_id
+      AND m.agent_id IS NULL
+"""
+
+def backfill_table(conn, table: str, batch_size: int = BACKFILL_BATCH_SIZE, pause: float = BACKFILL_PAUSE,
+                   sql: str = BACKFILL_SQL) -> int:
+    """Backfill de uma tabela/partição em lotes (commit por lote); `sql` recebe {table} e :ids"""
+    update = text(sql.format(table=table))
+    select = text(f"SELECT id FROM {table} WHERE id > :last ORDER BY id LIMIT :batch_size")
+
+    total = 0
+    last = "00000000-0000-0000-0000-000000000000"
+    while True:
+        ids = [str(row[0]) for row in conn.execute(select, {"last": last, "batch_size": batch_size})]
+        if not ids:
+            conn.commit()
+            return total
+        total += conn.execute(update, {"ids": ids}).rowcount
+        conn.commit()
+        last = ids[-1]
+        if len(ids) < batch_size:
+            return total
+        if pause:
+            time.sleep(pause)
+
+def run_usage_backfill(engine, batch_size: int = BACKFILL_BATCH_SIZE) -> Dict:
+    start = time.time()
+    updated = {}
+    with engine.connect() as conn:
+        for table in message_tables(conn):
+            updated[table] = backfill_table(conn, table, batch_size)
+            if updated[table]:
+                print(f"  📦 {table}: {updated[table]} mensagem(ns) preenchida(s)")
+    return {
+        "updated": sum(updated.values()),
+        "tables": updated,
+        "duration": round(time.time() - start, 3)
+    }
+
+if __name__ == "__main__":
+    from app.core.database import migration_engine
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "backfill"
+
+    if command == "index":
+        print(build_usage_indexes(migration_engine()))
+    elif command == "backfill":
+        size = int(sys.argv[2]) if len(sys.argv) > 2 else BACKFILL_BATCH_SIZE
+        print(run_usage_backfill(migration_engine(), size))
+    else:
+        print(f"Comando desconhecido: {command} (use index|backfill)")
+        sys.exit(1)
@@ -0,0 +1,241 @@
+"""
+Métricas em memória - contadores, gauges e histogramas simples
+
+Exposição em formato texto do Prometheus (GET /metrics) ou JSON
+(GET /metrics?format=json). Gauges "ao vivo" (tamanho de pool, cache...)
+são lidos na hora da coleta via register_collector().
+
+Vários workers (gunicorn.conf.py): cada processo tem suas métricas, e o
+scrape cai num worker qualquer. Com METRICS_MULTIPROC_DIR, cada worker grava
+seu snapshot em <dir>/worker-<pid>.json (job "metrics_flush" e no scrape) e
+collect() junta todos: contadores e histogramas somados, gauges só de
+workers vivos, com label worker=<pid>.
+
+Quando um worker sai, o master (child_exit) soma os contadores e
+histogramas dele em <dir>/archive.json e apaga o worker-<pid>.json antes
+de criar o substituto: um worker novo que reaproveite o PID começa do zero
+sem sobrescrever os totais do anterior, e os contadores não regridem.
+"""
+import json
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+ARCHIVE_FILE = "archive.json"
+
+LabelKey = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+# Buckets em segundos, pensados para latência de LLM
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_counters: Dict[str, Dict[LabelKey, float]] = {}
+_gauges: Dict[str, Dict[LabelKey, float]] = {}
+_histograms: Dict[str, Dict[LabelKey, List[float]]] = {}
+_collectors: List[Callable[[], Iterable[Sample]]] = []
+
+def _key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def inc(name: str, value: float = 1.0, **labels):
+    key = _key(labels)
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[key] = series.get(key, 0.0) + value
+
+def set_gauge(name: str, value: float, **labels):
+    with _lock:
+        _gauges.setdefault(name, {})[_key(labels)] = value
+
+def observe(name: str, value: float, **labels):
+    """Histograma: [count, sum, bucket_0, ..., bucket_n] (cumulativo no render)"""
+    key = _key(labels)
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        data = series.get(key)
+        if data is None:
+            data = series[key] = [0.0, 0.0] + [0.0] * len(DEFAULT_BUCKETS)
+        data[0] += 1
+        data[1] += value
+        for i, bound in enumerate(DEFAULT_BUCKETS):
+            if value <= bound:
+                data[2 + i] += 1
+                break
+
+def register_collector(func: Callable[[], Iterable[Sample]]):
+    """func() -> [(nome, labels, valor)], chamado a cada coleta (gauges)"""
+    _collectors.append(func)
+
+def _collected() -> Dict[str, Dict[LabelKey, float]]:
+    collected: Dict[str, Dict[LabelKey, float]] = {}
+    for collector in _collectors:
+        try:
+            for name, labels, value in collector():
+                collected.setdefault(name, {})[_key(labels)] = value
+        except Exception as e:
+            print(f"⚠️ Collector de métricas falhou: {e}")
+    return collected
+
+def snapshot() -> Dict:
+    with _lock:
+        counters = {n: dict(s) for n, s in _counters.items()}
+        gauges = {n: dict(s) for n, s in _gauges.items()}
+        histograms = {n: {k: list(v) for k, v in s.items()} for n, s in _histograms.items()}
+    gauges.update(_collected())
+    return _as_snapshot(counters, gauges, histograms)
+
+def write_snapshot(directory: str = None) -> str:
+    """Grava o snapshot deste processo (troca atômica do arquivo)"""
+    directory = directory or METRICS_MULTIPROC_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"worker-{os.getpid()}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(snapshot(), f)
+    os.replace(tmp, path)
+    return path
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _add_totals(counters: Dict, histograms: Dict, data: Dict):
+    """Soma contadores e histogramas de um snapshot em counters/histograms"""
+    for name, series in data["counters"].items():
+        target = counters.setdefault(name, {})
+        for item in series:
+            key = _key(item["labels"])
+            target[key] = target.get(key, 0.0) + item["value"]
+
+    for name, series in data["histograms"].items():
+        target = histograms.setdefault(name, {})
+        for item in series:
+            key = _key(item["labels"])
+            values = [item["count"], item["sum"]] + list(item["buckets"].values())
+            current = target.get(key)
+            target[key] = values if current is None else [a + b for a, b in zip(current, values)]
+
+def _read_snapshot(path: str) -> Optional[Dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _as_snapshot(counters: Dict, gauges: Dict, histograms: Dict) -> Dict:
+    def series(data):
+        return [{"labels": dict(k), "value": v} for k, v in data.items()]
+
+    return {
+        "counters": {n: series(s) for n, s in counters.items()},
+        "gauges": {n: series(s) for n, s in gauges.items()},
+        "histograms": {
+            n: [
+                {"labels": dict(k), "count": v[0], "sum": v[1], "buckets": dict(zip(map(str, DEFAULT_BUCKETS), v[2:]))}
+                for k, v in s.items()
+            ]
+            for n, s in histograms.items()
+        }
+    }
+
+def archive_worker(pid: int, directory: str = None):
+    """
+    Master (child_exit): soma o snapshot do worker que saiu em archive.json
+    e apaga o arquivo dele. Só o master escreve o arquivo de arquivo.
+    """
+    directory = directory or METRICS_MULTIPROC_DIR
+    path = os.path.join(directory, f"worker-{pid}.json")
+    data = _read_snapshot(path)
+    if data is None:
+        return
+
+    archive_path = os.path.join(directory, ARCHIVE_FILE)
+    counters: Dict[str, Dict[LabelKey, float]] = {}
+    histograms: Dict[str, Dict[LabelKey, List[float]]] = {}
+    archived = _read_snapshot(archive_path)
+    if archived is not None:
+        _add_totals(counters, histograms, archived)
+    _add_totals(counters, histograms, data)
+
+    tmp = f"{archive_path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(_as_snapshot(counters, {}, histograms), f)
+    os.replace(tmp, archive_path)
+    os.remove(path)
+
+def aggregate(directory: str = None) -> Dict:
+    """Junta os snapshots de todos os workers (e o arquivo dos que saíram) no formato de snapshot()"""
+    directory = directory or METRICS_MULTIPROC_DIR
+    counters: Dict[str, Dict[LabelKey, float]] = {}
+    gauges: Dict[str, Dict[LabelKey, float]] = {}
+    histograms: Dict[str, Dict[LabelKey, List[float]]] = {}
+
+    archived = _read_snapshot(os.path.join(directory, ARCHIVE_FILE))
+    if archived is not None:
+        _add_totals(counters, histograms, archived)
+
+    for filename in sorted(os.listdir(directory)):
+        if not (filename.startswith("worker-") and filename.endswith(".json")):
+            continue
+        pid = int(filename[len("worker-"):-len(".json")])
+        data = _read_snapshot(os.path.join(directory, filename))
+        if data is None:
+            continue
+
+        _add_totals(counters, histograms, data)
+
+        if _pid_alive(pid):
+            for name, series in data["gauges"].items():
+                target = gauges.setdefault(name, {})
+                for item in series:
+                    target[_key({**item["labels"], "worker": pid})] = item["value"]
+
+    return _as_snapshot(counters, gauges, histograms)
+
+def collect() -> Dict:
+    """Métricas para exposição: deste processo ou de todos os workers"""
+    if not METRICS_MULTIPROC_DIR:
+        return snapshot()
+    write_snapshot()
+    return aggregate()
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels_text(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items()))
+    return "{" + inner + "}"
+
+def render_prometheus(data: Dict = None) -> str:
+    data = data or snapshot()
+    lines = []
+
+    for kind in ("counters", "gauges"):
+        prom_type = "counter" if kind == "counters" else "gauge"
+        for name, series in sorted(data[kind].items()):
+            lines.append(f"# TYPE {name} {prom_type}")
+            for item in series:
+                lines.append(f"{name}{_labels_text(item['labels'])} {item['value']}")
+
+    for name, series in sorted(data["histograms"].items()):
+        lines.append(f"# TYPE {name} histogram")
+        for item in series:
+            cumulative = 0.0
+            for bound, count in item["buckets"].items():
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels_text({**item['labels'], 'le': bound})} {cumulative}")
+            lines.append(f"{name}_bucket{_labels_text({**item['labels'], 'le': '+Inf'})} {item['count']}")
+            lines.append(f"{name}_sum{_labels_text(item['labels'])} {item['sum']}")
+            lines.append(f"{name}_count{_labels_text(item['labels'])} {item['count']}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,86 @@
+"""
+Paginação por cursor (keyset) e projeção de campos (?fields=)
+
+O cursor é opaco para o cliente: base64 de [created_at, id] do último item
+da página. A próxima página filtra (created_at, id) < cursor, usando o
+índice em vez de OFFSET, então o custo por página é constante.
+
+Listagens que antes devolviam tudo continuam sem limite quando o cliente não
+manda nem `limit` nem `cursor` (page_limit).
+"""
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+Cursor = Tuple[datetime, uuid.UUID]
+
+DEFAULT_PAGE_SIZE = 100
+
+def page_limit(limit: Optional[int], cursor: Optional[str], default: int = DEFAULT_PAGE_SIZE) -> Optional[int]:
+    """Tamanho da página; None (sem limite) quando o cliente não pediu paginação"""
+    if limit is not None:
+        return limit
+    return default if cursor else None
+
+def encode_cursor(created_at: datetime, item_id) -> str:
+    raw = json.dumps([created_at.isoformat(), str(item_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Cursor]:
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), uuid.UUID(item_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def encode_rank_cursor(rank: float, created_at: datetime, item_id) -> str:
+    """Cursor de resultados ordenados por relevância: (rank, created_at, id)"""
+    raw = json.dumps([rank, created_at.isoformat(), str(item_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_rank_cursor(cursor: Optional[str]) -> Optional[Tuple[float, datetime, uuid.UUID]]:
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        rank, created_at, item_id = json.loads(base64.urlsafe_b64decode(padded))
+        return float(rank), datetime.fromisoformat(created_at), uuid.UUID(item_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str]) -> List[str]:
+    """Valida ?fields=a,b,c contra os campos permitidos (vazio = todos)"""
+    if not fields:
+        return list(allowed)
+
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Campos inválidos: {', '.join(unknown)}"
+        )
+    return requested
+
+def apply_keyset(query, created_col, id_col, cursor: Optional[Cursor], limit: Optional[int]):
+    """Ordena por (created_at, id) DESC, aplica o cursor e busca limit+1 (None = tudo)"""
+    if cursor is not None:
+        query = query.filter(tuple_(created_col, id_col) < tuple_(*cursor))
+    query = query.order_by(created_col.desc(), id_col.desc())
+    return query if limit is None else query.limit(limit + 1)
+
+def split_page(rows: list, limit: Optional[int], created_attr: str = "created_at", id_attr: str = "id"):
+    """Separa a página do item extra e gera o próximo cursor (ou None)"""
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    last = page[-1]
+    return page, encode_cursor(getattr(last, created_attr), getattr(last, id_attr))
@@ -0,0 +1,474 @@
+"""
+Particionamento mensal da tabela messages + retenção/arquivamento
+
+- messages é particionada por RANGE (created_at), uma partição por mês
+  (messages_pAAAA_MM) + partição DEFAULT de segurança
+- Partições são criadas com MESSAGES_PARTITION_MONTHS_AHEAD meses de folga
+- Retenção por agente (agents.message_retention_days, fallback
+  MESSAGE_RETENTION_DAYS): linhas expiradas de agentes com retenção curta são
+  removidas em lotes; partições inteiras além da maior retenção são
+  arquivadas (CSV gzip em MESSAGE_ARCHIVE_DIR, se configurado) e removidas
+
+Conversão de uma tabela messages existente (manual, sem parar o app):
+    python -m app.core.partitions migrate [batch_size]
+
+  Cria messages_partitioned (LIKE messages), espelha escritas novas por
+  trigger e copia as linhas antigas em lotes por id (commit por lote,
+  progresso em messages_partition_migration: rodar de novo continua de
+  onde parou). No fim troca as tabelas sob um lock curto (lock_timeout);
+  a tabela antiga fica como messages_legacy para conferência e DROP manual.
+  MESSAGES_AUTO_PARTITION=true mantém a conversão antiga no startup (uma
+  transação, lock exclusivo durante a cópia) - só para tabelas pequenas.
+
+Uso manual:
+    python -m app.core.partitions maintain
+    python -m app.core.partitions migrate
+"""
+import gzip
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+MONTHS_AHEAD = int(os.getenv("MESSAGES_PARTITION_MONTHS_AHEAD", "3"))
+AUTO_PARTITION = os.getenv("MESSAGES_AUTO_PARTITION", "false").lower() == "true"
+MIGRATION_BATCH_SIZE = int(os.getenv("MESSAGES_MIGRATION_BATCH_SIZE", "5000"))
+MIGRATION_PAUSE = float(os.getenv("MESSAGES_MIGRATION_PAUSE", "0.05"))
+MIGRATION_LOCK_TIMEOUT = os.getenv("MESSAGES_MIGRATION_LOCK_TIMEOUT", "5s")
+DEFAULT_RETENTION_DAYS = os.getenv("MESSAGE_RETENTION_DAYS")
+ARCHIVE_DIR = os.getenv("MESSAGE_ARCHIVE_DIR")
+RETENTION_BATCH_SIZE = int(os.getenv("MESSAGE_RETENTION_BATCH_SIZE", "5000"))
+
+PARTITION_PREFIX = "messages_p"
+STAGING_TABLE = "messages_partitioned"
+PROGRESS_TABLE = "messages_partition_migration"
+SYNC_TRIGGER = "trg_messages_partition_sync"
+
+def month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+def add_months(d: date, months: int) -> date:
+    month = d.month - 1 + months
+    return date(d.year + month // 12, month % 12 + 1, 1)
+
+def partition_name(start: date) -> str:
+    return f"{PARTITION_PREFIX}{start.year:04d}_{start.month:02d}"
+
+def default_retention_days() -> Optional[int]:
+    return int(DEFAULT_RETENTION_DAYS) if DEFAULT_RETENTION_DAYS else None
+
+def messages_table_exists(conn) -> bool:
+    return conn.execute(text("SELECT to_regclass('public.messages') IS NOT NULL")).scalar()
+
+def is_messages_partitioned(conn) -> bool:
+    return conn.execute(text("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_partitioned_table pt
+            JOIN pg_class c ON c.oid = pt.partrelid
+            WHERE c.relname = 'messages'
+        )
+    """)).scalar()
+
+def create_partitioned_messages_table(conn):
+    """DDL da tabela messages particionada (schema novo)"""
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS messages (
+            id UUID NOT NULL DEFAULT gen_random_uuid(),
+            conversation_id UUID NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+            role messagerole NOT NULL,
+            content TEXT NOT NULL,
+            tokens INTEGER DEFAULT 0,
+            cost FLOAT DEFAULT 0.0,
+            processing_time FLOAT DEFAULT 0.0,
+            extra_data JSONB DEFAULT '{}'::jsonb,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS idx_messages_conversation_created "
+        "ON messages(conversation_id, created_at)"
+    ))
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {PARTITION_PREFIX}default PARTITION OF messages DEFAULT"))
+
+def list_message_partitions(conn, parent: str = "messages") -> List[Tuple[str, date, date]]:
+    """Partições mensais existentes: (nome, início, fim exclusivo)"""
+    rows = conn.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = :parent
+        ORDER BY c.relname
+    """), {"parent": parent}).fetchall()
+
+    partitions = []
+    for (name,) in rows:
+        suffix = name[len(PARTITION_PREFIX):]
+        try:
+            start = datetime.strptime(suffix, "%Y_%m").date()
+        except ValueError:
+            continue  # partição default
+        partitions.append((name, start, add_months(start, 1)))
+    return partitions
+
+def ensure_message_partitions(conn, months_ahead: int = MONTHS_AHEAD, since: Optional[date] = None,
+                              parent: str = "messages") -> List[str]:
+    """Cria partições mensais de `since` (default: mês atual) até months_ahead à frente"""
+    existing = {name for name, _, _ in list_message_partitions(conn, parent)}
+    current = month_start(since or datetime.utcnow().date())
+    last = add_months(month_start(datetime.utcnow().date()), months_ahead)
+
+    created = []
+    while current <= last:
+        name = partition_name(current)
+        if name not in existing:
+            conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {name} PARTITION OF {parent}
+                FOR VALUES FROM ('{current.isoformat()}') TO ('{add_months(current, 1).isoformat()}')
+            """))
+            created.append(name)
+        current = add_months(current, 1)
+    return created
+
+def run_migration_partitioning(conn):
+    """
+    Converte a tabela messages existente em tabela particionada (one-shot)
+
+    Uma transação com ACCESS EXCLUSIVE durante toda a cópia: só para tabelas
+    pequenas (MESSAGES_AUTO_PARTITION). Em produção use migrate_online.
+    """
+
+    print("  📦 Convertendo messages para tabela particionada...")
+
+    conn.execute(text("LOCK TABLE messages IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text("ALTER TABLE messages RENAME TO messages_legacy"))
+    conn.execute(text("ALTER INDEX IF EXISTS messages_pkey RENAME TO messages_legacy_pkey"))
+    conn.execute(text("ALTER INDEX IF EXISTS idx_messages_conversation_id RENAME TO idx_messages_legacy_conversation_id"))
+
+    create_partitioned_messages_table(conn)
+
+    oldest = conn.execute(text("SELECT MIN(created_at) FROM messages_legacy")).scalar()
+    created = ensure_message_partitions(conn, since=oldest.date() if oldest else None)
+    print(f"  📅 {len(created)} partição(ões) criada(s)")
+
+    conn.execute(text("""
+        INSERT INTO messages (
+            id, conversation_id, role, content, tokens, cost,
+            processing_time, extra_data, created_at
+        )
+        SELECT
+            id, conversation_id, role, content, tokens, cost,
+            processing_time, extra_data, COALESCE(created_at, CURRENT_TIMESTAMP)
+        FROM messages_legacy
+    """))
+    conn.execute(text("DROP TABLE messages_legacy"))
+    conn.commit()
+
+    print("  ✅ messages particionada!")
+
+def _message_columns(conn, table: str) -> List[str]:
+    return [row[0] for row in conn.execute(text("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = :table
+        ORDER BY ordinal_position
+    """), {"table": table})]
+
+def _copy_expressions(columns: List[str], source: str) -> str:
+    return ", ".join(
+        f"COALESCE({source}created_at, CURRENT_TIMESTAMP)" if column == "created_at" else f"{source}{column}"
+        for column in columns
+    )
+
+def prepare_online_migration(conn) -> bool:
+    """
+    Tabela de destino particionada + trigger de espelhamento (idempotente)
+
+    A partir do commit, toda escrita em messages também vai para
+    messages_partitioned; a cópia em lotes só precisa cobrir o que já existia.
+    """
+    if conn.execute(text(f"SELECT to_regclass('public.{STAGING_TABLE}') IS NOT NULL")).scalar():
+        return False
+
+    from app.core.message_search import SEARCH_INDEX_DEFINITION
+    from app.core.message_usage import USAGE_INDEX_COLUMNS, USAGE_INDEX_PREDICATE
+
+    print(f"  📦 Criando {STAGING_TABLE}...")
+    conn.execute(text(f"""
+        CREATE TABLE {STAGING_TABLE} (LIKE messages INCLUDING DEFAULTS)
+        PARTITION BY RANGE (created_at)
+    """))
+    conn.execute(text(f"ALTER TABLE {STAGING_TABLE} ADD PRIMARY KEY (id, created_at)"))
+    conn.execute(text(
+        f"ALTER TABLE {STAGING_TABLE} ADD FOREIGN KEY (conversation_id) "
+        f"REFERENCES conversations(id) ON DELETE CASCADE"
+    ))
+    conn.execute(text(f"CREATE TABLE {PARTITION_PREFIX}default PARTITION OF {STAGING_TABLE} DEFAULT"))
+
+    oldest = conn.execute(text("SELECT MIN(created_at) FROM messages")).scalar()
+    created = ensure_message_partitions(conn, since=oldest.date() if oldest else None, parent=STAGING_TABLE)
+    print(f"  📅 {len(created)} partição(ões) criada(s)")
+
+    # Índices com a tabela vazia (instantâneo); renomeados na troca
+    columns = _message_columns(conn, STAGING_TABLE)
+    conn.execute(text(
+        f"CREATE INDEX {STAGING_TABLE}_conversation_created ON {STAGING_TABLE}(conversation_id, created_at)"
+    ))
+    if "model" in columns:
+        conn.execute(text(
+            f"CREATE INDEX {STAGING_TABLE}_agent_usage ON {STAGING_TABLE} "
+            f"{USAGE_INDEX_COLUMNS} WHERE {USAGE_INDEX_PREDICATE}"
+        ))
+    if "search_vector" in columns:
+        conn.execute(text(f"CREATE INDEX {STAGING_TABLE}_search ON {STAGING_TABLE} {SEARCH_INDEX_DEFINITION}"))
+
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} (
+            id INTEGER PRIMARY KEY DEFAULT 1,
+            last_id UUID NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+            copied BIGINT NOT NULL DEFAULT 0,
+            done BOOLEAN NOT NULL DEFAULT false
+        )
+    """))
+    conn.execute(text(f"INSERT INTO {PROGRESS_TABLE} (id) VALUES (1) ON CONFLICT DO NOTHING"))
+
+    # Espelha INSERT/UPDATE/DELETE em messages enquanto a cópia anda
+    column_list = ", ".join(columns)
+    conn.execute(text(f"""
+        CREATE OR REPLACE FUNCTION {SYNC_TRIGGER}_fn() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM {STAGING_TABLE} WHERE id = OLD.id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO {STAGING_TABLE} ({column_list})
+                VALUES ({_copy_expressions(columns, "NEW.")})
+                ON CONFLICT DO NOTHING;
+            END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql
+    """))
+    conn.execute(text(f"""
+        CREATE TRIGGER {SYNC_TRIGGER}
+        AFTER INSERT OR UPDATE OR DELETE ON messages
+        FOR EACH ROW EXECUTE FUNCTION {SYNC_TRIGGER}_fn()
+    """))
+    conn.commit()
+    return True
+
+def copy_messages_batches(conn, batch_size: int = MIGRATION_BATCH_SIZE, pause: float = MIGRATION_PAUSE) -> int:
+    """
+    Copia messages -> messages_partitioned em lotes por id, commit por lote
+
+    FOR SHARE segura UPDATE/DELETE concorrentes nas linhas do lote até o
+    commit; o trigger deles então corrige a cópia. ON CONFLICT cobre linhas
+    que o trigger já espelhou.
+    """
+    columns = _message_columns(conn, STAGING_TABLE)
+    column_list = ", ".join(columns)
+    batch = text(f"""
+        WITH batch AS (
+            SELECT * FROM messages WHERE id > :last ORDER BY id LIMIT :batch_size FOR SHARE
+        ), copied AS (
+            INSERT INTO {STAGING_TABLE} ({column_list})
+            SELECT {_copy_expressions(columns, "")} FROM batch
+            ON CONFLICT DO NOTHING
+        )
+        SELECT (SELECT id FROM batch ORDER BY id DESC LIMIT 1), (SELECT COUNT(*) FROM batch)
+    """)
+
+    last, copied, done = conn.execute(text(f"SELECT last_id, copied, done FROM {PROGRESS_TABLE} WHERE id = 1")).one()
+    if copied:
+        print(f"  ↪️  Retomando após {copied} linha(s)")
+    total = 0
+    while not done:
+        batch_last, count = conn.execute(batch, {"last": str(last), "batch_size": batch_size}).one()
+        done = count < batch_size
+        if count:
+            last = batch_last
+        conn.execute(text(f"""
+            UPDATE {PROGRESS_TABLE} SET last_id = :last, copied = copied + :count, done = :done WHERE id = 1
+        """), {"last": str(last), "count": count, "done": done})
+        conn.commit()
+        total += count
+        if total and total % (batch_size * 20) == 0:
+            print(f"  📦 {copied + total} linha(s) copiada(s)")
+        if pause and not done:
+            time.sleep(pause)
+    return total
+
+def swap_partitioned_messages(conn, lock_timeout: str = MIGRATION_LOCK_TIMEOUT):
+    """Troca messages <-> messages_partitioned numa transação curta"""
+    from app.core.message_search import SEARCH_INDEX, ensure_search_trigger
+    from app.core.message_usage import USAGE_INDEX
+
+    conn.execute(text(f"SET LOCAL lock_timeout = '{lock_timeout}'"))
+    conn.execute(text("LOCK TABLE messages IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text(f"DROP TRIGGER IF EXISTS {SYNC_TRIGGER} ON messages"))
+
+    # Índices da tabela antiga liberam os nomes canônicos
+    legacy_indexes = [row[0] for row in conn.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE schemaname = 'public' AND tablename = 'messages'"
+    ))]
+    for name in legacy_indexes:
+        conn.execute(text(f"ALTER INDEX {name} RENAME TO {name[:56]}_legacy"))
+    conn.execute(text("ALTER TABLE messages RENAME TO messages_legacy"))
+
+    conn.execute(text(f"ALTER TABLE {STAGING_TABLE} RENAME TO messages"))
+    renames = {
+        f"{STAGING_TABLE}_pkey": "messages_pkey",
+        f"{STAGING_TABLE}_conversation_created": "idx_messages_conversation_created",
+        f"{STAGING_TABLE}_agent_usage": USAGE_INDEX,
+        f"{STAGING_TABLE}_search": SEARCH_INDEX,
+    }
+    for old, new in renames.items():
+        conn.execute(text(f"ALTER INDEX IF EXISTS {old} RENAME TO {new}"))
+    ensure_search_trigger(conn)
+    conn.execute(text(f"DROP TABLE {PROGRESS_TABLE}"))
+    conn.execute(text(f"DROP FUNCTION IF EXISTS {SYNC_TRIGGER}_fn()"))
+    conn.commit()
+
+def migrate_online(conn, batch_size: int = MIGRATION_BATCH_SIZE) -> Dict:
+    """prepare -> cópia em lotes -> troca; pode ser interrompido e rodado de novo"""
+    start = time.time()
+    prepare_online_migration(conn)
+    copied = copy_messages_batches(conn, batch_size)
+    try:
+        swap_partitioned_messages(conn)
+    except Exception as e:
+        conn.rollback()
+        print(f"  ⚠️ Troca não concluída ({e}); cópia preservada, rode migrate de novo")
+        raise
+    print("  ✅ messages particionada! (messages_legacy pode ser removida após conferência)")
+    return {"copied": copied, "duration": round(time.time() - start, 3)}
+
+def _agent_retention(conn) -> Tuple[Optional[int], List[Tuple[str, int]]]:
+    """
+    Retorna (horizonte global em dias, [(agent_id, dias)] com retenção mais curta)
+
+    O horizonte é a maior retenção efetiva entre os agentes; None significa
+    que algum agente guarda mensagens para sempre (nenhuma partição cai).
+    """
+    default = default_retention_days()
+    rows = conn.execute(text("SELECT id, message_retention_days FROM agents")).fetchall()
+
+    effective = [(str(agent_id), days if days is not None else default) for agent_id, days in rows]
+    if not effective or any(days is None for _, days in effective):
+        horizon = None
+    else:
+        horizon = max(days for _, days in effective)
+
+    shorter = [
+        (agent_id, days) for agent_id, days in effective
+        if days is not None and (horizon is None or days < horizon)
+    ]
+    return horizon, shorter
+
+def _delete_agent_messages(conn, agent_id: str, cutoff: datetime, batch_size: int) -> int:
+    """Remove mensagens expiradas de um agente em lotes curtos (commit por lote)"""
+    total = 0
+    while True:
+        result = conn.execute(text("""
+            DELETE FROM messages
+            WHERE (id, created_at) IN (
+                SELECT m.id, m.created_at
+                FROM messages m
+                JOIN conversations c ON c.id = m.conversation_id
+                WHERE c.agent_id = :agent_id AND m.created_at < :cutoff
+                LIMIT :batch_size
+            )
+        """), {"agent_id": agent_id, "cutoff": cutoff, "batch_size": batch_size})
+        conn.commit()
+        total += result.rowcount
+        if result.rowcount < batch_size:
+            return total
+
+def archive_partition(conn, name: str, archive_dir: str) -> str:
+    """Exporta a partição como CSV gzip (COPY TO STDOUT)"""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+    cursor = conn.connection.cursor()
+    try:
+        with gzip.open(path, "wt", encoding="utf-8") as fh:
+            cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER true)", fh)
+    finally:
+        cursor.close()
+    return path
+
+def apply_message_retention(
+    conn,
+    archive_dir: Optional[str] = ARCHIVE_DIR,
+    batch_size: int = RETENTION_BATCH_SIZE
+) -> Dict:
+    """Aplica retenção: deletes por agente + drop/arquivamento de partições"""
+    now = datetime.utcnow()
+    horizon, shorter = _agent_retention(conn)
+
+    deleted = 0
+    for agent_id, days in shorter:
+        deleted += _delete_agent_messages(conn, agent_id, now - timedelta(days=days), batch_size)
+
+    dropped, archived = [], []
+    if horizon is not None:
+        cutoff = (now - timedelta(days=horizon)).date()
+        for name, _, end in list_message_partitions(conn):
+            if end > cutoff:
+                continue
+            if archive_dir:
+                archived.append(archive_partition(conn, name, archive_dir))
+            conn.execute(text(f"ALTER TABLE messages DETACH PARTITION {name}"))
+            conn.execute(text(f"DROP TABLE {name}"))
+            conn.commit()
+            dropped.append(name)
+
+    return {
+        "horizon_days": horizon,
+        "deleted_messages": deleted,
+        "dropped_partitions": dropped,
+        "archived_files": archived
+    }
+
+def run_partition_maintenance() -> Dict:
+    """Job periódico: garante partições futuras e aplica retenção"""
+    from app.core.database import migration_engine
+
+    start = time.time()
+    with migration_engine().connect() as conn:
+        if not messages_table_exists(conn):
+            return {"skipped": "messages inexistente"}
+
+        if not is_messages_partitioned(conn):
+            if not AUTO_PARTITION:
+                return {"skipped": "messages não particionada"}
+            run_migration_partitioning(conn)
+
+        created = ensure_message_partitions(conn)
+        conn.commit()
+
+        report = apply_message_retention(conn)
+
+    report["created_partitions"] = created
+    report["duration"] = round(time.time() - start, 3)
+    if created or report["dropped_partitions"] or report["deleted_messages"]:
+        print(f"📅 Manutenção de partições: {report}")
+    return report
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "maintain"
+
+    if command == "migrate":
+        from app.core.database import migration_engine
+        with migration_engine().connect() as conn:
+            if is_messages_partitioned(conn):
+                print("✅ messages já particionada")
+            else:
+                size = int(sys.argv[2]) if len(sys.argv) > 2 else MIGRATION_BATCH_SIZE
+                print(migrate_online(conn, size))
+    elif command == "maintain":
+        print(run_partition_maintenance())
+    else:
+        print(f"Comando desconhecido: {command} (use migrate|maintain)")
+        sys.exit(1)
@@ -0,0 +1,37 @@
+"""
+Período [start, end) dos endpoints de consulta (busca, analytics)
+
+start/end chegam da query string com ou sem fuso ("2024-05-01T00:00:00Z",
+"2024-05-01T00:00:00-03:00" ou "2024-05-01T00:00:00"). Tudo é convertido para
+UTC sem tzinfo, o mesmo referencial de datetime.utcnow() usado como padrão,
+para que as comparações nunca misturem datetimes naive e aware (TypeError).
+Valores sem fuso já são tratados como UTC.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+
+def to_utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """Datetime com fuso -> UTC sem tzinfo; sem fuso (já UTC) passa direto"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def resolve_period(
+    start: Optional[datetime],
+    end: Optional[datetime],
+    days: int,
+    max_days: int
+) -> Tuple[datetime, datetime]:
+    """
+    Período [start, end) em UTC; sem end vai até agora, sem start volta `days`
+    dias a partir de end. 400 se start >= end ou se passar de `max_days`.
+    """
+    end = to_utc_naive(end) or datetime.utcnow()
+    start = to_utc_naive(start) or end - timedelta(days=days)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start deve ser anterior a end")
+    if end - start > timedelta(days=max_days):
+        raise HTTPException(status_code=400, detail=f"Período máximo: {max_days} dias")
+    return start, end
@@ -0,0 +1,80 @@
+"""
+Configuração de pool das engines (direto no Postgres ou via PgBouncer)
+
+DB_POOL_MODE=session (padrão): conexão direta no Postgres, QueuePool do
+SQLAlchemy com pool_pre_ping - comportamento de sempre.
+
+DB_POOL_MODE=pgbouncer: DATABASE_URL aponta para um PgBouncer em
+pool_mode=transaction. Nesse modo:
+- pool local pequeno (DB_POOL_SIZE=2, DB_MAX_OVERFLOW=3) ou NullPool com DB_POOL_SIZE=0;
+  quem segura as conexões de servidor é o PgBouncer
+- sem pool_pre_ping (o PgBouncer já descarta conexões de servidor mortas)
+- sem parâmetros de sessão no startup (options=-c ...) nem SET de sessão;
+  o psycopg2 não usa prepared statements no servidor
+- migrations, DDL, COPY e manutenção de partições usam MIGRATION_DATABASE_URL
+  (conexão direta no Postgres, fora do PgBouncer) via migration_engine()
+"""
+import os
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.pool import NullPool
+
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "session").lower()
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+MIGRATION_DATABASE_URL = os.getenv("MIGRATION_DATABASE_URL")
+
+# (pool_size, max_overflow) padrão por modo; DB_POOL_SIZE/DB_MAX_OVERFLOW sobrescrevem
+POOL_DEFAULTS = {"session": (5, 10), "pgbouncer": (2, 3)}
+
+def is_pgbouncer(mode: Optional[str] = None) -> bool:
+    return (mode or DB_POOL_MODE) == "pgbouncer"
+
+def pool_limits(mode: Optional[str] = None) -> Tuple[int, int]:
+    size, overflow = POOL_DEFAULTS["pgbouncer" if is_pgbouncer(mode) else "session"]
+    return (
+        int(os.getenv("DB_POOL_SIZE", str(size))),
+        int(os.getenv("DB_MAX_OVERFLOW", str(overflow)))
+    )
+
+def normalize_url(url: Optional[str]) -> Optional[str]:
+    if url and url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql://", 1)
+    return url
+
+def engine_kwargs(connect_args: Optional[Dict] = None, mode: Optional[str] = None) -> Dict:
+    """
+    kwargs de create_engine para o modo atual
+
+    `connect_args` com "options" (parâmetros de sessão no startup) só vale
+    em conexão direta; atrás do PgBouncer é descartado.
+    """
+    connect_args = dict(connect_args or {})
+    pool_size, max_overflow = pool_limits(mode)
+
+    if not is_pgbouncer(mode):
+        return {
+            "pool_pre_ping": True,
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "connect_args": connect_args
+        }
+
+    connect_args.pop("options", None)
+    if pool_size <= 0:
+        return {"poolclass": NullPool, "connect_args": connect_args}
+
+    return {
+        "pool_pre_ping": False,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "connect_args": connect_args
+    }
+
+def migration_url(default_url: str) -> str:
+    """Conexão direta para DDL; no modo pgbouncer exige MIGRATION_DATABASE_URL"""
+    if MIGRATION_DATABASE_URL:
+        return normalize_url(MIGRATION_DATABASE_URL)
+    if is_pgbouncer():
+        print("⚠️ DB_POOL_MODE=pgbouncer sem MIGRATION_DATABASE_URL: migrations passarão pelo PgBouncer")
+    return default_url
@@ -0,0 +1,178 @@
+"""
+Réplicas de leitura - roteamento de sessões com fallback para o primário
+
+REPLICA_DATABASE_URLS (separadas por vírgula) habilita o roteamento. Sem
+réplicas configuradas tudo continua no primário, sem mudança de comportamento.
+
+- Dependências só de leitura (listagens, get, config pública, histórico,
+  analytics) usam read_session()/get_read_db e vão para uma réplica saudável
+  (round-robin).
+- Lag: medido a cada REPLICA_LAG_CHECK_INTERVAL segundos pelo job
+  "replica_lag" do scheduler (fora do event loop); sem scheduler, a própria
+  escolha recheca quando a medição fica velha. Réplica fora do ar ou com lag
+  acima de REPLICA_MAX_LAG_SECONDS sai da rotação até a próxima checagem boa.
+- Read-your-writes: escritas chamam mark_written(chave) e leituras com a
+  mesma chave ficam no primário por READ_YOUR_WRITES_SECONDS. O registro é
+  por processo; entre workers vale o limite de lag acima.
+- Escritas (chat, CRUD) continuam sempre no primário (SessionLocal/get_db).
+"""
+import itertools
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core import metrics
+from app.core.pooling import engine_kwargs, normalize_url
+
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "5"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+READ_YOUR_WRITES_MAX_KEYS = 100_000
+
+# Em dia (tudo recebido já aplicado) = lag 0, mesmo com o primário ocioso
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+def _mask(url: str) -> str:
+    """URL sem credenciais (para logs e métricas)"""
+    return url.rsplit("@", 1)[-1]
+
+@dataclass
+class Replica:
+    name: str
+    engine: object
+    Session: sessionmaker
+    lag: Optional[float] = None
+    healthy: bool = False
+    checked_at: float = 0.0
+    error: Optional[str] = None
+
+def _build_replicas(urls: List[str]) -> List[Replica]:
+    replicas = []
+    for url in urls:
+        url = normalize_url(url)
+        engine = create_engine(
+            url,
+            **engine_kwargs({"connect_timeout": 3, "options": "-c default_transaction_read_only=on"})
+        )
+        replicas.append(Replica(
+            name=_mask(url),
+            engine=engine,
+            Session=sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        ))
+    return replicas
+
+REPLICA_DATABASE_URLS = [u.strip() for u in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if u.strip()]
+
+_replicas: List[Replica] = _build_replicas(REPLICA_DATABASE_URLS)
+_round_robin = itertools.count()
+_check_lock = threading.Lock()
+_written: Dict[str, float] = {}
+_written_lock = threading.Lock()
+
+def configure(urls: List[str]):
+    """Troca o conjunto de réplicas (scripts de verificação)"""
+    global _replicas
+    for replica in _replicas:
+        replica.engine.dispose()
+    _replicas = _build_replicas(urls)
+
+def dispose_engines(close: bool = True):
+    for replica in _replicas:
+        replica.engine.dispose(close=close)
+
+def check_replica(replica: Replica):
+    try:
+        with replica.engine.connect() as conn:
+            lag = float(conn.execute(text(LAG_SQL)).scalar() or 0.0)
+        replica.lag = lag
+        replica.healthy = lag <= REPLICA_MAX_LAG_SECONDS
+        replica.error = None if replica.healthy else f"lag {lag:.1f}s"
+    except Exception as e:
+        replica.healthy = False
+        replica.error = str(e).splitlines()[0]
+    replica.checked_at = time.monotonic()
+
+def refresh_lag(max_age: float = 0.0, block: bool = True):
+    """Rechecagem das réplicas medidas há mais de `max_age` segundos"""
+    now = time.monotonic()
+    due = [r for r in _replicas if now - r.checked_at >= max_age]
+    if not due or not _check_lock.acquire(blocking=block):
+        return
+    try:
+        for replica in due:
+            check_replica(replica)
+    finally:
+        _check_lock.release()
+
+def pick_replica() -> Optional[Replica]:
+    if not _replicas:
+        return None
+    # Fallback se o job do scheduler não estiver rodando
+    refresh_lag(max_age=REPLICA_LAG_CHECK_INTERVAL * 3, block=False)
+    healthy = [r for r in _replicas if r.healthy]
+    if not healthy:
+        return None
+    return healthy[next(_round_robin) % len(healthy)]
+
+def mark_written(*keys: str):
+    """Leituras dessas chaves ficam no primário por READ_YOUR_WRITES_SECONDS"""
+    if not _replicas:
+        return
+    until = time.monotonic() + READ_YOUR_WRITES_SECONDS
+    with _written_lock:
+        for key in keys:
+            _written[key] = until
+        if len(_written) > READ_YOUR_WRITES_MAX_KEYS:
+            now = time.monotonic()
+            for key in [k for k, t in _written.items() if t < now]:
+                del _written[key]
+
+def recently_written(key: Optional[str]) -> bool:
+    if key is None:
+        return False
+    with _written_lock:
+        until = _written.get(key)
+    return until is not None and until > time.monotonic()
+
+def read_session(primary_factory: Callable[[], Session], pin_key: Optional[str] = None) -> Session:
+    """Sessão de leitura: réplica saudável ou, em fallback, o primário"""
+    if not _replicas:
+        return primary_factory()
+
+    if recently_written(pin_key):
+        metrics.inc("db_read_sessions_total", target="primary", reason="read_your_writes")
+        return primary_factory()
+
+    replica = pick_replica()
+    if replica is None:
+        metrics.inc("db_read_sessions_total", target="primary", reason="no_healthy_replica")
+        return primary_factory()
+
+    metrics.inc("db_read_sessions_total", target="replica", reason="ok")
+    return replica.Session()
+
+def status() -> List[Dict]:
+    return [
+        {"replica": r.name, "healthy": r.healthy, "lag_seconds": r.lag, "error": r.error}
+        for r in _replicas
+    ]
+
+metrics.register_collector(lambda: [
+    sample
+    for r in _replicas
+    for sample in (
+        ("db_replica_healthy", {"replica": r.name}, 1 if r.healthy else 0),
+        ("db_replica_lag_seconds", {"replica": r.name}, r.lag if r.lag is not None else -1)
+    )
+])
@@ -0,0 +1,160 @@
+"""
+Scheduler - Tarefas periódicas em background
+
+Jobs são funções síncronas (trabalho de banco) executadas em thread para
+não bloquear o event loop. Registre no import/startup e chame
+start_scheduler() / stop_scheduler() nos eventos da aplicação.
+
+Vários workers no mesmo host (gunicorn.conf.py): jobs `leader_only`
+(manutenção no banco: partições, purge, reaper...) rodam só no worker que
+segura o flock em SCHEDULER_LOCK_FILE; os outros tentam de novo a cada
+SCHEDULER_LEADER_RETRY segundos e assumem se o líder morrer. Jobs de estado
+local (saúde do banco, lag de réplicas) rodam em todos. Sem
+SCHEDULER_LOCK_FILE, todo processo é líder.
+
+Tarefas longas que não podem rodar em dobro (poller de e-mail) usam
+run_as_leader: esperam a liderança, independente de SCHEDULER_ENABLED.
+"""
+import asyncio
+import os
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+from app.core import metrics
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+SCHEDULER_LOCK_FILE = os.getenv("SCHEDULER_LOCK_FILE")
+SCHEDULER_LEADER_RETRY = float(os.getenv("SCHEDULER_LEADER_RETRY", "15"))
+
+@dataclass
+class Job:
+    name: str
+    interval_seconds: float
+    func: Callable[[], object]
+    initial_delay: float = 0.0
+    leader_only: bool = False
+    last_run_at: Optional[float] = None
+    last_duration: Optional[float] = None
+    last_result: object = None
+    last_error: Optional[str] = None
+    runs: int = 0
+
+_jobs: Dict[str, Job] = {}
+_tasks: List[asyncio.Task] = []
+_leader_tasks: List[asyncio.Task] = []
+_lock_file = None
+
+def register_job(
+    name: str,
+    interval_seconds: float,
+    func: Callable[[], object],
+    initial_delay: float = 0.0,
+    leader_only: bool = False
+) -> Job:
+    """Registra (ou substitui) um job periódico"""
+    job = Job(
+        name=name,
+        interval_seconds=interval_seconds,
+        func=func,
+        initial_delay=initial_delay,
+        leader_only=leader_only
+    )
+    _jobs[name] = job
+    return job
+
+def get_jobs() -> Dict[str, Job]:
+    return dict(_jobs)
+
+def run_job_once(name: str) -> object:
+    """Executa um job imediatamente (síncrono), registrando resultado"""
+    job = _jobs[name]
+    start = time.time()
+    try:
+        job.last_result = job.func()
+        job.last_error = None
+    except Exception as e:
+        job.last_error = str(e)
+        print(f"⚠️ Job {job.name} falhou: {e}")
+        traceback.print_exc()
+    finally:
+        job.runs += 1
+        job.last_run_at = start
+        job.last_duration = time.time() - start
+    return job.last_result
+
+async def _loop(job: Job):
+    if job.initial_delay:
+        await asyncio.sleep(job.initial_delay)
+    while True:
+        await asyncio.to_thread(run_job_once, job.name)
+        await asyncio.sleep(job.interval_seconds)
+
+def is_leader() -> bool:
+    return SCHEDULER_LOCK_FILE is None or fcntl is None or _lock_file is not None
+
+def _try_acquire_leadership() -> bool:
+    """flock não bloqueante; o SO libera o lock quando o processo morre"""
+    global _lock_file
+    if is_leader():
+        return True
+    handle = open(SCHEDULER_LOCK_FILE, "a")
+    try:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    _lock_file = handle
+    return True
+
+def _start_jobs(jobs: List[Job]):
+    for job in jobs:
+        _tasks.append(asyncio.create_task(_loop(job), name=f"job:{job.name}"))
+
+async def _await_leadership(jobs: List[Job]):
+    while not _try_acquire_leadership():
+        await asyncio.sleep(SCHEDULER_LEADER_RETRY)
+    print(f"👑 Scheduler: worker {os.getpid()} assumiu {len(jobs)} job(s) de líder")
+    _start_jobs(jobs)
+
+def run_as_leader(name: str, factory: Callable[[], Awaitable[object]]) -> asyncio.Task:
+    """Roda factory() só no líder; se ele morrer, outro worker assume e começa do zero"""
+    async def runner():
+        while not _try_acquire_leadership():
+            await asyncio.sleep(SCHEDULER_LEADER_RETRY)
+        print(f"👑 {name}: rodando no worker {os.getpid()}")
+        await factory()
+
+    task = asyncio.create_task(runner(), name=f"leader:{name}")
+    _leader_tasks.append(task)
+    return task
+
+def start_scheduler():
+    """Inicia um task asyncio por job (os `leader_only` só no líder)"""
+    if not SCHEDULER_ENABLED or _tasks:
+        return
+    local = [job for job in _jobs.values() if not job.leader_only]
+    leader = [job for job in _jobs.values() if job.leader_only]
+    _start_jobs(local)
+    if leader and _try_acquire_leadership():
+        _start_jobs(leader)
+    elif leader:
+        _tasks.append(asyncio.create_task(_await_leadership(leader), name="scheduler:leader"))
+    print(f"⏱️ Scheduler iniciado ({len(_tasks)} job(s), líder: {'sim' if is_leader() else 'não'})")
+
+async def stop_scheduler():
+    """Cancela os jobs (e as tarefas de líder) e aguarda o término"""
+    tasks = _tasks + _leader_tasks
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _tasks.clear()
+    _leader_tasks.clear()
+
+metrics.register_collector(lambda: [("scheduler_leader", {}, 1 if is_leader() else 0)])
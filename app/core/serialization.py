@@ -0,0 +1,60 @@
+"""
+Serialização JSON rápida
+
+Usa orjson quando instalado (datetime, UUID e Enum nativos), com fallback
+para o json da stdlib. Endpoints quentes devolvem FastJSONResponse com
+dicts montados direto do ORM: o FastAPI não repassa pelo response_model
+nem pelo jsonable_encoder quando recebe um Response pronto.
+"""
+import json
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Iterable, Sequence
+
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependência opcional
+    orjson = None
+
+def _default(obj: Any):
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Tipo não serializável: {type(obj).__name__}")
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def row_to_dict(obj: Any, fields: Sequence[str]) -> dict:
+    """Copia atributos de um objeto/row ORM sem validação Pydantic"""
+    return {name: getattr(obj, name) for name in fields}
+
+def rows_to_dicts(rows: Iterable[Any], fields: Sequence[str]) -> list:
+    return [{name: getattr(row, name) for name in fields} for row in rows]
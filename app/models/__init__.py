@@ -1,6 +1,7 @@
 """SQLAlchemy Models"""
-from sqlalchemy import Column, String, Float, Boolean, Integer, Text, DateTime, ForeignKey, Enum
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy import Column, String, Float, Boolean, Integer, BigInteger, Text, DateTime, ForeignKey, Enum
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 import uuid
 import enum
@@ -68,12 +69,24 @@ class Agent(Base):
     meta_description = Column(String(500), nullable=True)
     og_image_url = Column(String(500), nullable=True)
     
+    # Retenção (None = MESSAGE_RETENTION_DAYS / para sempre)
+    message_retention_days = Column(Integer, nullable=True)
+    
+    # Minutos sem mensagem até o reaper fechar a conversa (None = CONVERSATION_IDLE_MINUTES, default 0; 0 = nunca)
+    idle_timeout_minutes = Column(Integer, nullable=True)
+    
+    # Hedged requests (app.services.hedging)
+    hedging_enabled = Column(Boolean, nullable=False, default=False)
+    hedging_fallback_model = Column(String(100), nullable=True)
+    
     # Legacy
     status = Column(Enum(AgentStatus), nullable=False, default=AgentStatus.active)
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # Soft delete: removido de vez pelo purge (app.services.purge) após a carência
+    deleted_at = Column(DateTime, nullable=True)
 
 class Conversation(Base):
     __tablename__ = "conversations"
@@ -85,10 +98,17 @@ class Conversation(Base):
     channel = Column(String(50), nullable=False, default="web")
     status = Column(Enum(ConversationStatus), nullable=False, default=ConversationStatus.active)
     extra_data = Column(JSONB, default={})
+    # Incrementado a cada mensagem gravada: versão para o cache de conversas
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
+    # Somas de messages.tokens/cost, mantidas por add_message (sem agregação na listagem)
+    total_tokens = Column(BigInteger, nullable=False, default=0, server_default="0")
+    total_cost = Column(Float, nullable=False, default=0.0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
 class Message(Base):
+    """Tabela particionada por mês em created_at (ver app.core.partitions)"""
     __tablename__ = "messages"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -98,6 +118,15 @@ class Message(Base):
     tokens = Column(Integer, default=0)
     cost = Column(Float, default=0.0)
     processing_time = Column(Float, default=0.0)
+    # Uso tipado (respostas do assistente); agent_id desnormalizado da conversa
+    agent_id = Column(UUID(as_uuid=True), nullable=True)
+    model = Column(String(100), nullable=True)
+    input_tokens = Column(Integer, nullable=True)
+    output_tokens = Column(Integer, nullable=True)
+    cached_tokens = Column(Integer, nullable=True)
+    ttft_ms = Column(Integer, nullable=True)
+    # Mantida por trigger no banco (app.core.message_search); fora dos SELECTs
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
     extra_data = Column(JSONB, default={})
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
@@ -0,0 +1,169 @@
+"""
+Cache de conversas quentes - janela recente de mensagens por worker
+
+Cada turno relia as últimas mensagens do Postgres logo depois de o próprio
+worker tê-las gravado. Aqui fica um LRU limitado (por número de conversas e
+por bytes) com a janela recente de cada conversa ativa: preenchido na
+primeira leitura, atualizado a cada mensagem gravada e expirado por ociosidade.
+
+Consistência entre réplicas: conversations.message_count é incrementado
+atomicamente a cada mensagem gravada e funciona como versão. Uma entrada só
+é usada se a versão bater com a do banco; se outra réplica gravou no meio,
+a versão diverge, a entrada é descartada e a janela é relida do banco.
+"""
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional
+
+from app.core import metrics
+
+CONVERSATION_CACHE_SIZE = int(os.getenv("CONVERSATION_CACHE_SIZE", "5000"))
+CONVERSATION_CACHE_MAX_BYTES = int(os.getenv("CONVERSATION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CONVERSATION_CACHE_WINDOW = int(os.getenv("CONVERSATION_CACHE_WINDOW", "64"))
+CONVERSATION_CACHE_IDLE_SECONDS = float(os.getenv("CONVERSATION_CACHE_IDLE_SECONDS", "1800"))
+
+# Overhead aproximado por mensagem (objeto, uuid, datetime, enum)
+_MESSAGE_OVERHEAD = 200
+
+@dataclass
+class CachedMessage:
+    """Mesmos atributos de Message usados no histórico e no prompt"""
+    id: uuid.UUID
+    role: object
+    content: str
+    created_at: datetime
+
+    @classmethod
+    def from_model(cls, message) -> "CachedMessage":
+        return cls(message.id, message.role, message.content, message.created_at)
+
+    @property
+    def size(self) -> int:
+        return sys.getsizeof(self.content) + _MESSAGE_OVERHEAD
+
+@dataclass
+class _Window:
+    version: int
+    messages: List[CachedMessage]
+    complete: bool  # True = contém todas as mensagens da conversa
+    last_access: float = field(default_factory=time.monotonic)
+    size: int = 0
+
+class ConversationCache:
+    """LRU de janelas de mensagens, versionado por message_count"""
+
+    def __init__(
+        self,
+        max_conversations: int = CONVERSATION_CACHE_SIZE,
+        max_bytes: int = CONVERSATION_CACHE_MAX_BYTES,
+        window: int = CONVERSATION_CACHE_WINDOW,
+        idle_seconds: float = CONVERSATION_CACHE_IDLE_SECONDS
+    ):
+        self.max_conversations = max_conversations
+        self.max_bytes = max_bytes
+        self.window = window
+        self.idle_seconds = idle_seconds
+        self._data: "OrderedDict[uuid.UUID, _Window]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+
+    def _drop(self, conversation_id: uuid.UUID):
+        entry = self._data.pop(conversation_id, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def _trim(self, entry: _Window):
+        overflow = len(entry.messages) - self.window
+        if overflow > 0:
+            removed = entry.messages[:overflow]
+            del entry.messages[:overflow]
+            entry.size -= sum(m.size for m in removed)
+            self.bytes -= sum(m.size for m in removed)
+            entry.complete = False
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._data:
+            conversation_id, oldest = next(iter(self._data.items()))
+            over_capacity = len(self._data) > self.max_conversations or self.bytes > self.max_bytes
+            if not over_capacity and now - oldest.last_access < self.idle_seconds:
+                break
+            self._drop(conversation_id)
+            metrics.inc("conversation_cache_evictions_total", reason="capacity" if over_capacity else "idle")
+
+    def get(self, conversation_id: uuid.UUID, version: int, limit: int) -> Optional[List[CachedMessage]]:
+        """Últimas `limit` mensagens (cronológicas) ou None se ausente/desatualizado"""
+        with self._lock:
+            entry = self._data.get(conversation_id)
+            if entry is None:
+                metrics.inc("conversation_cache_requests_total", result="miss")
+                return None
+            if entry.version != version or time.monotonic() - entry.last_access > self.idle_seconds:
+                self._drop(conversation_id)
+                metrics.inc("conversation_cache_requests_total", result="stale")
+                return None
+            if len(entry.messages) < limit and not entry.complete:
+                metrics.inc("conversation_cache_requests_total", result="short")
+                return None
+            entry.last_access = time.monotonic()
+            self._data.move_to_end(conversation_id)
+            metrics.inc("conversation_cache_requests_total", result="hit")
+            return entry.messages[-limit:]
+
+    def put(self, conversation_id: uuid.UUID, version: int, messages: List, complete: bool):
+        """Guarda a janela lida do banco (mensagens em ordem cronológica)"""
+        cached = [m if isinstance(m, CachedMessage) else CachedMessage.from_model(m) for m in messages]
+        entry = _Window(version=version, messages=cached, complete=complete)
+        entry.size = sum(m.size for m in cached)
+        with self._lock:
+            self._drop(conversation_id)
+            self._data[conversation_id] = entry
+            self.bytes += entry.size
+            self._trim(entry)
+            self._evict()
+
+    def append(self, conversation_id: uuid.UUID, version: int, message: CachedMessage):
+        """Mensagem recém-gravada; `version` é o message_count após a gravação"""
+        with self._lock:
+            entry = self._data.get(conversation_id)
+            if entry is None:
+                return
+            if entry.version != version - 1:
+                # Outra réplica gravou no meio: relê do banco na próxima leitura
+                self._drop(conversation_id)
+                metrics.inc("conversation_cache_requests_total", result="conflict")
+                return
+            entry.version = version
+            entry.messages.append(message)
+            entry.size += message.size
+            entry.last_access = time.monotonic()
+            self.bytes += message.size
+            self._data.move_to_end(conversation_id)
+            self._trim(entry)
+            self._evict()
+
+    def invalidate(self, conversation_id: uuid.UUID):
+        with self._lock:
+            self._drop(conversation_id)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+conversation_cache = ConversationCache()
+
+metrics.register_collector(lambda: [
+    ("conversation_cache_entries", {}, len(conversation_cache)),
+    ("conversation_cache_bytes", {}, conversation_cache.bytes),
+    ("conversation_cache_max_bytes", {}, conversation_cache.max_bytes)
+])
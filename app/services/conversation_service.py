@@ -1,11 +1,30 @@
 """Conversation Service"""
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from typing import List, Dict
+from sqlalchemy import desc, func, tuple_, update
+from typing import AsyncIterator, List, Dict, Optional
+from dataclasses import dataclass
+from datetime import datetime
 import uuid
 
+from app.core.pagination import Cursor
+
 from app.models import Agent, Conversation, Message, MessageRole, ConversationStatus
-from app.services.llm_service import LLMService
+from app.services.conversation_cache import CachedMessage, conversation_cache
+from app.services import hedging, prompt_builder, tools
+from app.services.hedging import HedgePolicy
+from app.services.prompt_builder import PromptPrefix
+
+@dataclass
+class ChatContext:
+    """Agente + conversa resolvidos uma vez (ex.: no connect do WebSocket)"""
+    agent_id: uuid.UUID
+    prefix: PromptPrefix
+    model: str
+    temperature: float
+    conversation_id: uuid.UUID
+    conversation_started_at: datetime
+    hedging: Optional[HedgePolicy] = None
+    function_calling: bool = False
 
 class ConversationService:
     
@@ -43,11 +62,30 @@ class ConversationService:
     def get_conversation_history(
         db: Session,
         conversation_id: uuid.UUID,
-        limit: int = 20
+        limit: int = 20,
+        since: Optional[datetime] = None,
+        before: Optional[Cursor] = None
     ) -> List[Message]:
-        messages = db.query(Message).filter(
+        """
+        Últimas `limit` mensagens em ordem cronológica
+        
+        `since` (normalmente conversation.created_at) limita a busca às
+        partições mensais a partir do início da conversa (partition pruning).
+        `before` = (created_at, id) pagina para mensagens mais antigas (keyset).
+        """
+        query = db.query(Message).filter(
             Message.conversation_id == conversation_id
-        ).order_by(desc(Message.created_at)).limit(limit).all()
+        )
+        
+        if since is not None:
+            query = query.filter(Message.created_at >= since)
+        
+        if before is not None:
+            query = query.filter(tuple_(Message.created_at, Message.id) < tuple_(*before))
+        
+        messages = query.order_by(
+            desc(Message.created_at), desc(Message.id)
+        ).limit(limit).all()
         
         return list(reversed(messages))
     
@@ -68,56 +106,224 @@ class ConversationService:
             db, agent_id, user_identifier, channel
         )
         
-        user_msg = Message(
-            conversation_id=conversation.id,
-            role=MessageRole.user,
-            content=user_message,
-            tokens=0,
-            cost=0.0
+        conversation_id = conversation.id
+        started_at = conversation.created_at
+        
+        version = ConversationService.add_message(
+            db, conversation_id, MessageRole.user, user_message, agent_id=agent_id
         )
-        db.add(user_msg)
+        
+        history = ConversationService.get_recent_messages(
+            db, conversation_id, version, limit=20, since=started_at
+        )
+        
+        prefix = prompt_builder.get_prefix(agent)
+        messages = prompt_builder.build_messages(prefix, history)
+        
+        if agent.function_calling_enabled:
+            llm_response = await tools.run_tool_loop(
+                messages=messages,
+                model=agent.model,
+                temperature=agent.temperature,
+                policy=HedgePolicy.from_agent(agent)
+            )
+        else:
+            llm_response = await hedging.generate_response(
+                messages=messages,
+                model=agent.model,
+                temperature=agent.temperature,
+                policy=HedgePolicy.from_agent(agent)
+            )
+        
+        ConversationService.save_assistant_message(db, conversation_id, llm_response, prefix, agent_id)
+        
+        return {
+            "conversation_id": str(conversation_id),
+            "response": llm_response["content"],
+            "tokens": llm_response["tokens"],
+            "cost": llm_response["cost"],
+            "processing_time": llm_response["processing_time"]
+        }
+    
+    @staticmethod
+    def add_message(
+        db: Session,
+        conversation_id: uuid.UUID,
+        role: MessageRole,
+        content: str,
+        **fields
+    ) -> int:
+        """
+        Grava a mensagem, incrementa conversations.message_count (e os totais
+        de tokens/custo) na mesma transação e atualiza o cache. Retorna a
+        nova versão (message_count).
+        """
+        message_id = uuid.uuid4()
+        db.add(Message(id=message_id, conversation_id=conversation_id, role=role, content=content, **fields))
+        
+        # now() é o instante da transação: igual ao created_at da mensagem.
+        # Conversa fechada pelo reaper volta a ativa se receber mensagem.
+        version, created_at = db.execute(
+            update(Conversation)
+            .where(Conversation.id == conversation_id)
+            .values(
+                message_count=Conversation.message_count + 1,
+                total_tokens=Conversation.total_tokens + (fields.get("tokens") or 0),
+                total_cost=Conversation.total_cost + (fields.get("cost") or 0.0),
+                last_message_at=func.now(),
+                status=ConversationStatus.active
+            )
+            .returning(Conversation.message_count, Conversation.last_message_at)
+        ).one()
         db.commit()
         
-        history = ConversationService.get_conversation_history(
-            db, conversation.id, limit=20
+        conversation_cache.append(
+            conversation_id, version, CachedMessage(message_id, role, content, created_at)
         )
+        return version
+    
+    @staticmethod
+    def get_recent_messages(
+        db: Session,
+        conversation_id: uuid.UUID,
+        version: int,
+        limit: int = 20,
+        since: Optional[datetime] = None
+    ) -> List:
+        """
+        Últimas `limit` mensagens, do cache quando a versão confere
         
-        messages = [
-            {"role": "system", "content": agent.system_prompt}
-        ]
+        `version` é o message_count atual da conversa; no miss a janela é
+        lida do banco (get_conversation_history) e volta para o cache.
+        """
+        window = conversation_cache.window
+        if limit > window:
+            return ConversationService.get_conversation_history(
+                db, conversation_id, limit=limit, since=since
+            )
         
-        for msg in history:
-            messages.append({
-                "role": msg.role.value,
-                "content": msg.content
-            })
+        cached = conversation_cache.get(conversation_id, version, limit)
+        if cached is not None:
+            return cached
         
-        llm_response = await LLMService.generate_response(
-            messages=messages,
-            model=agent.model,
-            temperature=agent.temperature
+        history = ConversationService.get_conversation_history(
+            db, conversation_id, limit=window, since=since
         )
+        conversation_cache.put(conversation_id, version, history, complete=len(history) < window)
+        return history[-limit:]
+    
+    @staticmethod
+    def save_assistant_message(
+        db: Session,
+        conversation_id: uuid.UUID,
+        llm_response: Dict,
+        prefix: PromptPrefix,
+        agent_id: uuid.UUID
+    ) -> int:
+        """Uso em colunas tipadas; extra_data só guarda o que não é agregado"""
+        prompt_builder.record_usage(agent_id, llm_response)
+        extra_data = {"prefix_hash": prefix.hash}
+        if llm_response.get("hedge"):
+            extra_data["hedge"] = llm_response["hedge"]
+        if llm_response.get("tools"):
+            extra_data["tools"] = llm_response["tools"]
         
-        assistant_msg = Message(
-            conversation_id=conversation.id,
-            role=MessageRole.assistant,
-            content=llm_response["content"],
+        first_token_time = llm_response.get("first_token_time")
+        
+        return ConversationService.add_message(
+            db,
+            conversation_id,
+            MessageRole.assistant,
+            llm_response["content"],
+            agent_id=agent_id,
+            model=llm_response["model"],
+            input_tokens=llm_response["input_tokens"],
+            output_tokens=llm_response["output_tokens"],
+            cached_tokens=llm_response.get("cached_tokens", 0),
+            ttft_ms=round(first_token_time * 1000) if first_token_time is not None else None,
             tokens=llm_response["tokens"],
             cost=llm_response["cost"],
             processing_time=llm_response["processing_time"],
-            extra_data={
-                "model": llm_response["model"],
-                "input_tokens": llm_response["input_tokens"],
-                "output_tokens": llm_response["output_tokens"]
-            }
+            extra_data=extra_data
+        )
+    
+    @staticmethod
+    def open_context(
+        db: Session,
+        agent: Agent,
+        user_identifier: str,
+        channel: str = "web"
+    ) -> ChatContext:
+        """Resolve a conversa e copia o necessário do agente (sobrevive ao db.close())"""
+        conversation = ConversationService.get_or_create_conversation(
+            db, agent.id, user_identifier, channel
         )
-        db.add(assistant_msg)
-        db.commit()
         
-        return {
-            "conversation_id": str(conversation.id),
-            "response": llm_response["content"],
-            "tokens": llm_response["tokens"],
-            "cost": llm_response["cost"],
-            "processing_time": llm_response["processing_time"]
-        }
+        return ChatContext(
+            agent_id=agent.id,
+            prefix=prompt_builder.get_prefix(agent),
+            model=agent.model,
+            temperature=agent.temperature,
+            conversation_id=conversation.id,
+            conversation_started_at=conversation.created_at,
+            hedging=HedgePolicy.from_agent(agent),
+            function_calling=bool(agent.function_calling_enabled)
+        )
+    
+    @staticmethod
+    async def stream_message(
+        db: Session,
+        context: ChatContext,
+        user_message: str
+    ) -> AsyncIterator[Dict]:
+        """
+        Turno em streaming sem novas buscas de agente/conversa
+        
+        Gera os eventos de LLMService.stream_response; o "done" final já
+        traz o conversation_id e a resposta fica salva antes de ser emitido.
+        """
+        version = ConversationService.add_message(
+            db, context.conversation_id, MessageRole.user, user_message, agent_id=context.agent_id
+        )
+        
+        history = ConversationService.get_recent_messages(
+            db, context.conversation_id, version, limit=20, since=context.conversation_started_at
+        )
+        
+        messages = prompt_builder.build_messages(context.prefix, history)
+        
+        if context.function_calling:
+            events = ConversationService._tool_loop_events(messages, context)
+        else:
+            events = hedging.stream_response(
+                messages=messages,
+                model=context.model,
+                temperature=context.temperature,
+                policy=context.hedging
+            )
+        
+        async for event in events:
+            if event["type"] == "done":
+                ConversationService.save_assistant_message(
+                    db, context.conversation_id, event, context.prefix, context.agent_id
+                )
+                event["conversation_id"] = str(context.conversation_id)
+            yield event
+    
+    @staticmethod
+    async def _tool_loop_events(messages: List[Dict], context: ChatContext) -> AsyncIterator[Dict]:
+        """
+        Turno com ferramentas no formato de eventos do streaming
+        
+        As rodadas de tool calls não são transmitidas; a resposta final sai
+        como um único "delta" seguido do "done".
+        """
+        result = await tools.run_tool_loop(
+            messages=messages,
+            model=context.model,
+            temperature=context.temperature,
+            policy=context.hedging
+        )
+        if result["content"]:
+            yield {"type": "delta", "content": result["content"]}
+        yield {"type": "done", "first_token_time": None, **result}
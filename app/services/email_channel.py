@@ -0,0 +1,453 @@
+"""
+Email Channel - Poller de caixa de entrada em lote
+
+- Lê e-mails em lotes de uma caixa IMAP (ou de um maildir, para testes
+  locais), roteando pelo destinatário para o agente com aquele
+  email_address
+- Conversa = remetente + thread (References / In-Reply-To / Message-ID)
+- Cada lote é processado concorrentemente, com no máximo
+  EMAIL_AGENT_CONCURRENCY chamadas ao LLM por agente
+- Respostas saem por SMTP com In-Reply-To/References para manter a thread
+  e Auto-Submitted: auto-replied (RFC 3834)
+- Anti-loop: mensagens automáticas não são respondidas (Auto-Submitted
+  diferente de "no", Precedence bulk/junk/list, List-Id, Return-Path <>,
+  remetente mailer-daemon/postmaster/no-reply) nem as enviadas por
+  endereços dos próprios agentes; saem com ack e result="skipped"
+- Checkpoint: IMAP guarda UIDVALIDITY + último UID em EMAIL_CHECKPOINT_FILE;
+  maildir usa a flag "S" (lida). Reinício não reprocessa e-mails.
+
+Uso:
+    python -m app.services.email_channel            # loop contínuo
+    python -m app.services.email_channel --once     # um lote
+"""
+import argparse
+import asyncio
+import email
+import email.policy
+import hashlib
+import imaplib
+import json
+import mailbox
+import os
+import re
+import smtplib
+import time
+from dataclasses import dataclass, field
+from email.message import EmailMessage
+from email.utils import getaddresses, make_msgid, parseaddr
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.core import metrics
+
+EMAIL_POLLER_ENABLED = os.getenv("EMAIL_POLLER_ENABLED", "false").lower() == "true"
+EMAIL_POLL_INTERVAL = float(os.getenv("EMAIL_POLL_INTERVAL", "30"))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+EMAIL_AGENT_CONCURRENCY = int(os.getenv("EMAIL_AGENT_CONCURRENCY", "4"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "3"))
+EMAIL_MAILDIR = os.getenv("EMAIL_MAILDIR")
+EMAIL_OUTBOX_MAILDIR = os.getenv("EMAIL_OUTBOX_MAILDIR")
+EMAIL_CHECKPOINT_FILE = os.getenv("EMAIL_CHECKPOINT_FILE", ".email_checkpoint.json")
+
+IMAP_HOST = os.getenv("EMAIL_IMAP_HOST")
+IMAP_PORT = int(os.getenv("EMAIL_IMAP_PORT", "993"))
+IMAP_USER = os.getenv("EMAIL_IMAP_USER")
+IMAP_PASSWORD = os.getenv("EMAIL_IMAP_PASSWORD")
+IMAP_MAILBOX = os.getenv("EMAIL_IMAP_MAILBOX", "INBOX")
+
+SMTP_HOST = os.getenv("EMAIL_SMTP_HOST")
+SMTP_PORT = int(os.getenv("EMAIL_SMTP_PORT", "587"))
+SMTP_USER = os.getenv("EMAIL_SMTP_USER")
+SMTP_PASSWORD = os.getenv("EMAIL_SMTP_PASSWORD")
+SMTP_STARTTLS = os.getenv("EMAIL_SMTP_STARTTLS", "true").lower() == "true"
+
+@dataclass
+class InboundEmail:
+    key: str
+    message_id: str
+    sender: str
+    recipients: List[str]
+    subject: str
+    body: str
+    references: List[str] = field(default_factory=list)
+    # Motivo para não responder (mensagem automática); None = responder
+    automated: Optional[str] = None
+
+    @property
+    def thread_root(self) -> str:
+        return self.references[0] if self.references else self.message_id
+
+    @property
+    def user_identifier(self) -> str:
+        thread = hashlib.sha1(self.thread_root.encode()).hexdigest()[:16]
+        return f"email:{self.sender}:{thread}"[:255]
+
+def _message_ids(value: Optional[str]) -> List[str]:
+    return re.findall(r"<[^>]+>", value or "")
+
+def _plain_text(message) -> str:
+    part = message.get_body(preferencelist=("plain", "html"))
+    if part is None:
+        return ""
+    text = part.get_content()
+    if part.get_content_type() == "text/html":
+        text = re.sub(r"<[^>]+>", " ", text)
+    return text.strip()
+
+AUTOMATED_SENDER = re.compile(r"^(mailer-daemon|postmaster|no[-_.]?reply|do[-_.]?not[-_.]?reply)([+].*)?@")
+
+def automated_reason(message, sender: str) -> Optional[str]:
+    """Por que a mensagem é automática (bounce, lista, auto-resposta), ou None"""
+    auto_submitted = str(message.get("Auto-Submitted", "")).strip().lower()
+    if auto_submitted and auto_submitted.split(";")[0].strip() != "no":
+        return "auto_submitted"
+    if str(message.get("Precedence", "")).strip().lower() in ("bulk", "junk", "list"):
+        return "precedence"
+    if message.get("List-Id") is not None:
+        return "list"
+    if str(message.get("Return-Path", "")).strip() == "<>":
+        return "bounce"
+    if not sender or AUTOMATED_SENDER.match(sender):
+        return "automated_sender"
+    return None
+
+def parse_email(raw: bytes, key: str) -> InboundEmail:
+    message = email.message_from_bytes(raw, policy=email.policy.default)
+    references = _message_ids(message.get("References")) or _message_ids(message.get("In-Reply-To"))
+    headers = [str(v) for h in ("Delivered-To", "To", "Cc") for v in (message.get_all(h) or [])]
+    recipients = [address.lower() for _, address in getaddresses(headers) if address]
+    sender = parseaddr(message.get("From", ""))[1].lower()
+    return InboundEmail(
+        key=key,
+        message_id=(message.get("Message-ID") or f"<{key}@local>").strip(),
+        sender=sender,
+        recipients=list(dict.fromkeys(recipients)),
+        subject=str(message.get("Subject", "")),
+        body=_plain_text(message),
+        references=references,
+        automated=automated_reason(message, sender)
+    )
+
+def build_reply(inbound: InboundEmail, from_address: str, text: str) -> EmailMessage:
+    reply = EmailMessage()
+    reply["From"] = from_address
+    reply["To"] = inbound.sender
+    subject = inbound.subject or ""
+    reply["Subject"] = subject if subject.lower().startswith("re:") else f"Re: {subject}".strip()
+    reply["Message-ID"] = make_msgid()
+    reply["In-Reply-To"] = inbound.message_id
+    reply["References"] = " ".join(inbound.references + [inbound.message_id])
+    reply["Auto-Submitted"] = "auto-replied"
+    reply.set_content(text)
+    return reply
+
+class MaildirSource:
+    """Caixa local (maildir): e-mails sem a flag "S" são pendentes"""
+
+    def __init__(self, path: str, max_attempts: int = EMAIL_MAX_ATTEMPTS):
+        self.box = mailbox.Maildir(path, create=True)
+        self.max_attempts = max_attempts
+        self._attempts: Dict[str, int] = {}
+
+    def fetch_batch(self, limit: int) -> List[InboundEmail]:
+        batch = []
+        for key in sorted(self.box.iterkeys()):
+            message = self.box.get_message(key)
+            if "S" in message.get_flags():
+                continue
+            batch.append(parse_email(message.as_bytes(), key))
+            if len(batch) >= limit:
+                break
+        return batch
+
+    def _flag(self, key: str, flags: str):
+        message = self.box.get_message(key)
+        message.set_subdir("cur")
+        message.add_flag(flags)
+        self.box[key] = message
+
+    def ack(self, item: InboundEmail):
+        self._flag(item.key, "S")
+
+    def nack(self, item: InboundEmail):
+        attempts = self._attempts.get(item.key, 0) + 1
+        self._attempts[item.key] = attempts
+        if attempts >= self.max_attempts:
+            self._flag(item.key, "SF")  # F = falhou definitivamente
+            self._attempts.pop(item.key, None)
+
+    def commit(self):
+        pass
+
+class ImapSource:
+    """Caixa IMAP com checkpoint de UID em arquivo (UIDVALIDITY + último UID)"""
+
+    def __init__(
+        self,
+        host: str = IMAP_HOST,
+        port: int = IMAP_PORT,
+        user: str = IMAP_USER,
+        password: str = IMAP_PASSWORD,
+        folder: str = IMAP_MAILBOX,
+        checkpoint_file: str = EMAIL_CHECKPOINT_FILE,
+        max_attempts: int = EMAIL_MAX_ATTEMPTS
+    ):
+        self.host, self.port, self.user, self.password, self.folder = host, port, user, password, folder
+        self.checkpoint_file = checkpoint_file
+        self.max_attempts = max_attempts
+        self._conn: Optional[imaplib.IMAP4_SSL] = None
+        self._state = self._load_checkpoint()
+        self._fetched_max = 0
+
+    def _load_checkpoint(self) -> Dict:
+        try:
+            with open(self.checkpoint_file) as fh:
+                return json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return {"uidvalidity": None, "last_uid": 0, "failed": {}}
+
+    def _connect(self) -> imaplib.IMAP4_SSL:
+        if self._conn is None:
+            self._conn = imaplib.IMAP4_SSL(self.host, self.port)
+            self._conn.login(self.user, self.password)
+            self._conn.select(self.folder)
+            uidvalidity = self._conn.response("UIDVALIDITY")[1][0]
+            uidvalidity = uidvalidity.decode() if isinstance(uidvalidity, bytes) else str(uidvalidity)
+            if self._state["uidvalidity"] != uidvalidity:
+                # Caixa recriada: UIDs antigos não valem mais
+                self._state = {"uidvalidity": uidvalidity, "last_uid": 0, "failed": {}}
+        return self._conn
+
+    def fetch_batch(self, limit: int) -> List[InboundEmail]:
+        try:
+            conn = self._connect()
+            retry = [int(uid) for uid in self._state["failed"]]
+            _, data = conn.uid("SEARCH", None, f"UID {self._state['last_uid'] + 1}:*")
+            new = [int(uid) for uid in (data[0] or b"").split() if int(uid) > self._state["last_uid"]]
+            uids = (retry + sorted(new))[:limit]
+            batch = []
+            for uid in uids:
+                _, parts = conn.uid("FETCH", str(uid), "(BODY.PEEK[])")
+                raw = next((p[1] for p in parts if isinstance(p, tuple)), None)
+                if raw is not None:
+                    batch.append(parse_email(raw, str(uid)))
+            self._fetched_max = max([self._fetched_max] + [uid for uid in uids if uid in set(new)])
+            return batch
+        except (imaplib.IMAP4.abort, OSError):
+            self._conn = None
+            raise
+
+    def ack(self, item: InboundEmail):
+        self._state["failed"].pop(item.key, None)
+        self._connect().uid("STORE", item.key, "+FLAGS", "(\\Seen)")
+
+    def nack(self, item: InboundEmail):
+        attempts = self._state["failed"].get(item.key, 0) + 1
+        if attempts >= self.max_attempts:
+            self._state["failed"].pop(item.key, None)
+            print(f"❌ Email UID {item.key} descartado após {attempts} tentativa(s)")
+        else:
+            self._state["failed"][item.key] = attempts
+
+    def commit(self):
+        self._state["last_uid"] = max(self._state["last_uid"], self._fetched_max)
+        tmp = f"{self.checkpoint_file}.tmp"
+        with open(tmp, "w") as fh:
+            json.dump(self._state, fh)
+        os.replace(tmp, self.checkpoint_file)
+
+class SmtpSender:
+    """Uma conexão SMTP reaproveitada entre envios (serializados por lock)"""
+
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT, user: str = SMTP_USER,
+                 password: str = SMTP_PASSWORD, starttls: bool = SMTP_STARTTLS):
+        self.host, self.port, self.user, self.password, self.starttls = host, port, user, password, starttls
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._lock = asyncio.Lock()
+
+    def _send_sync(self, message: EmailMessage):
+        for attempt in range(2):
+            try:
+                if self._smtp is None:
+                    self._smtp = smtplib.SMTP(self.host, self.port, timeout=30)
+                    if self.starttls:
+                        self._smtp.starttls()
+                    if self.user:
+                        self._smtp.login(self.user, self.password)
+                self._smtp.send_message(message)
+                return
+            except smtplib.SMTPServerDisconnected:
+                self._smtp = None
+                if attempt:
+                    raise
+
+    async def send(self, message: EmailMessage):
+        async with self._lock:
+            await asyncio.to_thread(self._send_sync, message)
+
+    async def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except smtplib.SMTPException:
+                pass
+            self._smtp = None
+
+class MaildirSender:
+    """Grava respostas num maildir de saída (testes locais / benchmark)"""
+
+    def __init__(self, path: str):
+        self.box = mailbox.Maildir(path, create=True)
+
+    async def send(self, message: EmailMessage):
+        self.box.add(message)
+
+    async def close(self):
+        pass
+
+Handler = Callable[[object, InboundEmail], Awaitable[str]]
+
+def resolve_agents_by_address(addresses: Iterable[str]) -> Dict[str, object]:
+    """Uma query por lote: email_address -> agent_id"""
+    from app.core.database import SessionLocal
+    from app.models import Agent
+
+    addresses = list(set(addresses))
+    if not addresses:
+        return {}
+    db = SessionLocal()
+    try:
+        rows = db.query(Agent.id, Agent.email_address).filter(
+            Agent.email_enabled == True,
+            Agent.is_active == True,
+            Agent.email_address.isnot(None)
+        ).all()
+        wanted = set(addresses)
+        return {address.lower(): agent_id for agent_id, address in rows if address.lower() in wanted}
+    finally:
+        db.close()
+
+async def process_with_llm(agent_id, inbound: InboundEmail) -> str:
+    """Handler padrão: ConversationService com channel="email" """
+    from app.core.database import SessionLocal
+    from app.services.conversation_service import ConversationService
+
+    db = SessionLocal()
+    try:
+        result = await ConversationService.process_message(
+            db=db,
+            agent_id=agent_id,
+            user_identifier=inbound.user_identifier,
+            user_message=f"Assunto: {inbound.subject}\n\n{inbound.body}",
+            channel="email"
+        )
+        return result["response"]
+    finally:
+        db.close()
+
+class EmailChannelWorker:
+
+    def __init__(
+        self,
+        source,
+        sender,
+        handler: Handler = process_with_llm,
+        resolve_agents: Callable[[Iterable[str]], Dict[str, object]] = resolve_agents_by_address,
+        batch_size: int = EMAIL_BATCH_SIZE,
+        per_agent_concurrency: int = EMAIL_AGENT_CONCURRENCY
+    ):
+        self.source = source
+        self.sender = sender
+        self.handler = handler
+        self.resolve_agents = resolve_agents
+        self.batch_size = batch_size
+        self.per_agent_concurrency = per_agent_concurrency
+        self._semaphores: Dict[object, asyncio.Semaphore] = {}
+
+    def _semaphore(self, agent_id) -> asyncio.Semaphore:
+        if agent_id not in self._semaphores:
+            self._semaphores[agent_id] = asyncio.Semaphore(self.per_agent_concurrency)
+        return self._semaphores[agent_id]
+
+    async def _process(self, inbound: InboundEmail, agents: Dict[str, object]) -> str:
+        # Responder a robôs (ou a um agente) vira loop de LLM pago
+        reason = inbound.automated or ("own_address" if inbound.sender in agents else None)
+        if reason:
+            metrics.inc("email_skipped_total", reason=reason)
+            return "skipped"
+
+        address = next((r for r in inbound.recipients if r in agents), None)
+        if address is None:
+            return "unrouted"
+
+        try:
+            async with self._semaphore(agents[address]):
+                text = await self.handler(agents[address], inbound)
+            await self.sender.send(build_reply(inbound, address, text))
+        except Exception as e:
+            print(f"❌ Email {inbound.message_id}: {e}")
+            return "error"
+        return "replied"
+
+    def _settle(self, outcomes: List[Tuple[InboundEmail, str]]):
+        """ack/nack em sequência (conexão IMAP não é thread-safe) + checkpoint"""
+        for inbound, result in outcomes:
+            if result == "error":
+                self.source.nack(inbound)
+            else:
+                self.source.ack(inbound)
+        self.source.commit()
+
+    async def process_batch(self) -> Dict[str, int]:
+        batch = await asyncio.to_thread(self.source.fetch_batch, self.batch_size)
+        if not batch:
+            return {}
+
+        # Remetentes entram também: e-mail vindo de um agente não é respondido
+        agents = await asyncio.to_thread(
+            self.resolve_agents, [r for item in batch for r in item.recipients + [item.sender]]
+        )
+        results = await asyncio.gather(*[self._process(item, agents) for item in batch])
+        await asyncio.to_thread(self._settle, list(zip(batch, results)))
+
+        stats: Dict[str, int] = {}
+        for result in results:
+            stats[result] = stats.get(result, 0) + 1
+            metrics.inc("email_messages_total", result=result)
+        return stats
+
+    async def run_forever(self, interval: float = EMAIL_POLL_INTERVAL):
+        print(f"📧 Email poller ativo (lote {self.batch_size}, {self.per_agent_concurrency}/agente)")
+        while True:
+            try:
+                stats = await self.process_batch()
+            except Exception as e:
+                print(f"⚠️ Email poller: {e}")
+                stats = {}
+            # Lote cheio: provavelmente há mais, busca de novo sem esperar
+            if sum(stats.values()) < self.batch_size:
+                await asyncio.sleep(interval)
+
+    async def close(self):
+        await self.sender.close()
+
+def build_worker_from_env() -> EmailChannelWorker:
+    source = MaildirSource(EMAIL_MAILDIR) if EMAIL_MAILDIR else ImapSource()
+    sender = MaildirSender(EMAIL_OUTBOX_MAILDIR) if EMAIL_OUTBOX_MAILDIR else SmtpSender()
+    return EmailChannelWorker(source, sender)
+
+async def _main(once: bool):
+    worker = build_worker_from_env()
+    try:
+        if once:
+            start = time.time()
+            stats = await worker.process_batch()
+            print({"stats": stats, "duration": round(time.time() - start, 3)})
+        else:
+            await worker.run_forever()
+    finally:
+        await worker.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Poller do canal de e-mail")
+    parser.add_argument("--once", action="store_true", help="Processa um único lote e sai")
+    asyncio.run(_main(parser.parse_args().once))
@@ -0,0 +1,244 @@
+"""
+Hedged requests - corta a cauda de latência do LLM
+
+Opt-in por agente (agents.hedging_enabled). Se a resposta (ou, em stream,
+o primeiro token) não chega dentro do limiar - o percentil HEDGE_PERCENTILE
+das latências recentes do modelo -, uma requisição duplicada é disparada
+(opcionalmente para agents.hedging_fallback_model e/ou outro provedor via
+HEDGE_FALLBACK_BASE_URL). A primeira que terminar vence; a outra é cancelada.
+
+Custo: a resposta vencedora é cobrada normalmente na mensagem. A requisição
+descartada não devolve `usage`; seu custo é estimado pelos tokens de entrada
+(o provedor cobra o prompt já processado) e contabilizado à parte em
+extra_data["hedge"] e em llm_hedge_cost_usd_total.
+
+Proteção: no máximo HEDGE_MAX_RATIO das requisições recentes viram hedge,
+para não dobrar a carga quando o provedor inteiro está lento.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.core import metrics
+from app.services.llm_service import LLMService, http_client_options
+
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "500"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "10"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.5"))
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))
+HEDGE_FALLBACK_BASE_URL = os.getenv("HEDGE_FALLBACK_BASE_URL")
+HEDGE_FALLBACK_API_KEY = os.getenv("HEDGE_FALLBACK_API_KEY")
+
+@dataclass(frozen=True)
+class HedgePolicy:
+    fallback_model: Optional[str] = None
+    percentile: float = HEDGE_PERCENTILE
+
+    @classmethod
+    def from_agent(cls, agent) -> Optional["HedgePolicy"]:
+        if not getattr(agent, "hedging_enabled", False):
+            return None
+        return cls(fallback_model=agent.hedging_fallback_model or None)
+
+class LatencyTracker:
+    """Janela móvel de latências por (tipo, modelo) e taxa recente de hedges"""
+
+    def __init__(self, window: int = HEDGE_WINDOW):
+        self.window = window
+        self._samples: Dict[tuple, deque] = {}
+        self._hedged: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, model: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault((kind, model), deque(maxlen=self.window)).append(seconds)
+
+    def threshold(self, kind: str, model: str, percentile: float = HEDGE_PERCENTILE) -> float:
+        with self._lock:
+            samples = sorted(self._samples.get((kind, model), ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        index = min(len(samples) - 1, int(len(samples) * percentile / 100))
+        return max(HEDGE_MIN_DELAY, samples[index])
+
+    def allow_hedge(self) -> bool:
+        with self._lock:
+            if not self._hedged:
+                return True
+            return sum(self._hedged) / len(self._hedged) < HEDGE_MAX_RATIO
+
+    def count_request(self, hedged: bool):
+        with self._lock:
+            self._hedged.append(1 if hedged else 0)
+
+tracker = LatencyTracker()
+
+_fallback_client = None
+_fallback_lock = threading.Lock()
+
+def get_fallback_client(default=None):
+    """Cliente do provedor alternativo (HEDGE_FALLBACK_BASE_URL) ou `default`"""
+    global _fallback_client
+    if not HEDGE_FALLBACK_BASE_URL:
+        return default
+    with _fallback_lock:
+        if _fallback_client is None:
+            import httpx
+            from openai import AsyncOpenAI
+
+            _fallback_client = AsyncOpenAI(
+                api_key=HEDGE_FALLBACK_API_KEY or os.getenv("OPENAI_API_KEY"),
+                base_url=HEDGE_FALLBACK_BASE_URL,
+                http_client=httpx.AsyncClient(**http_client_options())
+            )
+    return _fallback_client
+
+async def close_fallback_client():
+    global _fallback_client
+    with _fallback_lock:
+        client, _fallback_client = _fallback_client, None
+    if client is not None:
+        await client.close()
+
+def _hedge_info(winner: str, loser_model: str, input_tokens: int, delay: float) -> Dict:
+    estimated_cost = LLMService.calculate_cost(loser_model, input_tokens, 0)
+    metrics.inc("llm_hedges_total", winner=winner)
+    metrics.inc("llm_hedge_cost_usd_total", estimated_cost, model=loser_model)
+    return {
+        "winner": winner,
+        "delay": round(delay, 3),
+        "discarded_model": loser_model,
+        "discarded_cost": estimated_cost
+    }
+
+async def _cancel(task: asyncio.Task):
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+async def generate_response(
+    messages: List[Dict[str, str]],
+    model: str = "gpt-4o-mini",
+    temperature: float = 0.7,
+    max_tokens: int = 1000,
+    policy: Optional[HedgePolicy] = None,
+    client=None,
+    fallback_client=None,
+    tools: Optional[List[Dict]] = None
+) -> Dict:
+    """LLMService.generate_response com hedge quando `policy` está ativa"""
+    def start(use_model, use_client):
+        return asyncio.create_task(LLMService.generate_response(
+            messages=messages, model=use_model, temperature=temperature,
+            max_tokens=max_tokens, client=use_client, tools=tools
+        ))
+
+    if policy is None:
+        result = await LLMService.generate_response(messages, model, temperature, max_tokens, client=client, tools=tools)
+        tracker.record("response", model, result["processing_time"])
+        return result
+
+    delay = tracker.threshold("response", model, policy.percentile)
+    primary = start(model, client)
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+
+    if done or not tracker.allow_hedge():
+        tracker.count_request(False)
+        result = await primary
+        tracker.record("response", model, result["processing_time"])
+        return result
+
+    tracker.count_request(True)
+    hedge_model = policy.fallback_model or model
+    hedge = start(hedge_model, get_fallback_client(client) if fallback_client is None else fallback_client)
+    pending = {primary, hedge}
+
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        winner = next((t for t in done if not t.exception()), None)
+        if winner is not None:
+            break
+    else:
+        # As duas falharam: propaga o erro da original
+        await primary
+
+    for task in pending:
+        await _cancel(task)
+
+    result = winner.result()
+    won_primary = winner is primary
+    result["hedge"] = _hedge_info(
+        "primary" if won_primary else "hedge",
+        hedge_model if won_primary else model,
+        result["input_tokens"],
+        delay
+    )
+    tracker.record("response", result["model"], result["processing_time"] + (0 if won_primary else delay))
+    return result
+
+async def stream_response(
+    messages: List[Dict[str, str]],
+    model: str = "gpt-4o-mini",
+    temperature: float = 0.7,
+    max_tokens: int = 1000,
+    policy: Optional[HedgePolicy] = None,
+    client=None,
+    fallback_client=None
+) -> AsyncIterator[Dict]:
+    """LLMService.stream_response com hedge sobre o tempo até o primeiro token"""
+    def start(use_model, use_client):
+        stream = LLMService.stream_response(
+            messages=messages, model=use_model, temperature=temperature,
+            max_tokens=max_tokens, client=use_client
+        )
+        return stream, asyncio.create_task(stream.__anext__())
+
+    started = time.time()
+    primary_stream, primary_first = start(model, client)
+    delay = tracker.threshold("first_token", model, policy.percentile) if policy else None
+    done, _ = await asyncio.wait({primary_first}, timeout=delay)
+
+    hedge_info = None
+    stream, first = primary_stream, primary_first
+    if policy is not None and not done and tracker.allow_hedge():
+        tracker.count_request(True)
+        hedge_model = policy.fallback_model or model
+        hedge_stream, hedge_first = start(
+            hedge_model, get_fallback_client(client) if fallback_client is None else fallback_client
+        )
+        owners = {primary_first: (primary_stream, "primary"), hedge_first: (hedge_stream, "hedge")}
+        pending = set(owners)
+        winner = None
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((t for t in done if not t.exception()), None)
+        if winner is None:
+            winner = primary_first  # as duas falharam: propaga o erro da original
+        for task in owners:
+            if task is not winner:
+                await _cancel(task)
+                await owners[task][0].aclose()
+        stream, first = owners[winner][0], winner
+        won = owners[winner][1]
+        hedge_info = (won, hedge_model if won == "primary" else model)
+    elif policy is not None:
+        tracker.count_request(False)
+
+    event = await first
+    used_model = model if stream is primary_stream else policy.fallback_model or model
+    tracker.record("first_token", used_model, time.time() - started)
+
+    async for event in _chain(event, stream):
+        if event["type"] == "done" and hedge_info is not None:
+            event["hedge"] = _hedge_info(hedge_info[0], hedge_info[1], event["input_tokens"], delay)
+        yield event
+
+async def _chain(first: Dict, stream: AsyncIterator[Dict]) -> AsyncIterator[Dict]:
+    yield first
+    async for event in stream:
+        yield event
@@ -0,0 +1,282 @@
+"""
+Idempotência - Idempotency-Key no chat público
+
+Clientes móveis e proxies repetem o POST do chat em timeout; sem chave,
+cada repetição grava outra mensagem de usuário e paga outra completion.
+
+- 1ª requisição com a chave executa normalmente
+- Duplicatas concorrentes (mesmo processo) esperam a 1ª terminar e recebem
+  a mesma resposta (até IDEMPOTENCY_WAIT_SECONDS; depois, 409)
+- Duplicatas posteriores, dentro de IDEMPOTENCY_TTL, recebem a resposta
+  guardada sem tocar no LLM (header Idempotent-Replayed: true)
+- Mesma chave com outro corpo -> 422
+- Erro/5xx libera a chave: a próxima tentativa executa de novo
+
+Memória: LRU limitado a IDEMPOTENCY_MAX_KEYS por processo.
+IDEMPOTENCY_DB_ENABLED=true adiciona a tabela idempotency_keys para valer
+entre réplicas: a 1ª réplica reserva a chave (INSERT ... ON CONFLICT) por
+IDEMPOTENCY_LOCK_SECONDS; as outras fazem polling até a resposta aparecer.
+Linhas expiradas são removidas pelo job "idempotency_purge".
+
+A mesma tabela serve de dedupe entre processos para eventos sem resposta a
+guardar (claim_event, ex.: mensagens do webhook do WhatsApp). Com vários
+workers (gunicorn.conf.py) IDEMPOTENCY_DB_ENABLED é ligado por default:
+a memória de um worker não vê as chaves dos outros.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.core import metrics
+
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "120"))
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "180"))
+IDEMPOTENCY_DB_ENABLED = os.getenv("IDEMPOTENCY_DB_ENABLED", "false").lower() == "true"
+IDEMPOTENCY_POLL_INTERVAL = 0.25
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENCY_PURGE_BATCH_SIZE = 5000
+
+# Reserva a chave; linha expirada (resposta vencida ou dono que caiu) é reaproveitada
+CLAIM_SQL = text("""
+    INSERT INTO idempotency_keys (key, fingerprint, expires_at)
+    VALUES (:key, :fingerprint, now() + make_interval(secs => :lock_seconds))
+    ON CONFLICT (key) DO UPDATE SET
+        fingerprint = EXCLUDED.fingerprint,
+        status_code = NULL,
+        response = NULL,
+        created_at = now(),
+        expires_at = EXCLUDED.expires_at
+    WHERE idempotency_keys.expires_at < now()
+    RETURNING key
+""")
+
+CLAIM_EVENT_SQL = text("""
+    INSERT INTO idempotency_keys (key, fingerprint, expires_at)
+    VALUES (:key, '', now() + make_interval(secs => :ttl))
+    ON CONFLICT (key) DO UPDATE SET
+        created_at = now(),
+        expires_at = EXCLUDED.expires_at
+    WHERE idempotency_keys.expires_at < now()
+    RETURNING key
+""")
+
+class IdempotencyConflict(Exception):
+    """Chave reutilizada com outro corpo de requisição"""
+
+class IdempotencyInProgress(Exception):
+    """A requisição original ainda não terminou"""
+
+@dataclass(frozen=True)
+class StoredResponse:
+    status_code: int
+    body: bytes
+
+@dataclass
+class _Entry:
+    fingerprint: str
+    future: asyncio.Future
+    expires_at: float
+
+def fingerprint(*parts: object) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class IdempotencyStore:
+    def __init__(
+        self,
+        ttl: float = IDEMPOTENCY_TTL,
+        max_keys: int = IDEMPOTENCY_MAX_KEYS,
+        wait_seconds: float = IDEMPOTENCY_WAIT_SECONDS,
+        session_factory: Optional[Callable] = None
+    ):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.wait_seconds = wait_seconds
+        self.session_factory = session_factory
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def execute(
+        self,
+        key: str,
+        request_fingerprint: str,
+        handler: Callable[[], Awaitable[StoredResponse]]
+    ) -> Tuple[StoredResponse, bool]:
+        """
+        Executa `handler` uma vez por chave; retorna (resposta, replayed)
+
+        Exceções do handler chegam também às duplicatas que estavam
+        esperando, e a chave é liberada.
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry.expires_at < time.monotonic():
+                    del self._entries[key]
+                    entry = None
+                if entry is None:
+                    entry = _Entry(request_fingerprint, asyncio.get_running_loop().create_future(), time.monotonic() + self.ttl)
+                    self._entries[key] = entry
+                    while len(self._entries) > self.max_keys:
+                        self._entries.popitem(last=False)
+                    break
+                self._entries.move_to_end(key)
+
+            if entry.fingerprint != request_fingerprint:
+                raise IdempotencyConflict()
+            try:
+                response = await asyncio.wait_for(asyncio.shield(entry.future), self.wait_seconds)
+            except asyncio.TimeoutError:
+                raise IdempotencyInProgress()
+            except asyncio.CancelledError:
+                if entry.future.cancelled():
+                    continue  # a original foi cancelada: esta assume
+                raise
+            metrics.inc("idempotency_requests_total", result="replayed_local")
+            return response, True
+
+        claimed = False
+        try:
+            response = None
+            if self.session_factory is not None:
+                response = await self._claim_or_wait(key, request_fingerprint)
+                claimed = response is None
+            replayed = response is not None
+            if not replayed:
+                response = await handler()
+        except BaseException as e:
+            self._release(key, entry, claimed)
+            if isinstance(e, asyncio.CancelledError):
+                entry.future.cancel()
+            else:
+                entry.future.set_exception(e)
+                entry.future.exception()  # evita aviso de exceção não lida
+            raise
+
+        entry.future.set_result(response)
+        if response.status_code >= 500:
+            self._release(key, entry, claimed)
+        elif self.session_factory is not None and not replayed:
+            await asyncio.to_thread(self._db_complete, key, response)
+
+        metrics.inc("idempotency_requests_total", result="replayed_db" if replayed else "executed")
+        return response, replayed
+
+    def _release(self, key: str, entry: _Entry, claimed: bool):
+        """Libera a chave na memória e, se reservada por este processo, no banco"""
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+        if claimed:
+            try:
+                self._db_release(key)
+            except Exception as e:
+                print(f"⚠️ Idempotency: falha ao liberar {key}: {e}")
+
+    # --- Postgres (entre réplicas) ---
+
+    async def _claim_or_wait(self, key: str, request_fingerprint: str) -> Optional[StoredResponse]:
+        """None = chave reservada por este processo; senão a resposta de outra réplica"""
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            claimed, row = await asyncio.to_thread(self._db_claim, key, request_fingerprint)
+            if claimed:
+                return None
+            if row is not None:
+                if row.fingerprint != request_fingerprint:
+                    raise IdempotencyConflict()
+                if row.status_code is not None:
+                    return StoredResponse(row.status_code, row.response.encode("utf-8"))
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgress()
+            await asyncio.sleep(IDEMPOTENCY_POLL_INTERVAL)
+
+    def _db_claim(self, key: str, request_fingerprint: str):
+        with self.session_factory() as db:
+            claimed = db.execute(CLAIM_SQL, {
+                "key": key,
+                "fingerprint": request_fingerprint,
+                "lock_seconds": IDEMPOTENCY_LOCK_SECONDS
+            }).scalar()
+            db.commit()
+            if claimed:
+                return True, None
+            row = db.execute(
+                text("SELECT fingerprint, status_code, response FROM idempotency_keys WHERE key = :key"),
+                {"key": key}
+            ).first()
+            return False, row
+
+    def _db_complete(self, key: str, response: StoredResponse):
+        with self.session_factory() as db:
+            db.execute(text("""
+                UPDATE idempotency_keys
+                SET status_code = :status_code, response = :response,
+                    expires_at = now() + make_interval(secs => :ttl)
+                WHERE key = :key
+            """), {
+                "key": key,
+                "status_code": response.status_code,
+                "response": response.body.decode("utf-8"),
+                "ttl": self.ttl
+            })
+            db.commit()
+
+    def _db_release(self, key: str):
+        with self.session_factory() as db:
+            db.execute(
+                text("DELETE FROM idempotency_keys WHERE key = :key AND status_code IS NULL"),
+                {"key": key}
+            )
+            db.commit()
+
+def claim_event(db, key: str, ttl: float = IDEMPOTENCY_TTL) -> bool:
+    """Dedupe entre processos: True só para o primeiro que reservar `key` dentro do TTL"""
+    claimed = db.execute(CLAIM_EVENT_SQL, {"key": key, "ttl": ttl}).scalar()
+    db.commit()
+    return claimed is not None
+
+def purge_expired_keys(batch_size: int = IDEMPOTENCY_PURGE_BATCH_SIZE) -> int:
+    """Job do scheduler: remove chaves expiradas em lotes"""
+    from app.core.database import SessionLocal
+
+    total = 0
+    with SessionLocal() as db:
+        while True:
+            deleted = db.execute(text("""
+                DELETE FROM idempotency_keys
+                WHERE key IN (
+                    SELECT key FROM idempotency_keys
+                    WHERE expires_at < now()
+                    LIMIT :batch_size
+                )
+            """), {"batch_size": batch_size}).rowcount
+            db.commit()
+            total += deleted
+            if deleted < batch_size:
+                return total
+
+def _build_store() -> IdempotencyStore:
+    if not IDEMPOTENCY_DB_ENABLED:
+        return IdempotencyStore()
+    from app.core.database import SessionLocal
+    return IdempotencyStore(session_factory=SessionLocal)
+
+idempotency_store = _build_store()
+
+metrics.register_collector(lambda: [("idempotency_keys_cached", {}, len(idempotency_store))])
@@ -1,75 +1,297 @@
 """
-LLM Service - OpenAI com LAZY LOADING
+LLM Service - OpenAI com cliente compartilhado
+
+Um único AsyncOpenAI (e seu pool httpx com keep-alive/HTTP2) por processo:
+criado no startup (init_llm_client), reutilizado por todas as requisições
+e fechado no shutdown (close_llm_client). get_openai_client() mantém o
+lazy loading como fallback, protegido por lock.
 """
 import os
+import threading
 import time
-from typing import List, Dict
+import weakref
+from typing import AsyncIterator, List, Dict, Optional
+
+import httpx
+
+from app.core import metrics
+
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true"
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
 
 _client = None
+_client_lock = threading.Lock()
+
+# Streams de rede já vistos: se a resposta chega por um stream conhecido,
+# a conexão foi reaproveitada (keep-alive ou multiplexação HTTP/2)
+_seen_streams = weakref.WeakSet()
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def track_connection(response: httpx.Response, client_name: str):
+    """Conta requisições e conexões novas vs. reaproveitadas"""
+    metrics.inc("llm_http_requests_total", client=client_name, http_version=response.http_version)
+    stream = response.extensions.get("network_stream")
+    if stream is None:
+        return
+    try:
+        reused = stream in _seen_streams
+        if not reused:
+            _seen_streams.add(stream)
+    except TypeError:
+        return
+    metrics.inc(
+        "llm_http_connections_reused_total" if reused else "llm_http_connections_opened_total",
+        client=client_name
+    )
+
+def http_client_options() -> Dict:
+    return {
+        "http2": LLM_HTTP2 and _http2_available(),
+        "limits": httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+        ),
+        "timeout": httpx.Timeout(LLM_TIMEOUT, connect=10.0)
+    }
+
+def _build_client():
+    from openai import AsyncOpenAI
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY não configurada!")
+
+    async def on_response(response: httpx.Response):
+        track_connection(response, "app")
+
+    http_client = httpx.AsyncClient(
+        **http_client_options(),
+        event_hooks={"response": [on_response]}
+    )
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=os.getenv("OPENAI_BASE_URL") or None,
+        http_client=http_client
+    )
+
+def _usage_field(usage, field: str) -> int:
+    """usage pode vir como objeto (SDK) ou dict (campos extras do chunk)"""
+    if usage is None:
+        return 0
+    if isinstance(usage, dict):
+        return usage.get(field) or 0
+    return getattr(usage, field, 0) or 0
+
+def init_llm_client():
+    """Cria o cliente compartilhado no startup (sem chave: adia para o 1º uso)"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            try:
+                _client = _build_client()
+                print(f"🔌 Cliente OpenAI pronto (http2={http_client_options()['http2']})")
+            except ValueError as e:
+                print(f"⚠️ {e}")
+    return _client
 
 def get_openai_client():
-    """Lazy loading do cliente OpenAI"""
+    """Cliente compartilhado (lazy loading thread-safe como fallback)"""
     global _client
     if _client is None:
-        from openai import OpenAI
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY não configurada!")
-        _client = OpenAI(api_key=api_key)
+        with _client_lock:
+            if _client is None:
+                _client = _build_client()
     return _client
 
+def create_llm_client():
+    """
+    Cliente avulso para código fora do event loop da aplicação (jobs em
+    thread com asyncio.run); quem cria fecha com `await client.close()`
+    """
+    return _build_client()
+
+def llm_client_ready() -> bool:
+    """Cliente compartilhado criado e com pool HTTP aberto (readiness)"""
+    client = _client
+    return client is not None and not client.is_closed()
+
+async def close_llm_client():
+    """Fecha o pool HTTP no shutdown"""
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        await client.close()
+
 class LLMService:
     
     @staticmethod
-    def calculate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    def calculate_cost(model: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+        """
+        Custo em USD (preços por 1M tokens)
+        
+        `cached_tokens` faz parte de `input_tokens` e é cobrado pelo preço de
+        cached input (prefixo de prompt reaproveitado pela OpenAI).
+        """
         pricing = {
-            "gpt-4o-mini": {"input": 0.150, "output": 0.600},
-            "gpt-4o": {"input": 2.50, "output": 10.00},
+            "gpt-4o-mini": {"input": 0.150, "cached_input": 0.075, "output": 0.600},
+            "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
         }
         
         model_pricing = pricing.get(model, pricing["gpt-4o-mini"])
-        input_cost = (input_tokens / 1_000_000) * model_pricing["input"]
+        cached_tokens = min(cached_tokens, input_tokens)
+        input_cost = ((input_tokens - cached_tokens) / 1_000_000) * model_pricing["input"]
+        cached_cost = (cached_tokens / 1_000_000) * model_pricing["cached_input"]
         output_cost = (output_tokens / 1_000_000) * model_pricing["output"]
         
-        return input_cost + output_cost
+        return input_cost + cached_cost + output_cost
     
     @staticmethod
     async def generate_response(
         messages: List[Dict[str, str]],
         model: str = "gpt-4o-mini",
         temperature: float = 0.7,
-        max_tokens: int = 1000
+        max_tokens: int = 1000,
+        client=None,
+        tools: Optional[List[Dict]] = None
     ) -> Dict:
+        """
+        `client` substitui o cliente compartilhado (ex.: stub em dry-run)
+        
+        Com `tools` (schemas no formato da OpenAI), o resultado traz
+        "tool_calls": [{"id", "name", "arguments"}] quando o modelo pede
+        ferramentas (ver app.services.tools).
+        """
         start_time = time.time()
         
         try:
-            client = get_openai_client()
+            client = client or get_openai_client()
             
-            response = client.chat.completions.create(
+            extra = {"tools": tools} if tools else {}
+            response = await client.chat.completions.create(
                 model=model,
                 messages=messages,
                 temperature=temperature,
-                max_tokens=max_tokens
+                max_tokens=max_tokens,
+                **extra
             )
             
             processing_time = time.time() - start_time
             
-            content = response.choices[0].message.content
+            message = response.choices[0].message
+            content = message.content or ""
             input_tokens = response.usage.prompt_tokens
             output_tokens = response.usage.completion_tokens
             total_tokens = response.usage.total_tokens
+            cached_tokens = _usage_field(getattr(response.usage, "prompt_tokens_details", None), "cached_tokens")
             
-            cost = LLMService.calculate_cost(model, input_tokens, output_tokens)
+            cost = LLMService.calculate_cost(model, input_tokens, output_tokens, cached_tokens)
             
-            return {
+            metrics.inc("llm_requests_total", model=model, status="ok")
+            metrics.observe("llm_request_seconds", processing_time, model=model)
+            
+            result = {
                 "content": content,
                 "tokens": total_tokens,
                 "input_tokens": input_tokens,
                 "output_tokens": output_tokens,
+                "cached_tokens": cached_tokens,
                 "cost": cost,
                 "processing_time": processing_time,
                 "model": model
             }
+            if getattr(message, "tool_calls", None):
+                result["tool_calls"] = [
+                    {"id": call.id, "name": call.function.name, "arguments": call.function.arguments}
+                    for call in message.tool_calls
+                ]
+            return result
+        
+        except Exception as e:
+            metrics.inc("llm_requests_total", model=model, status="error")
+            raise Exception(f"Erro OpenAI: {str(e)}")
+    
+    @staticmethod
+    async def stream_response(
+        messages: List[Dict[str, str]],
+        model: str = "gpt-4o-mini",
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        client=None
+    ) -> AsyncIterator[Dict]:
+        """
+        Versão em streaming de generate_response
+        
+        Gera {"type": "delta", "content": ...} a cada pedaço de texto e, no
+        fim, {"type": "done", ...} com os mesmos campos de generate_response.
+        Sem `usage` no stream, os tokens são estimados (~4 caracteres/token).
+        """
+        start_time = time.time()
+        parts = []
+        usage = None
+        first_token_time = None
+        
+        try:
+            client = client or get_openai_client()
             
+            stream = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                extra_body={"stream_options": {"include_usage": True}}
+            )
+            
+            async for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if first_token_time is None:
+                        first_token_time = time.time() - start_time
+                    parts.append(delta)
+                    yield {"type": "delta", "content": delta}
+        
         except Exception as e:
+            metrics.inc("llm_requests_total", model=model, status="error")
             raise Exception(f"Erro OpenAI: {str(e)}")
+        
+        processing_time = time.time() - start_time
+        content = "".join(parts)
+        
+        input_tokens = _usage_field(usage, "prompt_tokens")
+        output_tokens = _usage_field(usage, "completion_tokens")
+        details = usage.get("prompt_tokens_details") if isinstance(usage, dict) else getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = _usage_field(details, "cached_tokens")
+        if usage is None:
+            input_tokens = sum(len(m["content"] or "") for m in messages) // 4
+            output_tokens = len(content) // 4
+        
+        metrics.inc("llm_requests_total", model=model, status="ok")
+        metrics.observe("llm_request_seconds", processing_time, model=model)
+        if first_token_time is not None:
+            metrics.observe("llm_first_token_seconds", first_token_time, model=model)
+        
+        yield {
+            "type": "done",
+            "content": content,
+            "tokens": input_tokens + output_tokens,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cached_tokens": cached_tokens,
+            "cost": LLMService.calculate_cost(model, input_tokens, output_tokens, cached_tokens),
+            "processing_time": processing_time,
+            "first_token_time": first_token_time,
+            "model": model
+        }
@@ -0,0 +1,154 @@
+"""
+Cliente OpenAI local (stub) para dry-run, replays e benchmarks
+
+Implementa só o que o LLMService usa: `chat.completions.create(...)`, com
+ou sem stream, e `close()`. Respostas são determinísticas (derivadas da
+última mensagem do usuário), a latência é simulada e o uso de tokens é
+estimado (~4 caracteres/token), incluindo cached_tokens quando o mesmo
+prefixo de system prompt já foi visto - como faz o cache de prompt da OpenAI.
+
+Com `tool_calls_per_turn` > 0 e `tools` na requisição, o stub faz papel de
+modelo com function calling: a cada mensagem de usuário pede essas
+ferramentas (na ordem de `tools`, todas na mesma rodada) e, depois dos
+resultados (mensagens "tool"), responde com texto.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+# A OpenAI só cacheia prompts a partir de 1024 tokens, em blocos de 128
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_BLOCK = 128
+
+def estimate_tokens(text: Optional[str]) -> int:
+    return max(1, len(text or "") // 4)
+
+class StubCompletions:
+    def __init__(
+        self,
+        latency: float = 0.05,
+        seconds_per_token: float = 0.0,
+        reply_tokens: int = 40,
+        latency_sampler: Optional[Callable[[], float]] = None,
+        tool_calls_per_turn: int = 0
+    ):
+        self.latency = latency
+        self.latency_sampler = latency_sampler
+        self.seconds_per_token = seconds_per_token
+        self.reply_tokens = reply_tokens
+        self.tool_calls_per_turn = tool_calls_per_turn
+        self.calls = 0
+        self._seen_prefixes = set()
+
+    def _latency(self) -> float:
+        """Latência fixa ou sorteada (ex.: cauda longa injetada em benchmarks)"""
+        return self.latency_sampler() if self.latency_sampler else self.latency
+
+    def _reply(self, model: str, messages: List[Dict], max_tokens: int) -> str:
+        last_user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        digest = hashlib.sha1(f"{model}:{last_user}".encode("utf-8")).hexdigest()
+        words = [digest[i:i + 6] for i in range(0, len(digest) - 6, 3)]
+        size = min(self.reply_tokens, max_tokens or self.reply_tokens)
+        body = " ".join((words * (size // len(words) + 1))[:size])
+        return f"[stub:{model}] {body}"
+
+    def _usage(self, messages: List[Dict], content: str) -> SimpleNamespace:
+        prompt_tokens = sum(estimate_tokens(m.get("content")) for m in messages)
+        completion_tokens = estimate_tokens(content)
+
+        cached_tokens = 0
+        prefix = messages[0]["content"] if messages and messages[0]["role"] == "system" else ""
+        key = hashlib.sha1(prefix.encode("utf-8")).hexdigest()
+        if key in self._seen_prefixes and prompt_tokens >= PROMPT_CACHE_MIN_TOKENS:
+            cached_tokens = estimate_tokens(prefix) // PROMPT_CACHE_BLOCK * PROMPT_CACHE_BLOCK
+        self._seen_prefixes.add(key)
+
+        return SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens)
+        )
+
+    def _tool_calls(self, messages: List[Dict], tools: Optional[List[Dict]]) -> Optional[List]:
+        """Pede ferramentas só em resposta a uma mensagem de usuário"""
+        if not tools or not self.tool_calls_per_turn or messages[-1]["role"] != "user":
+            return None
+        query = messages[-1]["content"]
+        return [
+            SimpleNamespace(
+                id=f"call_{self.calls}_{i}",
+                type="function",
+                function=SimpleNamespace(
+                    name=tools[i % len(tools)]["function"]["name"],
+                    arguments=json.dumps({"query": query}, ensure_ascii=False)
+                )
+            )
+            for i in range(self.tool_calls_per_turn)
+        ]
+
+    async def create(
+        self,
+        model: str,
+        messages: List[Dict],
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        stream: bool = False,
+        tools: Optional[List[Dict]] = None,
+        **kwargs
+    ):
+        self.calls += 1
+        tool_calls = self._tool_calls(messages, tools)
+        content = None if tool_calls else self._reply(model, messages, max_tokens)
+        usage = self._usage(messages, content or json.dumps([c.function.name for c in tool_calls]))
+
+        if stream:
+            return self._stream(model, content or "", usage)
+
+        await asyncio.sleep(self._latency() + self.seconds_per_token * usage.completion_tokens)
+        return SimpleNamespace(
+            id=f"stub-{self.calls}",
+            model=model,
+            created=int(time.time()),
+            choices=[SimpleNamespace(
+                index=0,
+                finish_reason="tool_calls" if tool_calls else "stop",
+                message=SimpleNamespace(role="assistant", content=content, tool_calls=tool_calls)
+            )],
+            usage=usage
+        )
+
+    async def _stream(self, model: str, content: str, usage: SimpleNamespace):
+        await asyncio.sleep(self._latency())
+        for i, word in enumerate(content.split(" ")):
+            await asyncio.sleep(self.seconds_per_token)
+            delta = word if i == 0 else " " + word
+            yield SimpleNamespace(
+                model=model,
+                usage=None,
+                choices=[SimpleNamespace(index=0, finish_reason=None, delta=SimpleNamespace(content=delta))]
+            )
+        yield SimpleNamespace(model=model, usage=usage, choices=[])
+
+class StubOpenAIClient:
+    """Substitui AsyncOpenAI nos pontos em que o LLMService aceita `client`"""
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        seconds_per_token: float = 0.0,
+        reply_tokens: int = 40,
+        latency_sampler: Optional[Callable[[], float]] = None,
+        tool_calls_per_turn: int = 0
+    ):
+        self.chat = SimpleNamespace(
+            completions=StubCompletions(
+                latency, seconds_per_token, reply_tokens, latency_sampler, tool_calls_per_turn
+            )
+        )
+
+    async def close(self):
+        pass
@@ -0,0 +1,93 @@
+"""
+Prompt Builder - prefixo estável por agente
+
+A OpenAI aplica desconto (cached input) quando o início do prompt é
+idêntico, byte a byte, a um prompt recente (a partir de ~1024 tokens). Para
+aproveitar isso, o prompt é montado sempre na mesma ordem:
+
+    [prefixo estático do agente] + [histórico] + [contexto dinâmico]
+
+O prefixo (system prompt + preâmbulos fixos de RAG/tools) é normalizado,
+montado uma vez por versão do agente (id, updated_at) e reutilizado como a
+mesma string. Conteúdo que muda a cada turno (trechos recuperados, data,
+dados do usuário) nunca entra no prefixo: vai depois do histórico.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from app.core import metrics
+
+PREFIX_CACHE_SIZE = 1024
+
+RAG_PREAMBLE = (
+    "Quando houver trechos de documentos no contexto, responda com base neles "
+    "e diga quando a informação não estiver disponível."
+)
+TOOLS_PREAMBLE = (
+    "Quando uma ferramenta for necessária, chame-a em vez de supor o resultado."
+)
+
+@dataclass(frozen=True)
+class PromptPrefix:
+    messages: Tuple[Dict[str, str], ...]
+    hash: str
+
+def normalize(text: Optional[str]) -> str:
+    """Quebras de linha e espaços finais não podem variar entre requisições"""
+    text = (text or "").replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in text.strip().split("\n"))
+
+def build_prefix(agent) -> PromptPrefix:
+    """Monta o prefixo sem cache (get_prefix é a versão cacheada)"""
+    parts = [normalize(agent.system_prompt)]
+    if getattr(agent, "rag_enabled", False):
+        parts.append(RAG_PREAMBLE)
+    if getattr(agent, "function_calling_enabled", False):
+        parts.append(TOOLS_PREAMBLE)
+    content = "\n\n".join(p for p in parts if p)
+    return PromptPrefix(
+        messages=({"role": "system", "content": content},),
+        hash=hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+    )
+
+_prefixes: "OrderedDict[tuple, PromptPrefix]" = OrderedDict()
+_lock = threading.Lock()
+
+def get_prefix(agent) -> PromptPrefix:
+    """Prefixo do agente, reaproveitado enquanto (id, updated_at) não mudar"""
+    key = (agent.id, agent.updated_at)
+    with _lock:
+        prefix = _prefixes.get(key)
+        if prefix is not None:
+            _prefixes.move_to_end(key)
+            return prefix
+
+    prefix = build_prefix(agent)
+    with _lock:
+        _prefixes[key] = prefix
+        while len(_prefixes) > PREFIX_CACHE_SIZE:
+            _prefixes.popitem(last=False)
+    return prefix
+
+def build_messages(
+    prefix: PromptPrefix,
+    history: List,
+    context: Optional[str] = None
+) -> List[Dict[str, str]]:
+    """Prefixo + histórico + contexto dinâmico (sempre no fim)"""
+    messages = list(prefix.messages)
+    for msg in history:
+        messages.append({"role": msg.role.value, "content": msg.content})
+    if context:
+        messages.append({"role": "system", "content": context})
+    return messages
+
+def record_usage(agent_id, llm_response: Dict):
+    """Tokens de entrada cacheados vs. não cacheados, por agente"""
+    cached = llm_response.get("cached_tokens", 0)
+    uncached = llm_response["input_tokens"] - cached
+    metrics.inc("llm_prompt_tokens_total", cached, agent=agent_id, kind="cached")
+    metrics.inc("llm_prompt_tokens_total", uncached, agent=agent_id, kind="uncached")
@@ -0,0 +1,200 @@
+"""
+Purge - remoção definitiva em lotes de dados mortos
+
+Agentes apagados (deleted_at em routes/agents.py; deleted_at + status
+archived em app/api/agents.py) ficam PURGE_AGENT_GRACE_DAYS dias em
+soft-delete e depois são removidos de vez, junto com conversas, mensagens,
+documentos e canais. Conversas sem atividade há mais que a retenção do
+agente (agents.message_retention_days, fallback MESSAGE_RETENTION_DAYS)
+também são removidas.
+
+Nada de DELETE em cascata de uma vez: mensagens e conversas saem em lotes
+de PURGE_BATCH_SIZE, com commit e pausa (PURGE_BATCH_PAUSE) entre lotes, e
+cada execução para depois de PURGE_MAX_SECONDS (continua na próxima). O
+progresso fica em progress() e em purge_rows_deleted_total.
+
+Uso manual:
+    python -m app.services.purge
+"""
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import text
+
+from app.core import metrics
+from app.core.partitions import default_retention_days
+
+PURGE_AGENT_GRACE_DAYS = int(os.getenv("PURGE_AGENT_GRACE_DAYS", "30"))
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "2000"))
+PURGE_BATCH_PAUSE = float(os.getenv("PURGE_BATCH_PAUSE", "0.1"))
+PURGE_MAX_SECONDS = float(os.getenv("PURGE_MAX_SECONDS", "300"))
+PURGE_INTERVAL = float(os.getenv("PURGE_INTERVAL", str(60 * 60)))
+
+# Mensagens de um conjunto de conversas (subselect em conversations)
+DELETE_MESSAGES_SQL = """
+    DELETE FROM messages
+    WHERE (id, created_at) IN (
+        SELECT m.id, m.created_at
+        FROM messages m
+        WHERE m.conversation_id IN ({conversations})
+        LIMIT :batch_size
+    )
+"""
+
+DELETE_CONVERSATIONS_SQL = """
+    DELETE FROM conversations
+    WHERE id IN (
+        SELECT c.id FROM ({conversations}) c(id)
+        LIMIT :batch_size
+    )
+"""
+
+AGENT_CONVERSATIONS = "SELECT id FROM conversations WHERE agent_id = :agent_id"
+
+# last_message_at só existe a partir do cache de conversas e fica NULL em
+# conversas antigas até o backfill (app.core.conversation_counters); sem ele,
+# a última mensagem real decide - nunca created_at sozinho
+EXPIRED_CONVERSATIONS = """
+    SELECT c.id FROM conversations c
+    WHERE c.agent_id = :agent_id
+      AND COALESCE(c.last_message_at, c.created_at) < :cutoff
+      AND (c.last_message_at IS NOT NULL OR NOT EXISTS (
+          SELECT 1 FROM messages recent
+          WHERE recent.conversation_id = c.id AND recent.created_at >= :cutoff
+      ))
+"""
+
+_progress: Dict = {
+    "running": False,
+    "phase": None,
+    "agent_id": None,
+    "deleted": {},
+    "started_at": None,
+    "last_report": None
+}
+
+class _Budget:
+    """Tempo máximo por execução; o que sobrar fica para a próxima"""
+
+    def __init__(self, seconds: float):
+        self.deadline = time.monotonic() + seconds
+
+    @property
+    def exhausted(self) -> bool:
+        return time.monotonic() >= self.deadline
+
+def _count(table: str, rows: int):
+    if rows:
+        _progress["deleted"][table] = _progress["deleted"].get(table, 0) + rows
+        metrics.inc("purge_rows_deleted_total", rows, table=table)
+
+def _delete_in_batches(conn, sql: str, params: Dict, table: str, budget: _Budget, batch_size: int, pause: float) -> bool:
+    """Repete o DELETE em lotes até acabar; False se o tempo da execução esgotou"""
+    statement = text(sql)
+    while True:
+        rows = conn.execute(statement, {**params, "batch_size": batch_size}).rowcount
+        conn.commit()
+        _count(table, rows)
+        if rows < batch_size:
+            return True
+        if budget.exhausted:
+            return False
+        if pause:
+            time.sleep(pause)
+
+def purge_conversations(conn, conversations_sql: str, params: Dict, budget: _Budget,
+                        batch_size: int = PURGE_BATCH_SIZE, pause: float = PURGE_BATCH_PAUSE) -> bool:
+    """Mensagens primeiro, depois as conversas (o cascade não encontra mais nada)"""
+    done = _delete_in_batches(
+        conn, DELETE_MESSAGES_SQL.format(conversations=conversations_sql),
+        params, "messages", budget, batch_size, pause
+    )
+    if not done:
+        return False
+    return _delete_in_batches(
+        conn, DELETE_CONVERSATIONS_SQL.format(conversations=conversations_sql),
+        params, "conversations", budget, batch_size, pause
+    )
+
+def purge_deleted_agents(conn, budget: _Budget, grace_days: int = PURGE_AGENT_GRACE_DAYS) -> List[str]:
+    """Remove de vez agentes em soft-delete há mais de `grace_days` dias"""
+    cutoff = datetime.utcnow() - timedelta(days=grace_days)
+    agent_ids = [str(row[0]) for row in conn.execute(text("""
+        SELECT id FROM agents
+        WHERE deleted_at IS NOT NULL AND deleted_at < :cutoff
+        ORDER BY deleted_at
+    """), {"cutoff": cutoff})]
+
+    purged = []
+    for agent_id in agent_ids:
+        _progress.update(phase="deleted_agent", agent_id=agent_id)
+        if not purge_conversations(conn, AGENT_CONVERSATIONS, {"agent_id": agent_id}, budget):
+            break
+        for table in ("documents", "channel_configs"):
+            rows = conn.execute(text(f"DELETE FROM {table} WHERE agent_id = :agent_id"), {"agent_id": agent_id}).rowcount
+            _count(table, rows)
+        _count("agents", conn.execute(text("DELETE FROM agents WHERE id = :agent_id"), {"agent_id": agent_id}).rowcount)
+        conn.commit()
+        purged.append(agent_id)
+        if budget.exhausted:
+            break
+    return purged
+
+def purge_expired_conversations(conn, budget: _Budget) -> Dict[str, int]:
+    """Conversas inativas além da retenção efetiva de cada agente"""
+    default = default_retention_days()
+    rows = conn.execute(text(
+        "SELECT id, message_retention_days FROM agents WHERE deleted_at IS NULL"
+    )).fetchall()
+
+    now = datetime.utcnow()
+    expired = {}
+    for agent_id, days in rows:
+        days = days if days is not None else default
+        if days is None:
+            continue
+        _progress.update(phase="expired_conversations", agent_id=str(agent_id))
+        before = _progress["deleted"].get("conversations", 0)
+        finished = purge_conversations(
+            conn, EXPIRED_CONVERSATIONS, {"agent_id": agent_id, "cutoff": now - timedelta(days=days)}, budget
+        )
+        expired[str(agent_id)] = _progress["deleted"].get("conversations", 0) - before
+        if not finished or budget.exhausted:
+            break
+    return expired
+
+def run_purge(max_seconds: float = PURGE_MAX_SECONDS) -> Dict:
+    """Job periódico: agentes apagados + conversas expiradas, com limite de tempo"""
+    from app.core.database import engine
+
+    start = time.time()
+    budget = _Budget(max_seconds)
+    _progress.update(running=True, phase=None, agent_id=None, deleted={}, started_at=start)
+    try:
+        with engine.connect() as conn:
+            purged_agents = purge_deleted_agents(conn, budget)
+            expired = {} if budget.exhausted else purge_expired_conversations(conn, budget)
+    finally:
+        _progress.update(running=False, phase=None, agent_id=None)
+
+    report = {
+        "purged_agents": purged_agents,
+        "expired_conversations": {k: v for k, v in expired.items() if v},
+        "deleted": dict(_progress["deleted"]),
+        "complete": not budget.exhausted,
+        "duration": round(time.time() - start, 3)
+    }
+    _progress["last_report"] = report
+    if report["deleted"]:
+        print(f"🧹 Purge: {report}")
+    return report
+
+def progress() -> Dict:
+    return {**_progress, "deleted": dict(_progress["deleted"])}
+
+metrics.register_collector(lambda: [("purge_running", {}, 1 if _progress["running"] else 0)])
+
+if __name__ == "__main__":
+    print(run_purge(max_seconds=float("inf")))
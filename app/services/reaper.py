@@ -0,0 +1,152 @@
+"""
+Reaper - fecha conversas ociosas
+
+Nada tirava conversas de `active`: o lookup de get_or_create_conversation
+varria um conjunto ativo sempre crescente e sessões públicas viviam para
+sempre. O job "conversation_reaper" fecha, em UPDATEs set-based de até
+REAPER_BATCH_SIZE linhas, as conversas sem mensagem há mais que o limite
+do agente (agents.idle_timeout_minutes; NULL = CONVERSATION_IDLE_MINUTES;
+0 = nunca fecha). O default global é 0: o fechamento é ligado por agente,
+ou globalmente de propósito.
+
+Conversas anteriores a conversations.last_message_at têm a coluna NULL até
+o backfill (python -m app.core.conversation_counters); para elas a última
+mensagem em messages decide, nunca created_at sozinho.
+
+Com o conjunto ativo pequeno, os índices parciais WHERE status = 'active'
+(lookup por agente/usuário/canal e ociosidade por agente) ficam pequenos e
+em cache. Nova mensagem numa conversa fechada (ex.: WebSocket aberto)
+reativa a conversa (ConversationService.add_message); nova sessão do mesmo
+usuário depois do fechamento abre outra conversa.
+
+Resumo opcional (CONVERSATION_CLOSE_SUMMARY=true): para até
+REAPER_SUMMARY_MAX_PER_RUN conversas fechadas com pelo menos
+REAPER_SUMMARY_MIN_MESSAGES mensagens, um resumo curto vai para
+conversations.extra_data["summary"].
+"""
+import asyncio
+import os
+import time
+from typing import Dict, List
+
+from sqlalchemy import text
+
+from app.core import metrics
+
+CONVERSATION_IDLE_MINUTES = int(os.getenv("CONVERSATION_IDLE_MINUTES", "0"))
+REAPER_INTERVAL = float(os.getenv("REAPER_INTERVAL", "300"))
+REAPER_BATCH_SIZE = int(os.getenv("REAPER_BATCH_SIZE", "5000"))
+REAPER_MAX_SECONDS = float(os.getenv("REAPER_MAX_SECONDS", "60"))
+CONVERSATION_CLOSE_SUMMARY = os.getenv("CONVERSATION_CLOSE_SUMMARY", "false").lower() == "true"
+REAPER_SUMMARY_MODEL = os.getenv("REAPER_SUMMARY_MODEL", "gpt-4o-mini")
+REAPER_SUMMARY_MIN_MESSAGES = int(os.getenv("REAPER_SUMMARY_MIN_MESSAGES", "4"))
+REAPER_SUMMARY_MAX_PER_RUN = int(os.getenv("REAPER_SUMMARY_MAX_PER_RUN", "50"))
+REAPER_SUMMARY_CONCURRENCY = int(os.getenv("REAPER_SUMMARY_CONCURRENCY", "4"))
+REAPER_SUMMARY_MESSAGES = 40
+
+SUMMARY_PROMPT = (
+    "Resuma a conversa abaixo em até 3 frases, em português: o que o usuário "
+    "queria, o que foi respondido e se algo ficou pendente."
+)
+
+# Por agente: range scan em idx_conversations_active_idle (agent_id, ociosidade);
+# last_message_at NULL -> sonda messages(conversation_id, created_at)
+CLOSE_IDLE_SQL = text("""
+    UPDATE conversations c
+    SET status = 'closed',
+        updated_at = now(),
+        extra_data = COALESCE(c.extra_data, '{}'::jsonb)
+            || jsonb_build_object('closed_reason', 'idle', 'closed_at', now())
+    WHERE c.id IN (
+        SELECT i.id
+        FROM agents a
+        JOIN conversations i
+          ON i.agent_id = a.id
+         AND i.status = 'active'
+         AND COALESCE(i.last_message_at, i.created_at)
+             < now() - make_interval(mins => COALESCE(a.idle_timeout_minutes, :default_minutes))
+         AND (i.last_message_at IS NOT NULL OR NOT EXISTS (
+             SELECT 1 FROM messages recent
+             WHERE recent.conversation_id = i.id
+               AND recent.created_at
+                   >= now() - make_interval(mins => COALESCE(a.idle_timeout_minutes, :default_minutes))
+         ))
+        WHERE COALESCE(a.idle_timeout_minutes, :default_minutes) > 0
+        LIMIT :batch_size
+        FOR UPDATE OF i SKIP LOCKED
+    )
+    RETURNING c.id, c.message_count
+""")
+
+def close_idle_conversations(conn, batch_size: int = REAPER_BATCH_SIZE,
+                             max_seconds: float = REAPER_MAX_SECONDS) -> List:
+    """Fecha em lotes até não sobrar ociosa (ou o tempo acabar); retorna (id, message_count)"""
+    deadline = time.monotonic() + max_seconds
+    closed = []
+    while True:
+        rows = conn.execute(CLOSE_IDLE_SQL, {
+            "default_minutes": CONVERSATION_IDLE_MINUTES,
+            "batch_size": batch_size
+        }).fetchall()
+        conn.commit()
+        closed.extend(rows)
+        if len(rows) < batch_size or time.monotonic() >= deadline:
+            return closed
+
+async def _summarize(ids: List) -> int:
+    from app.core.database import SessionLocal
+    from app.services.conversation_service import ConversationService
+    from app.services.llm_service import LLMService, create_llm_client
+
+    client = create_llm_client()
+    semaphore = asyncio.Semaphore(REAPER_SUMMARY_CONCURRENCY)
+
+    async def summarize(conversation_id) -> bool:
+        async with semaphore:
+            with SessionLocal() as db:
+                history = ConversationService.get_conversation_history(
+                    db, conversation_id, limit=REAPER_SUMMARY_MESSAGES
+                )
+                transcript = "\n".join(f"{m.role.value}: {m.content}" for m in history)
+                try:
+                    result = await LLMService.generate_response(
+                        [{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": transcript}],
+                        model=REAPER_SUMMARY_MODEL, temperature=0.2, max_tokens=200, client=client
+                    )
+                except Exception as e:
+                    print(f"⚠️ Resumo da conversa {conversation_id} falhou: {e}")
+                    return False
+                db.execute(text("""
+                    UPDATE conversations
+                    SET extra_data = COALESCE(extra_data, '{}'::jsonb)
+                        || jsonb_build_object('summary', CAST(:summary AS text), 'summary_cost', CAST(:cost AS float))
+                    WHERE id = :id
+                """), {"id": conversation_id, "summary": result["content"], "cost": result["cost"]})
+                db.commit()
+                return True
+
+    try:
+        return sum(await asyncio.gather(*(summarize(cid) for cid in ids)))
+    finally:
+        await client.close()
+
+def run_reaper() -> Dict:
+    """Job periódico (roda em thread do scheduler)"""
+    from app.core.database import engine
+
+    start = time.time()
+    with engine.connect() as conn:
+        closed = close_idle_conversations(conn)
+
+    summarized = 0
+    if CONVERSATION_CLOSE_SUMMARY and closed:
+        candidates = [cid for cid, count in closed if (count or 0) >= REAPER_SUMMARY_MIN_MESSAGES]
+        if candidates:
+            # Loop próprio: o job roda fora do event loop da aplicação
+            summarized = asyncio.run(_summarize(candidates[:REAPER_SUMMARY_MAX_PER_RUN]))
+
+    metrics.inc("conversations_closed_total", len(closed), reason="idle")
+    report = {"closed": len(closed), "summarized": summarized, "duration": round(time.time() - start, 3)}
+    if closed:
+        print(f"💤 Reaper: {report}")
+    return report
@@ -0,0 +1,336 @@
+"""
+Replay / avaliação de agentes
+
+Reexecuta um dataset de mensagens de usuário contra uma ou mais
+configurações de agente (system_prompt, model, temperature...) pelo mesmo
+caminho de produção (prompt_builder + LLMService.generate_response), com
+concorrência limitada, e grava latência, tokens, custo e resposta de cada
+par (config, item) em um arquivo JSONL.
+
+- Retomável: pares já gravados com status "ok" no arquivo de resultados
+  são pulados; erros são tentados de novo na próxima execução.
+- Dry-run: usa o StubOpenAIClient local (sem custo, sem rede).
+
+Dataset (JSONL): {"id": "...", "message": "...", "history": [{"role", "content"}]}
+Configs (JSON): [{"name": "atual", "agent_id": "..."},
+                 {"name": "mini", "agent_id": "...", "model": "gpt-4o-mini"},
+                 {"name": "novo", "system_prompt": "...", "temperature": 0.2}]
+
+Uso:
+    python -m app.services.replay export --agent-id UUID --limit 500 --output dataset.jsonl
+    python -m app.services.replay run --dataset dataset.jsonl --configs configs.json \\
+        --output results.jsonl [--concurrency 8] [--dry-run]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional
+
+from app.services import prompt_builder
+from app.services.llm_service import LLMService
+
+REPLAY_DIR = os.getenv("REPLAY_DIR", "replays")
+REPLAY_CONCURRENCY = int(os.getenv("REPLAY_CONCURRENCY", "8"))
+
+CONFIG_FIELDS = ("system_prompt", "model", "temperature", "max_tokens", "rag_enabled", "function_calling_enabled")
+
+@dataclass
+class ReplayConfig:
+    name: str
+    system_prompt: str
+    model: str = "gpt-4o-mini"
+    temperature: float = 0.7
+    max_tokens: int = 1000
+    rag_enabled: bool = False
+    function_calling_enabled: bool = False
+
+def load_configs(specs: List[Dict], db=None) -> List[ReplayConfig]:
+    """Specs com `agent_id` partem do agente salvo; demais campos sobrescrevem"""
+    configs = []
+    for spec in specs:
+        values = {}
+        if spec.get("agent_id"):
+            from app.models import Agent
+
+            if db is None:
+                raise ValueError("agent_id requer acesso ao banco")
+            agent = db.query(Agent).filter(Agent.id == spec["agent_id"]).first()
+            if not agent:
+                raise ValueError(f"Agente {spec['agent_id']} não encontrado")
+            values = {field: getattr(agent, field) for field in CONFIG_FIELDS}
+        values.update({k: v for k, v in spec.items() if k in CONFIG_FIELDS})
+        if not values.get("system_prompt"):
+            raise ValueError(f"Config '{spec.get('name')}' sem system_prompt")
+        configs.append(ReplayConfig(name=spec.get("name") or f"config{len(configs)}", **values))
+
+    names = [c.name for c in configs]
+    if len(set(names)) != len(names):
+        raise ValueError("Nomes de config repetidos")
+    return configs
+
+def load_dataset(path: str) -> List[Dict]:
+    items = []
+    with open(path, encoding="utf-8") as fh:
+        for line_number, line in enumerate(fh, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            item.setdefault("id", str(line_number))
+            items.append(item)
+    return items
+
+def export_dataset(db, agent_id: Optional[str] = None, limit: int = 1000) -> List[Dict]:
+    """Mensagens de usuário mais recentes (opcionalmente de um agente)"""
+    from app.models import Conversation, Message, MessageRole
+
+    query = db.query(Message.id, Message.content).filter(Message.role == MessageRole.user)
+    if agent_id:
+        query = query.join(Conversation, Conversation.id == Message.conversation_id).filter(
+            Conversation.agent_id == agent_id
+        )
+    rows = query.order_by(Message.created_at.desc()).limit(limit).all()
+    return [{"id": str(row.id), "message": row.content} for row in rows]
+
+def write_jsonl(path: str, items: Iterable[Dict]):
+    with open(path, "w", encoding="utf-8") as fh:
+        for item in items:
+            fh.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+def read_results(path: str) -> List[Dict]:
+    if not os.path.exists(path):
+        return []
+    results = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                results.append(json.loads(line))
+            except ValueError:
+                continue  # linha truncada por uma execução interrompida
+    return results
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 4)
+
+def summarize(results: List[Dict]) -> Dict[str, Dict]:
+    """Resumo por config (última tentativa de cada item)"""
+    latest = {}
+    for result in results:
+        latest[(result["config"], result["item_id"])] = result
+
+    summary: Dict[str, Dict] = {}
+    for (config, _), result in latest.items():
+        entry = summary.setdefault(config, {"items": 0, "errors": 0, "_latency": [], "input_tokens": 0,
+                                            "cached_tokens": 0, "output_tokens": 0, "cost": 0.0})
+        entry["items"] += 1
+        if result["status"] != "ok":
+            entry["errors"] += 1
+            continue
+        entry["_latency"].append(result["latency"])
+        entry["input_tokens"] += result["input_tokens"]
+        entry["cached_tokens"] += result.get("cached_tokens", 0)
+        entry["output_tokens"] += result["output_tokens"]
+        entry["cost"] += result["cost"]
+
+    for entry in summary.values():
+        latencies = entry.pop("_latency")
+        ok = len(latencies)
+        entry.update({
+            "latency_p50": _percentile(latencies, 50),
+            "latency_p95": _percentile(latencies, 95),
+            "latency_p99": _percentile(latencies, 99),
+            "latency_mean": round(sum(latencies) / ok, 4) if ok else None,
+            "cost": round(entry["cost"], 6),
+            "cost_per_item": round(entry["cost"] / ok, 8) if ok else None,
+            "cached_ratio": round(entry["cached_tokens"] / entry["input_tokens"], 4) if entry["input_tokens"] else 0.0
+        })
+    return summary
+
+class ReplayRunner:
+    """Executa configs x dataset com no máximo `concurrency` chamadas simultâneas"""
+
+    def __init__(
+        self,
+        configs: List[ReplayConfig],
+        dataset: List[Dict],
+        output_path: str,
+        concurrency: int = REPLAY_CONCURRENCY,
+        dry_run: bool = False,
+        client=None
+    ):
+        if dry_run and client is None:
+            from app.services.llm_stub import StubOpenAIClient
+            client = StubOpenAIClient()
+        self.configs = configs
+        self.dataset = dataset
+        self.output_path = output_path
+        self.concurrency = max(1, concurrency)
+        self.dry_run = dry_run
+        self.client = client
+        self.total = len(configs) * len(dataset)
+        self.done = 0
+        self.skipped = 0
+        self.errors = 0
+        self.status = "pending"
+        self.elapsed = 0.0
+        self._prefixes = {
+            c.name: prompt_builder.build_prefix(SimpleNamespace(**asdict(c))) for c in configs
+        }
+
+    def _completed_keys(self) -> set:
+        return {
+            (r["config"], r["item_id"]) for r in read_results(self.output_path) if r.get("status") == "ok"
+        }
+
+    async def _run_one(self, config: ReplayConfig, item: Dict) -> Dict:
+        history = [
+            SimpleNamespace(role=SimpleNamespace(value=h["role"]), content=h["content"])
+            for h in item.get("history", [])
+        ]
+        history.append(SimpleNamespace(role=SimpleNamespace(value="user"), content=item["message"]))
+        messages = prompt_builder.build_messages(self._prefixes[config.name], history)
+
+        result = {"config": config.name, "item_id": str(item["id"]), "model": config.model}
+        start = time.perf_counter()
+        try:
+            response = await LLMService.generate_response(
+                messages=messages,
+                model=config.model,
+                temperature=config.temperature,
+                max_tokens=config.max_tokens,
+                client=self.client
+            )
+        except Exception as e:
+            result.update({"status": "error", "error": str(e), "latency": round(time.perf_counter() - start, 4)})
+            return result
+
+        result.update({
+            "status": "ok",
+            "latency": round(time.perf_counter() - start, 4),
+            "input_tokens": response["input_tokens"],
+            "cached_tokens": response.get("cached_tokens", 0),
+            "output_tokens": response["output_tokens"],
+            "cost": response["cost"],
+            "output": response["content"]
+        })
+        return result
+
+    async def run(self) -> Dict:
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+        completed = self._completed_keys()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        self.status = "running"
+        start = time.perf_counter()
+
+        with open(self.output_path, "a", encoding="utf-8") as out:
+
+            async def worker():
+                while True:
+                    pair = await queue.get()
+                    try:
+                        result = await self._run_one(*pair)
+                        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                        out.flush()
+                        self.done += 1
+                        if result["status"] != "ok":
+                            self.errors += 1
+                    finally:
+                        queue.task_done()
+
+            workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+            try:
+                for item in self.dataset:
+                    for config in self.configs:
+                        if (config.name, str(item["id"])) in completed:
+                            self.skipped += 1
+                            continue
+                        await queue.put((config, item))
+                await queue.join()
+            finally:
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+        self.elapsed = time.perf_counter() - start
+        self.status = "finished"
+        return self.report()
+
+    def progress(self) -> Dict:
+        return {
+            "status": self.status,
+            "total": self.total,
+            "done": self.done,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "dry_run": self.dry_run
+        }
+
+    def report(self) -> Dict:
+        return {
+            **self.progress(),
+            "seconds": round(self.elapsed, 3),
+            "throughput": round(self.done / self.elapsed, 2) if self.elapsed else None,
+            "results_path": self.output_path,
+            "configs": summarize(read_results(self.output_path))
+        }
+
+def new_run_id() -> str:
+    return time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export", help="exporta mensagens de usuário para JSONL")
+    export.add_argument("--agent-id")
+    export.add_argument("--limit", type=int, default=1000)
+    export.add_argument("--output", required=True)
+
+    run = sub.add_parser("run", help="executa o replay")
+    run.add_argument("--dataset", required=True)
+    run.add_argument("--configs", required=True, help="arquivo JSON com a lista de configs")
+    run.add_argument("--output", help=f"JSONL de resultados (padrão: {REPLAY_DIR}/<run_id>.jsonl)")
+    run.add_argument("--concurrency", type=int, default=REPLAY_CONCURRENCY)
+    run.add_argument("--dry-run", action="store_true", help="usa o modelo stub local")
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        from app.core.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            items = export_dataset(db, args.agent_id, args.limit)
+        finally:
+            db.close()
+        write_jsonl(args.output, items)
+        print(f"📦 {len(items)} mensagem(ns) exportada(s) para {args.output}")
+        return
+
+    with open(args.configs, encoding="utf-8") as fh:
+        specs = json.load(fh)
+
+    db = None
+    if any(spec.get("agent_id") for spec in specs):
+        from app.core.database import SessionLocal
+        db = SessionLocal()
+    try:
+        configs = load_configs(specs, db)
+    finally:
+        if db is not None:
+            db.close()
+
+    output = args.output or os.path.join(REPLAY_DIR, f"{new_run_id()}.jsonl")
+    runner = ReplayRunner(configs, load_dataset(args.dataset), output, args.concurrency, args.dry_run)
+    print(json.dumps(asyncio.run(runner.run()), indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Tools - registro de ferramentas e loop de function calling
+
+Agentes com function_calling_enabled recebem os schemas do `registry` e o
+turno vira um loop: o modelo pede ferramentas, elas rodam, os resultados
+voltam como mensagens "tool" e o modelo é chamado de novo, até responder
+com texto (ou TOOL_MAX_ROUNDS rodadas).
+
+- Chamadas de uma mesma rodada são independentes e rodam em paralelo
+  (asyncio.gather): o turno custa ~max(latência das ferramentas), não a soma
+- Cada ferramenta tem timeout próprio; timeout/erro vira um resultado
+  {"error": ...} para o modelo, sem derrubar o turno
+- Ferramentas idempotentes têm resultado em cache (TTL) por (nome,
+  argumentos), e chamadas idênticas na mesma rodada executam uma vez só
+- Funções síncronas rodam em thread (asyncio.to_thread)
+- Persistência compacta: nada de uma linha por mensagem "tool"; a resposta
+  final leva em extra_data["tools"] só nome, status, tempo, cache e um
+  trecho do resultado (TOOL_RESULT_PREVIEW caracteres)
+"""
+import asyncio
+import inspect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core import metrics
+from app.core.serialization import dumps as dump_json
+from app.services import hedging
+from app.services.hedging import HedgePolicy
+
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "10"))
+TOOL_MAX_ROUNDS = int(os.getenv("TOOL_MAX_ROUNDS", "4"))
+TOOL_CACHE_SIZE = int(os.getenv("TOOL_CACHE_SIZE", "1024"))
+TOOL_CACHE_TTL = float(os.getenv("TOOL_CACHE_TTL", "300"))
+TOOL_RESULT_MAX_CHARS = int(os.getenv("TOOL_RESULT_MAX_CHARS", "8000"))
+TOOL_RESULT_PREVIEW = int(os.getenv("TOOL_RESULT_PREVIEW", "200"))
+
+@dataclass(frozen=True)
+class Tool:
+    name: str
+    description: str
+    parameters: Dict
+    func: Callable[..., Any]
+    timeout: float = TOOL_TIMEOUT
+    idempotent: bool = False
+
+    def schema(self) -> Dict:
+        return {
+            "type": "function",
+            "function": {"name": self.name, "description": self.description, "parameters": self.parameters}
+        }
+
+class ToolRegistry:
+    def __init__(self):
+        self._tools: Dict[str, Tool] = {}
+
+    def register(self, tool: Tool) -> Tool:
+        self._tools[tool.name] = tool
+        return tool
+
+    def tool(
+        self,
+        name: str,
+        description: str,
+        parameters: Optional[Dict] = None,
+        timeout: float = TOOL_TIMEOUT,
+        idempotent: bool = False
+    ):
+        """Decorator: registra a função como ferramenta"""
+        def decorator(func):
+            self.register(Tool(
+                name=name,
+                description=description,
+                parameters=parameters or {"type": "object", "properties": {}},
+                func=func,
+                timeout=timeout,
+                idempotent=idempotent
+            ))
+            return func
+        return decorator
+
+    def get(self, name: str) -> Optional[Tool]:
+        return self._tools.get(name)
+
+    def schemas(self) -> List[Dict]:
+        """Ordem estável (por nome): os schemas entram no prefixo cacheável do prompt"""
+        return [self._tools[name].schema() for name in sorted(self._tools)]
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+class ToolResultCache:
+    """LRU com TTL para resultados de ferramentas idempotentes"""
+
+    def __init__(self, max_entries: int = TOOL_CACHE_SIZE, ttl: float = TOOL_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str]) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Tuple[str, str], content: str):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), content)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+registry = ToolRegistry()
+result_cache = ToolResultCache()
+
+@registry.tool(
+    "get_current_time",
+    "Data e hora atuais (UTC, ISO 8601).",
+    timeout=1.0
+)
+def get_current_time() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+def _encode(result: Any) -> str:
+    content = result if isinstance(result, str) else dump_json(result).decode("utf-8")
+    return content[:TOOL_RESULT_MAX_CHARS]
+
+def _parse_arguments(raw: Optional[str]) -> Dict:
+    args = json.loads(raw or "{}")
+    if not isinstance(args, dict):
+        raise ValueError("argumentos devem ser um objeto JSON")
+    return args
+
+async def _invoke(tool: Tool, args: Dict) -> str:
+    if inspect.iscoroutinefunction(tool.func):
+        call = tool.func(**args)
+    else:
+        call = asyncio.to_thread(tool.func, **args)
+    return _encode(await asyncio.wait_for(call, timeout=tool.timeout))
+
+async def run_tool(tool_registry: ToolRegistry, name: str, raw_arguments: Optional[str]) -> Dict:
+    """Executa uma chamada; nunca levanta exceção (erro vira resultado)"""
+    start = time.perf_counter()
+    tool = tool_registry.get(name)
+    status, cached = "ok", False
+
+    try:
+        if tool is None:
+            raise LookupError(f"ferramenta desconhecida: {name}")
+        args = _parse_arguments(raw_arguments)
+        key = (name, json.dumps(args, sort_keys=True, ensure_ascii=False))
+        content = result_cache.get(key) if tool.idempotent else None
+        if content is not None:
+            cached = True
+        else:
+            content = await _invoke(tool, args)
+            if tool.idempotent:
+                result_cache.put(key, content)
+    except asyncio.TimeoutError:
+        status = "timeout"
+        content = _encode({"error": f"timeout após {tool.timeout}s"})
+    except Exception as e:
+        status = "error"
+        content = _encode({"error": str(e)})
+
+    seconds = time.perf_counter() - start
+    metrics.inc("tool_calls_total", tool=name, status=status, cached=str(cached).lower())
+    if not cached:
+        metrics.observe("tool_call_seconds", seconds, tool=name)
+    return {"name": name, "content": content, "status": status, "cached": cached, "seconds": seconds}
+
+async def execute_tool_calls(
+    tool_calls: List[Dict],
+    tool_registry: ToolRegistry,
+    parallel: bool = True
+) -> List[Dict]:
+    """
+    Executa uma rodada de tool calls, na ordem recebida
+
+    Chamadas idênticas (mesmo nome e argumentos) executam uma vez só.
+    `parallel=False` existe para comparação em benchmark.
+    """
+    unique: Dict[Tuple[str, str], Any] = {}
+    for call in tool_calls:
+        unique.setdefault((call["name"], call["arguments"] or ""), None)
+
+    if parallel:
+        results = await asyncio.gather(*(run_tool(tool_registry, name, args) for name, args in unique))
+    else:
+        results = [await run_tool(tool_registry, name, args) for name, args in unique]
+    by_key = dict(zip(unique, results))
+
+    return [
+        {**by_key[(call["name"], call["arguments"] or "")], "tool_call_id": call["id"]}
+        for call in tool_calls
+    ]
+
+def compact_trace(executed: List[Dict]) -> List[Dict]:
+    """Resumo das chamadas para extra_data["tools"]"""
+    return [
+        {
+            "name": item["name"],
+            "status": item["status"],
+            "cached": item["cached"],
+            "ms": round(item["seconds"] * 1000),
+            "round": item["round"],
+            "preview": item["content"][:TOOL_RESULT_PREVIEW]
+        }
+        for item in executed
+    ]
+
+async def run_tool_loop(
+    messages: List[Dict],
+    model: str = "gpt-4o-mini",
+    temperature: float = 0.7,
+    max_tokens: int = 1000,
+    policy: Optional[HedgePolicy] = None,
+    client=None,
+    tool_registry: Optional[ToolRegistry] = None,
+    max_rounds: int = TOOL_MAX_ROUNDS,
+    parallel: bool = True
+) -> Dict:
+    """
+    Turno com function calling; mesmo formato de LLMService.generate_response
+
+    Tokens, custo e tempo somam todas as rodadas. "tools" traz o resumo
+    compacto das chamadas (compact_trace). Na última rodada permitida as
+    ferramentas não são oferecidas, forçando resposta em texto.
+    """
+    tool_registry = tool_registry or registry
+    schemas = tool_registry.schemas()
+    conversation = list(messages)
+    executed: List[Dict] = []
+    totals = {"tokens": 0, "input_tokens": 0, "output_tokens": 0, "cached_tokens": 0, "cost": 0.0}
+    start = time.time()
+
+    for round_number in range(max_rounds + 1):
+        response = await hedging.generate_response(
+            conversation, model, temperature, max_tokens,
+            policy=policy, client=client,
+            tools=schemas if round_number < max_rounds else None
+        )
+        for field in totals:
+            totals[field] += response.get(field, 0)
+
+        tool_calls = response.get("tool_calls")
+        if not tool_calls:
+            break
+
+        conversation.append({
+            "role": "assistant",
+            "content": response["content"] or None,
+            "tool_calls": [
+                {"id": c["id"], "type": "function", "function": {"name": c["name"], "arguments": c["arguments"]}}
+                for c in tool_calls
+            ]
+        })
+        results = await execute_tool_calls(tool_calls, tool_registry, parallel=parallel)
+        for result in results:
+            conversation.append({"role": "tool", "tool_call_id": result["tool_call_id"], "content": result["content"]})
+            executed.append({**result, "round": round_number + 1})
+
+    metrics.inc("tool_loop_rounds_total", round_number + 1, model=model)
+
+    return {
+        **response,
+        **totals,
+        "processing_time": time.time() - start,
+        "tools": compact_trace(executed)
+    }
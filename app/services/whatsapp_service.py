@@ -0,0 +1,296 @@
+"""
+WhatsApp Service - Canal WhatsApp (Cloud API)
+
+Fluxo: webhook valida assinatura -> responde 200 na hora -> mensagem vai
+para uma fila em memória limitada -> workers rodam process_message com
+channel="whatsapp" e enviam a resposta pela API de saída.
+
+A fila é por remetente (FIFO cada): os workers pegam remetentes prontos, não
+mensagens, e um remetente em processamento só volta à rodada quando a
+mensagem atual termina. Uma rajada de um remetente ocupa um worker, nunca
+todos.
+
+Proteções contra tempestade de retries do provedor:
+- dedupe por id da mensagem (LRU limitado); com IDEMPOTENCY_DB_ENABLED
+  (default com vários workers) também na tabela idempotency_keys, porque o
+  retry pode cair em outro worker
+- fila limitada: cheia = 503 e o provedor tenta de novo depois
+- no máximo WHATSAPP_WORKERS chamadas ao LLM simultâneas, e mensagens do
+  mesmo remetente são processadas em ordem
+
+Com vários workers (gunicorn) fila e ordem por remetente valem dentro de
+cada worker: duas mensagens do mesmo remetente que caiam em workers
+diferentes podem ser respondidas fora de ordem. Para ordem estrita, rode
+com WEB_CONCURRENCY=1 (default).
+"""
+import asyncio
+import hashlib
+import hmac
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.core import metrics
+from app.services.idempotency import IDEMPOTENCY_DB_ENABLED, claim_event
+
+WHATSAPP_APP_SECRET = os.getenv("WHATSAPP_APP_SECRET")
+WHATSAPP_VERIFY_TOKEN = os.getenv("WHATSAPP_VERIFY_TOKEN")
+WHATSAPP_ACCESS_TOKEN = os.getenv("WHATSAPP_ACCESS_TOKEN")
+WHATSAPP_API_URL = os.getenv("WHATSAPP_API_URL", "https://graph.facebook.com/v18.0").rstrip("/")
+WHATSAPP_QUEUE_SIZE = int(os.getenv("WHATSAPP_QUEUE_SIZE", "1000"))
+WHATSAPP_WORKERS = int(os.getenv("WHATSAPP_WORKERS", "4"))
+WHATSAPP_DEDUP_SIZE = int(os.getenv("WHATSAPP_DEDUP_SIZE", "10000"))
+WHATSAPP_DRAIN_TIMEOUT = float(os.getenv("WHATSAPP_DRAIN_TIMEOUT", "30"))
+
+@dataclass
+class InboundMessage:
+    message_id: str
+    phone_number_id: str
+    display_phone_number: str
+    sender: str
+    text: str
+    received_at: float
+
+class QueueFullError(Exception):
+    pass
+
+def verify_signature(body: bytes, signature_header: Optional[str], secret: Optional[str] = None) -> bool:
+    """Valida X-Hub-Signature-256 (HMAC-SHA256 do corpo cru com o app secret)"""
+    secret = secret or WHATSAPP_APP_SECRET
+    if not secret:
+        return False
+    if not signature_header or not signature_header.startswith("sha256="):
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature_header[len("sha256="):])
+
+def sign_body(body: bytes, secret: str) -> str:
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+def normalize_number(number: Optional[str]) -> str:
+    return re.sub(r"\D", "", number or "")
+
+def parse_webhook(payload: Dict) -> List[InboundMessage]:
+    """Extrai mensagens de texto do payload do webhook (ignora status/recibos)"""
+    messages = []
+    now = time.time()
+    for entry in payload.get("entry", []):
+        for change in entry.get("changes", []):
+            value = change.get("value", {})
+            metadata = value.get("metadata", {})
+            for message in value.get("messages", []):
+                if message.get("type") != "text":
+                    continue
+                messages.append(InboundMessage(
+                    message_id=message["id"],
+                    phone_number_id=str(metadata.get("phone_number_id", "")),
+                    display_phone_number=str(metadata.get("display_phone_number", "")),
+                    sender=str(message["from"]),
+                    text=message.get("text", {}).get("body", ""),
+                    received_at=now
+                ))
+    return messages
+
+class WhatsAppClient:
+    """Cliente de saída (Cloud API) com pool HTTP compartilhado"""
+
+    def __init__(self, base_url: str = WHATSAPP_API_URL):
+        self.base_url = base_url
+        self._http: Optional[httpx.AsyncClient] = None
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=httpx.Timeout(15.0, connect=5.0))
+        return self._http
+
+    async def send_text(self, phone_number_id: str, to: str, text: str, access_token: Optional[str] = None):
+        response = await self._client().post(
+            f"{self.base_url}/{phone_number_id}/messages",
+            headers={"Authorization": f"Bearer {access_token or WHATSAPP_ACCESS_TOKEN}"},
+            json={
+                "messaging_product": "whatsapp",
+                "to": to,
+                "type": "text",
+                "text": {"body": text}
+            }
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+def resolve_agent(db, message: InboundMessage) -> Optional[Tuple[object, Optional[str]]]:
+    """Agente dono do número: ChannelConfig.phone_number_id ou Agent.whatsapp_number"""
+    from app.models import Agent, ChannelConfig
+
+    row = db.query(Agent, ChannelConfig).join(
+        ChannelConfig, ChannelConfig.agent_id == Agent.id
+    ).filter(
+        ChannelConfig.channel == "whatsapp",
+        ChannelConfig.enabled == True,
+        ChannelConfig.config["phone_number_id"].astext == message.phone_number_id,
+        Agent.whatsapp_enabled == True,
+        Agent.is_active == True
+    ).first()
+
+    if row:
+        agent, config = row
+        return agent, (config.config or {}).get("access_token")
+
+    number = normalize_number(message.display_phone_number)
+    if not number:
+        return None
+
+    for agent in db.query(Agent).filter(
+        Agent.whatsapp_enabled == True,
+        Agent.is_active == True,
+        Agent.whatsapp_number.isnot(None)
+    ).all():
+        if normalize_number(agent.whatsapp_number) == number:
+            return agent, None
+    return None
+
+class WhatsAppDispatcher:
+    """Fila limitada + workers para processar mensagens recebidas"""
+
+    def __init__(
+        self,
+        queue_size: int = WHATSAPP_QUEUE_SIZE,
+        workers: int = WHATSAPP_WORKERS,
+        dedup_size: int = WHATSAPP_DEDUP_SIZE,
+        client: Optional[WhatsAppClient] = None
+    ):
+        self.queue_size = queue_size
+        self.workers = workers
+        self.dedup_size = dedup_size
+        self.client = client or WhatsAppClient()
+        # Remetentes com mensagem na fila; na fila _ready ou em processamento
+        self._pending: Dict[str, Deque[InboundMessage]] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._size = 0
+        self._tasks: List[asyncio.Task] = []
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+
+    @property
+    def depth(self) -> int:
+        return self._size
+
+    def _is_duplicate(self, message_id: str) -> bool:
+        if message_id in self._seen:
+            self._seen.move_to_end(message_id)
+            return True
+        self._seen[message_id] = None
+        while len(self._seen) > self.dedup_size:
+            self._seen.popitem(last=False)
+        return False
+
+    def enqueue(self, messages: List[InboundMessage]) -> Dict[str, int]:
+        """Enfileira sem bloquear; levanta QueueFullError se não couber tudo"""
+        if self._ready is None:
+            raise QueueFullError("Dispatcher não iniciado")
+
+        fresh = [m for m in messages if m.message_id not in self._seen]
+        if len(fresh) > self.queue_size - self._size:
+            metrics.inc("whatsapp_messages_total", len(fresh), result="rejected")
+            raise QueueFullError("Fila do WhatsApp cheia")
+
+        queued = 0
+        for message in fresh:
+            if self._is_duplicate(message.message_id):
+                continue
+            pending = self._pending.get(message.sender)
+            if pending is None:
+                pending = self._pending[message.sender] = deque()
+                self._ready.put_nowait(message.sender)
+            pending.append(message)
+            self._size += 1
+            queued += 1
+
+        duplicates = len(messages) - queued
+        metrics.inc("whatsapp_messages_total", queued, result="queued")
+        if duplicates:
+            metrics.inc("whatsapp_messages_total", duplicates, result="duplicate")
+        return {"queued": queued, "duplicates": duplicates}
+
+    async def handle(self, message: InboundMessage):
+        """Processa uma mensagem: conversa + LLM + resposta"""
+        from app.core.database import SessionLocal
+        from app.services.conversation_service import ConversationService
+
+        db = SessionLocal()
+        try:
+            if IDEMPOTENCY_DB_ENABLED and not claim_event(db, f"whatsapp:{message.message_id}"):
+                metrics.inc("whatsapp_messages_total", result="duplicate")
+                return
+            resolved = resolve_agent(db, message)
+            if not resolved:
+                metrics.inc("whatsapp_messages_total", result="unknown_agent")
+                print(f"⚠️ WhatsApp: nenhum agente para {message.phone_number_id}")
+                return
+            agent, access_token = resolved
+
+            result = await ConversationService.process_message(
+                db=db,
+                agent_id=agent.id,
+                user_identifier=f"whatsapp_{message.sender}",
+                user_message=message.text,
+                channel="whatsapp"
+            )
+        finally:
+            db.close()
+
+        await self.client.send_text(message.phone_number_id, message.sender, result["response"], access_token)
+        metrics.inc("whatsapp_messages_total", result="replied")
+        metrics.observe("whatsapp_turn_seconds", time.time() - message.received_at)
+
+    async def _worker(self):
+        while True:
+            sender = await self._ready.get()
+            pending = self._pending[sender]
+            message = pending.popleft()
+            self._size -= 1
+            try:
+                await self.handle(message)
+            except Exception as e:
+                metrics.inc("whatsapp_messages_total", result="error")
+                print(f"❌ WhatsApp: erro ao processar {message.message_id}: {e}")
+            finally:
+                # Próxima do mesmo remetente volta ao fim da rodada
+                if pending:
+                    self._ready.put_nowait(sender)
+                else:
+                    del self._pending[sender]
+                self._ready.task_done()
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._ready = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        print(f"📱 WhatsApp dispatcher: {self.workers} worker(s), fila {self.queue_size}")
+
+    async def stop(self, drain_timeout: float = WHATSAPP_DRAIN_TIMEOUT):
+        """Drena a fila (até drain_timeout) e encerra os workers"""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._ready.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ WhatsApp: {self._size} mensagem(ns) descartada(s) no shutdown")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.client.close()
+
+whatsapp_dispatcher = WhatsAppDispatcher()
+
+metrics.register_collector(lambda: [("whatsapp_queue_depth", {}, whatsapp_dispatcher.depth)])
@@ -0,0 +1,93 @@
+"""
+Compara dois resultados de benchmarks.load (ex.: main vs. branch)
+
+Para cada cenário presente nos dois arquivos: throughput, p50/p95/p99 e
+taxa de erro, com a variação percentual. Sai com código 1 se algum
+cenário regrediu além de --threshold (throughput caiu ou p95/p99 subiram
+mais que o limite, ou a taxa de erro aumentou mais que --error-threshold).
+
+    python -m benchmarks.compare benchmarks/results/abc123.json benchmarks/results/def456.json \\
+        [--threshold 0.10] [--json]
+"""
+import argparse
+import json
+from typing import Dict, List
+
+# (caminho, maior é melhor?)
+METRICS = [
+    (("throughput_rps",), True),
+    (("latency_ms", "p50"), False),
+    (("latency_ms", "p95"), False),
+    (("latency_ms", "p99"), False),
+    (("error_rate",), False),
+]
+
+def _get(data: Dict, path) -> float:
+    for key in path:
+        data = data[key]
+    return float(data)
+
+def compare(baseline: Dict, candidate: Dict, threshold: float, error_threshold: float) -> Dict:
+    scenarios = {}
+    regressions: List[str] = []
+    for name in baseline["scenarios"]:
+        if name not in candidate["scenarios"]:
+            continue
+        rows = {}
+        for path, higher_is_better in METRICS:
+            label = ".".join(path)
+            before = _get(baseline["scenarios"][name], path)
+            after = _get(candidate["scenarios"][name], path)
+            change = (after - before) / before if before else (0.0 if after == before else float("inf"))
+            if label == "error_rate":
+                regressed = after - before > error_threshold
+            elif label == "latency_ms.p50":
+                regressed = False  # informativo; a cauda decide
+            elif higher_is_better:
+                regressed = change < -threshold
+            else:
+                regressed = change > threshold
+            rows[label] = {"baseline": before, "candidate": after, "change": round(change, 4), "regressed": regressed}
+            if regressed:
+                regressions.append(f"{name}.{label}")
+        scenarios[name] = rows
+    return {
+        "baseline": baseline["meta"].get("commit"),
+        "candidate": candidate["meta"].get("commit"),
+        "scenarios": scenarios,
+        "regressions": regressions
+    }
+
+def render(result: Dict) -> str:
+    lines = [f"baseline {result['baseline']} -> candidate {result['candidate']}", ""]
+    header = f"{'cenário':<16}{'métrica':<18}{'antes':>12}{'depois':>12}{'Δ%':>10}"
+    lines += [header, "-" * len(header)]
+    for name, rows in result["scenarios"].items():
+        for label, row in rows.items():
+            flag = "  ⚠️" if row["regressed"] else ""
+            change = f"{row['change'] * 100:+.1f}" if row["change"] != float("inf") else "inf"
+            lines.append(f"{name:<16}{label:<18}{row['baseline']:>12.2f}{row['candidate']:>12.2f}{change:>10}{flag}")
+    lines.append("")
+    lines.append("Regressões: " + (", ".join(result["regressions"]) if result["regressions"] else "nenhuma"))
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Variação relativa tolerada (0.10 = 10%%)")
+    parser.add_argument("--error-threshold", type=float, default=0.01, help="Aumento absoluto tolerado na taxa de erro")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    result = compare(baseline, candidate, args.threshold, args.error_threshold)
+    print(json.dumps(result, indent=2) if args.json else render(result))
+    raise SystemExit(1 if result["regressions"] else 0)
+
+if __name__ == "__main__":
+    main()
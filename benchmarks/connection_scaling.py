@@ -0,0 +1,143 @@
+"""
+Conexões no Postgres ao escalar réplicas da API: direto vs. PgBouncer
+
+Cada processo (worker) abre duas engines (app.core.database e o
+database.py legado), mais uma por réplica de leitura. Com conexão direta,
+o pior caso no Postgres é réplicas x workers x engines x (pool_size +
+max_overflow). Atrás de um PgBouncer em modo transaction, o Postgres só vê o
+pool de servidor do PgBouncer (default_pool_size), não importa quantos
+processos existam.
+
+Modo modelo (sempre): tabela de conexões no pior caso, de 1x a --scale x.
+Modo medição (--url): sobe N "processos" simulados (engines independentes,
+em threads) fazendo sessões concorrentes e mede o pico em pg_stat_activity.
+Com --pgbouncer-url as engines usam o modo pgbouncer apontando para ele.
+
+Uso:
+    python -m benchmarks.connection_scaling [--replicas 2] [--workers 4] [--scale 10] \\
+        [--pgbouncer-pool 20]
+    python -m benchmarks.connection_scaling --url postgresql://... \\
+        [--pgbouncer-url postgresql://...:6432/...] [--processes 20] [--seconds 5]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+os.environ.setdefault("DATABASE_URL", "postgresql://bench@localhost/bench")
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from app.core.pooling import engine_kwargs, pool_limits
+
+ENGINES_PER_PROCESS = 2
+
+def model(args) -> list:
+    rows = []
+    for factor in sorted({1, 2, 5, args.scale}):
+        replicas = args.replicas * factor
+        processes = replicas * args.workers
+        engines = ENGINES_PER_PROCESS + args.read_replicas
+        direct = processes * engines * sum(pool_limits("session"))
+        client = processes * engines * sum(pool_limits("pgbouncer"))
+        rows.append({
+            "scale": f"{factor}x",
+            "api_replicas": replicas,
+            "processes": processes,
+            "direct_postgres_connections": direct,
+            "pgbouncer_client_connections": client,
+            "pgbouncer_postgres_connections": args.pgbouncer_pool,
+            "fits_max_connections": {
+                "direct": direct <= args.max_connections,
+                "pgbouncer": args.pgbouncer_pool <= args.max_connections
+            }
+        })
+    return rows
+
+def count_backends(url: str) -> int:
+    engine = create_engine(url, poolclass=NullPool)
+    with engine.connect() as conn:
+        value = conn.execute(text(
+            "SELECT count(*) FROM pg_stat_activity "
+            "WHERE datname = current_database() AND backend_type = 'client backend'"
+        )).scalar()
+    engine.dispose()
+    return int(value)
+
+def measure(args, mode: str, url: str) -> dict:
+    engines = [create_engine(url, **engine_kwargs(mode=mode)) for _ in range(args.processes)]
+    stop = time.monotonic() + args.seconds
+    peak = 0
+    sessions = 0
+    errors = 0
+    lock = threading.Lock()
+
+    def client(engine):
+        nonlocal sessions, errors
+        while time.monotonic() < stop:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT pg_sleep(0.02)"))
+                with lock:
+                    sessions += 1
+            except Exception:
+                with lock:
+                    errors += 1
+
+    threads = [
+        threading.Thread(target=client, args=(engine,), daemon=True)
+        for engine in engines
+        for _ in range(args.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    while time.monotonic() < stop:
+        peak = max(peak, count_backends(args.url))
+        time.sleep(0.2)
+    for thread in threads:
+        thread.join()
+    for engine in engines:
+        engine.dispose()
+
+    return {
+        "mode": mode,
+        "processes": args.processes,
+        "concurrency_per_process": args.concurrency,
+        "peak_postgres_backends": peak,
+        "sessions": sessions,
+        "sessions_per_second": round(sessions / args.seconds, 1),
+        "errors": errors
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replicas", type=int, default=2, help="réplicas da API hoje")
+    parser.add_argument("--workers", type=int, default=4, help="workers por réplica")
+    parser.add_argument("--read-replicas", type=int, default=0, help="réplicas de leitura do banco")
+    parser.add_argument("--scale", type=int, default=10)
+    parser.add_argument("--pgbouncer-pool", type=int, default=20, help="default_pool_size do PgBouncer")
+    parser.add_argument("--max-connections", type=int, default=100, help="max_connections do Postgres")
+    parser.add_argument("--url", help="Postgres direto (habilita a medição)")
+    parser.add_argument("--pgbouncer-url", help="PgBouncer em modo transaction na frente de --url")
+    parser.add_argument("--processes", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    report = {"benchmark": "connection_scaling", "model": model(args)}
+    if args.url:
+        report["measured"] = [measure(args, "session", args.url)]
+        if args.pgbouncer_url:
+            report["measured"].append(measure(args, "pgbouncer", args.pgbouncer_url))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(output + "\n")
+    print(output)
+
+if __name__ == "__main__":
+    main()
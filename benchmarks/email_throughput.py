@@ -0,0 +1,115 @@
+"""
+Benchmark de throughput do poller de e-mail
+
+Gera um maildir sintético (remetentes e threads variados), roda o
+EmailChannelWorker com um handler stub (latência de LLM simulada) e grava
+as respostas num maildir de saída. Não precisa de banco nem de OpenAI.
+
+Uso:
+    python -m benchmarks.email_throughput [--emails 500] [--agents 5] \\
+        [--latency 0.2] [--concurrency 1 4 16] [--batch-size 50]
+"""
+import argparse
+import asyncio
+import json
+import random
+import shutil
+import tempfile
+import time
+import uuid
+from email.message import EmailMessage
+import mailbox
+
+from app.services.email_channel import EmailChannelWorker, MaildirSender, MaildirSource
+
+def generate_maildir(path: str, n_emails: int, n_agents: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    box = mailbox.Maildir(path, create=True)
+    agents = [f"agente{i}@empresa.test" for i in range(n_agents)]
+    threads = {}
+    for i in range(n_emails):
+        sender = f"cliente{rng.randint(0, n_emails // 3)}@cliente.test"
+        message = EmailMessage()
+        message["From"] = sender
+        message["To"] = rng.choice(agents)
+        message["Message-ID"] = f"<{uuid.UUID(int=rng.getrandbits(128))}@cliente.test>"
+        root = threads.get(sender)
+        if root and rng.random() < 0.5:
+            message["In-Reply-To"] = root
+            message["References"] = root
+            message["Subject"] = "Re: Pedido"
+        else:
+            threads[sender] = message["Message-ID"]
+            message["Subject"] = f"Pedido {i}"
+        message.set_content(f"Olá, gostaria de saber sobre o pedido {i}. " * 3)
+        box.add(message)
+    return agents
+
+async def run_once(n_emails, n_agents, latency, concurrency, batch_size) -> dict:
+    workdir = tempfile.mkdtemp(prefix="email-bench-")
+    try:
+        agents = generate_maildir(f"{workdir}/inbox", n_emails, n_agents)
+        agent_ids = {address: index for index, address in enumerate(agents)}
+
+        async def handler(agent_id, inbound):
+            await asyncio.sleep(latency)
+            return f"Resposta automática do agente {agent_id}"
+
+        worker = EmailChannelWorker(
+            MaildirSource(f"{workdir}/inbox"),
+            MaildirSender(f"{workdir}/outbox"),
+            handler=handler,
+            resolve_agents=lambda addresses: {a: agent_ids[a] for a in addresses if a in agent_ids},
+            batch_size=batch_size,
+            per_agent_concurrency=concurrency
+        )
+
+        start = time.perf_counter()
+        processed = 0
+        while True:
+            stats = await worker.process_batch()
+            if not stats:
+                break
+            processed += sum(stats.values())
+        elapsed = time.perf_counter() - start
+
+        replies = len(mailbox.Maildir(f"{workdir}/outbox"))
+        # Reinício não reprocessa: um novo worker não encontra pendentes
+        restart = await EmailChannelWorker(
+            MaildirSource(f"{workdir}/inbox"), MaildirSender(f"{workdir}/outbox"),
+            handler=handler, resolve_agents=lambda a: {}
+        ).process_batch()
+
+        return {
+            "per_agent_concurrency": concurrency,
+            "processed": processed,
+            "replies": replies,
+            "reprocessed_after_restart": sum(restart.values()),
+            "seconds": round(elapsed, 3),
+            "emails_per_second": round(processed / elapsed, 2)
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=500)
+    parser.add_argument("--agents", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    results = [
+        asyncio.run(run_once(args.emails, args.agents, args.latency, c, args.batch_size))
+        for c in args.concurrency
+    ]
+    report = json.dumps({"benchmark": "email_throughput", "latency": args.latency, "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(report + "\n")
+    print(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Servidor OpenAI falso (compatível com /v1/chat/completions) para carga local
+
+Casca HTTP sobre o StubOpenAIClient (app.services.llm_stub): respostas
+determinísticas, uso de tokens estimado com cached_tokens por prefixo,
+stream SSE com `usage` no último chunk e tool calls opcionais. Aponte o
+backend para ele com OPENAI_BASE_URL=http://127.0.0.1:9200/v1 e qualquer
+OPENAI_API_KEY. Diferente do stub em processo, passa pelo httpx/SDK reais
+(pool de conexões, HTTP/2, parse de SSE).
+
+Latência: --latency (até o 1º token) fixa ou, com --latency-sigma > 0,
+lognormal com mediana --latency; --seconds-per-token por token gerado.
+Falhas injetadas (sementes fixas com --seed): --error-rate (500) e
+--rate-limit-rate (429 com Retry-After).
+
+    python -m benchmarks.fake_openai --port 9200 [--latency 0.3] [--latency-sigma 0.5] \\
+        [--seconds-per-token 0.01] [--reply-tokens 80] [--error-rate 0.01] [--seed 42]
+
+    GET    /_stats -> requisições, erros injetados, tokens
+    DELETE /_stats -> zera
+"""
+import argparse
+import random
+import time
+from types import SimpleNamespace
+from typing import Any
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.core.serialization import dumps
+from app.services.llm_stub import StubOpenAIClient
+
+def _plain(value: Any) -> Any:
+    """SimpleNamespace aninhado -> dict/list (formato JSON da API)"""
+    if isinstance(value, SimpleNamespace):
+        return {k: _plain(v) for k, v in vars(value).items()}
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    return value
+
+def create_app(
+    latency: float = 0.3,
+    latency_sigma: float = 0.0,
+    seconds_per_token: float = 0.0,
+    reply_tokens: int = 80,
+    error_rate: float = 0.0,
+    rate_limit_rate: float = 0.0,
+    tool_calls_per_turn: int = 0,
+    seed: int = 42
+) -> FastAPI:
+    rng = random.Random(seed)
+
+    def sample_latency() -> float:
+        if latency_sigma <= 0:
+            return latency
+        return rng.lognormvariate(0, latency_sigma) * latency
+
+    stub = StubOpenAIClient(
+        latency=latency,
+        seconds_per_token=seconds_per_token,
+        reply_tokens=reply_tokens,
+        latency_sampler=sample_latency,
+        tool_calls_per_turn=tool_calls_per_turn
+    )
+
+    app = FastAPI(title="Fake OpenAI API")
+    app.state.stats = {}
+
+    def count(key: str, value: int = 1):
+        app.state.stats[key] = app.state.stats.get(key, 0) + value
+
+    def error(status_code: int, message: str, kind: str, headers=None) -> JSONResponse:
+        count(f"injected_{status_code}")
+        return JSONResponse(
+            {"error": {"message": message, "type": kind, "param": None, "code": None}},
+            status_code=status_code,
+            headers=headers
+        )
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        count("requests")
+        draw = rng.random()
+        if draw < rate_limit_rate:
+            return error(429, "Rate limit injetado", "rate_limit_exceeded", {"retry-after": "1"})
+        if draw < rate_limit_rate + error_rate:
+            return error(500, "Erro injetado", "server_error")
+
+        stream = bool(body.get("stream"))
+        result = await stub.chat.completions.create(
+            model=body.get("model", "gpt-4o-mini"),
+            messages=body["messages"],
+            temperature=body.get("temperature", 0.7),
+            max_tokens=body.get("max_tokens") or 1000,
+            stream=stream,
+            tools=body.get("tools")
+        )
+
+        if not stream:
+            payload = _plain(result)
+            payload["object"] = "chat.completion"
+            count("prompt_tokens", result.usage.prompt_tokens)
+            count("completion_tokens", result.usage.completion_tokens)
+            return JSONResponse(payload)
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+        completion_id = f"chatcmpl-fake-{stub.chat.completions.calls}"
+        created = int(time.time())
+
+        async def events():
+            async for chunk in result:
+                if chunk.usage is not None:
+                    count("prompt_tokens", chunk.usage.prompt_tokens)
+                    count("completion_tokens", chunk.usage.completion_tokens)
+                    if not include_usage:
+                        continue
+                payload = _plain(chunk)
+                payload.update(id=completion_id, object="chat.completion.chunk", created=created)
+                yield b"data: " + dumps(payload) + b"\n\n"
+            yield b"data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [
+            {"id": model, "object": "model", "owned_by": "fake"} for model in ("gpt-4o-mini", "gpt-4o")
+        ]}
+
+    @app.get("/_stats")
+    async def get_stats():
+        return app.state.stats
+
+    @app.delete("/_stats")
+    async def clear_stats():
+        app.state.stats.clear()
+        return {}
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--latency", type=float, default=0.3, help="Segundos até o 1º token (mediana)")
+    parser.add_argument("--latency-sigma", type=float, default=0.0, help="Sigma lognormal (0 = fixa)")
+    parser.add_argument("--seconds-per-token", type=float, default=0.0)
+    parser.add_argument("--reply-tokens", type=int, default=80)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--tool-calls", type=int, default=0, help="Tool calls por turno quando há `tools`")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(create_app(
+        args.latency, args.latency_sigma, args.seconds_per_token, args.reply_tokens,
+        args.error_rate, args.rate_limit_rate, args.tool_calls, args.seed
+    ), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
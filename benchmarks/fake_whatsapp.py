@@ -0,0 +1,144 @@
+"""
+Fake da WhatsApp Cloud API para testes locais do canal WhatsApp
+
+serve: sobe a API falsa de saída (aponte WHATSAPP_API_URL para ela)
+    python -m benchmarks.fake_whatsapp serve --port 9100 [--latency 0.05] [--error-rate 0.0]
+    GET  /_sent   -> mensagens recebidas pela API falsa
+    DELETE /_sent -> limpa
+
+send: dispara webhooks assinados no backend, com retries duplicados
+      para simular tempestade de retries do provedor
+    python -m benchmarks.fake_whatsapp send --url http://localhost:8000/api/webhooks/whatsapp \\
+        --secret $WHATSAPP_APP_SECRET --messages 100 --duplicates 3
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+
+from app.services.whatsapp_service import sign_body
+
+def create_app(latency: float = 0.0, error_rate: float = 0.0) -> FastAPI:
+    app = FastAPI(title="Fake WhatsApp Cloud API")
+    app.state.sent = []
+
+    @app.post("/{phone_number_id}/messages")
+    async def send_message(phone_number_id: str, request: Request):
+        if latency:
+            await asyncio.sleep(latency)
+        if random.random() < error_rate:
+            raise HTTPException(status_code=500, detail="Erro injetado")
+        payload = await request.json()
+        message_id = f"wamid.{uuid.uuid4().hex}"
+        app.state.sent.append({
+            "id": message_id,
+            "phone_number_id": phone_number_id,
+            "authorization": request.headers.get("authorization"),
+            "payload": payload,
+            "at": time.time()
+        })
+        return {
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": payload.get("to"), "wa_id": payload.get("to")}],
+            "messages": [{"id": message_id}]
+        }
+
+    @app.get("/_sent")
+    async def list_sent():
+        return {"count": len(app.state.sent), "messages": app.state.sent}
+
+    @app.delete("/_sent")
+    async def clear_sent():
+        app.state.sent.clear()
+        return {"count": 0}
+
+    return app
+
+def build_payload(phone_number_id: str, display_number: str, sender: str, text: str, message_id: str) -> dict:
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "0",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": display_number, "phone_number_id": phone_number_id},
+                    "contacts": [{"profile": {"name": "Teste"}, "wa_id": sender}],
+                    "messages": [{
+                        "from": sender,
+                        "id": message_id,
+                        "timestamp": str(int(time.time())),
+                        "type": "text",
+                        "text": {"body": text}
+                    }]
+                }
+            }]
+        }]
+    }
+
+async def send_webhooks(args):
+    statuses = {}
+    latencies = []
+    async with httpx.AsyncClient(timeout=30) as client:
+        async def post(body: bytes):
+            start = time.perf_counter()
+            response = await client.post(args.url, content=body, headers={
+                "content-type": "application/json",
+                "x-hub-signature-256": sign_body(body, args.secret)
+            })
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        jobs = []
+        for i in range(args.messages):
+            body = json.dumps(build_payload(
+                args.phone_number_id, args.display_number,
+                f"5511{random.randint(10**8, 10**9 - 1)}" if args.senders == 0 else f"55119{i % args.senders:08d}",
+                f"Mensagem de teste {i}", f"wamid.{uuid.uuid4().hex}"
+            )).encode()
+            jobs.extend(post(body) for _ in range(1 + args.duplicates))
+        await asyncio.gather(*jobs)
+
+    latencies.sort()
+    print(json.dumps({
+        "requests": len(latencies),
+        "statuses": statuses,
+        "ack_p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "ack_p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2)
+    }, indent=2))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=9100)
+    serve.add_argument("--latency", type=float, default=0.0)
+    serve.add_argument("--error-rate", type=float, default=0.0)
+
+    send = sub.add_parser("send")
+    send.add_argument("--url", default="http://localhost:8000/api/webhooks/whatsapp")
+    send.add_argument("--secret", required=True)
+    send.add_argument("--phone-number-id", default="100000000000001")
+    send.add_argument("--display-number", default="5511999990000")
+    send.add_argument("--messages", type=int, default=50)
+    send.add_argument("--duplicates", type=int, default=0, help="Reenvios do mesmo webhook por mensagem")
+    send.add_argument("--senders", type=int, default=0, help="Remetentes distintos (0 = aleatório)")
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        import uvicorn
+        uvicorn.run(create_app(args.latency, args.error_rate), host=args.host, port=args.port)
+    else:
+        asyncio.run(send_webhooks(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark de hedged requests
+
+Upstream falso (StubOpenAIClient) com cauda longa injetada: a maioria das
+respostas leva ~`--latency`, mas uma fração `--slow-ratio` leva `--slow`.
+Roda a mesma carga sem e com hedge e compara p50/p95/p99, taxa de hedge e
+custo extra estimado das requisições descartadas.
+
+Uso:
+    python -m benchmarks.hedging_bench [--requests 400] [--concurrency 20] \\
+        [--latency 0.2] [--slow 2.0] [--slow-ratio 0.05] [--fallback-model gpt-4o-mini]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from typing import List, Optional
+
+os.environ.setdefault("DATABASE_URL", "postgresql://bench@localhost/bench")
+
+from app.services import hedging
+from app.services.hedging import HedgePolicy, LatencyTracker
+from app.services.llm_stub import StubOpenAIClient
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))], 4)
+
+def make_sampler(seed: int, latency: float, slow: float, slow_ratio: float):
+    rng = random.Random(seed)
+
+    def sample() -> float:
+        if rng.random() < slow_ratio:
+            return slow
+        return max(0.01, rng.gauss(latency, latency * 0.2))
+
+    return sample
+
+async def run_scenario(args, policy: Optional[HedgePolicy], stream: bool) -> dict:
+    hedging.tracker = LatencyTracker()
+    client = StubOpenAIClient(
+        latency_sampler=make_sampler(args.seed, args.latency, args.slow, args.slow_ratio)
+    )
+    messages = [
+        {"role": "system", "content": "Você é um atendente. " * 50},
+        {"role": "user", "content": "Qual o prazo de entrega?"}
+    ]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, hedges, extra_cost, cost = [], 0, 0.0, 0.0
+
+    async def one():
+        nonlocal hedges, extra_cost, cost
+        async with semaphore:
+            start = time.perf_counter()
+            if stream:
+                result = None
+                async for event in hedging.stream_response(messages, "gpt-4o-mini", policy=policy, client=client):
+                    if result is None:
+                        latencies.append(time.perf_counter() - start)  # tempo até o 1º token
+                        result = {}
+                    if event["type"] == "done":
+                        result = event
+            else:
+                result = await hedging.generate_response(messages, "gpt-4o-mini", policy=policy, client=client)
+                latencies.append(time.perf_counter() - start)
+            cost += result["cost"]
+            if result.get("hedge"):
+                hedges += 1
+                extra_cost += result["hedge"]["discarded_cost"]
+
+    # Aquecimento: enche a janela de latências usada para o limiar
+    await asyncio.gather(*(one() for _ in range(args.warmup)))
+    latencies.clear()
+    hedges, extra_cost, cost = 0, 0.0, 0.0
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "hedging": policy is not None,
+        "stream": stream,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": round(max(latencies), 4),
+        "hedge_rate": round(hedges / args.requests, 4),
+        "cost": round(cost, 6),
+        "hedge_extra_cost": round(extra_cost, 6),
+        "upstream_calls": client.chat.completions.calls,
+        "seconds": round(elapsed, 3)
+    }
+
+async def run(args) -> List[dict]:
+    policy = HedgePolicy(fallback_model=args.fallback_model, percentile=args.percentile)
+    results = []
+    for stream in (False, True):
+        results.append(await run_scenario(args, None, stream))
+        results.append(await run_scenario(args, policy, stream))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--slow", type=float, default=2.0)
+    parser.add_argument("--slow-ratio", type=float, default=0.05)
+    parser.add_argument("--percentile", type=float, default=90)
+    parser.add_argument("--fallback-model")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    hedging.HEDGE_MIN_DELAY = min(hedging.HEDGE_MIN_DELAY, args.latency)
+    report = json.dumps({"benchmark": "hedging", "results": asyncio.run(run(args))}, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(report + "\n")
+    print(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Cenários de carga HTTP contra o backend rodando - resultados em JSON
+
+Usa o manifesto do benchmarks.seed_dataset (slugs, ids e session_ids) e
+dispara, para cada cenário, --concurrency clientes em loop fechado por
+--duration segundos (após --warmup descartado). Escolhas de agente/sessão
+vêm de random.Random(--seed): a mesma sequência de requisições a cada
+execução.
+
+Cenários:
+    public_chat     POST /api/public/agents/{slug}/chat (LLM: benchmarks.fake_openai)
+    history         GET  /api/public/agents/{slug}/history/{session_id}
+    agent_list      GET  /api/agents (seguindo X-Next-Cursor)
+    analytics       GET  /api/analytics/usage?agent_id=...&days=30
+    conversations   GET  /api/agents/{id}/conversations
+    search          GET  /api/search/messages?q=...
+
+Saída (--out, default benchmarks/results/<commit>.json): por cenário,
+requisições, erros, status, throughput (req/s) e latência p50/p95/p99/max
+em ms, mais commit, data e parâmetros - compare com benchmarks.compare.
+
+    python -m benchmarks.load --base-url http://127.0.0.1:8000 \\
+        --scenarios public_chat history agent_list analytics \\
+        --concurrency 16 --duration 30 [--warmup 5] [--seed 42]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List
+
+import httpx
+
+SEARCH_TERMS = ["pedido", "reembolso", "troca defeito", "garantia", "\"prazo de entrega\"", "cupom", "cancelar -reembolso"]
+CHAT_MESSAGES = [
+    "Meu pedido ainda não chegou, podem verificar?",
+    "Qual o prazo de entrega para São Paulo?",
+    "Quero trocar um produto com defeito",
+    "Vocês têm garantia estendida?",
+]
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+class Scenarios:
+    """Cada cenário: função (client, rng) -> Response"""
+
+    def __init__(self, manifest: Dict):
+        self.agents = manifest["agents"]
+        self.with_sessions = [a for a in self.agents if a["sessions"]]
+        self.list_cursor = None
+
+    async def public_chat(self, client: httpx.AsyncClient, rng: random.Random):
+        agent = rng.choice(self.agents)
+        # Metade continua uma conversa existente (histórico no prompt), metade é nova
+        session = rng.choice(agent["sessions"]) if agent["sessions"] and rng.random() < 0.5 else None
+        return await client.post(
+            f"/api/public/agents/{agent['slug']}/chat",
+            json={"message": rng.choice(CHAT_MESSAGES), "session_id": session}
+        )
+
+    async def history(self, client: httpx.AsyncClient, rng: random.Random):
+        agent = rng.choice(self.with_sessions)
+        return await client.get(f"/api/public/agents/{agent['slug']}/history/{rng.choice(agent['sessions'])}")
+
+    async def agent_list(self, client: httpx.AsyncClient, rng: random.Random):
+        params = {"limit": 100}
+        if self.list_cursor:
+            params["cursor"] = self.list_cursor
+        response = await client.get("/api/agents", params=params)
+        self.list_cursor = response.headers.get("x-next-cursor")
+        return response
+
+    async def analytics(self, client: httpx.AsyncClient, rng: random.Random):
+        agent = rng.choice(self.agents)
+        return await client.get("/api/analytics/usage", params={"agent_id": agent["id"], "days": 30})
+
+    async def conversations(self, client: httpx.AsyncClient, rng: random.Random):
+        agent = rng.choice(self.agents)
+        params = {"limit": 50}
+        if rng.random() < 0.3:
+            params["status"] = "active"
+        return await client.get(f"/api/agents/{agent['id']}/conversations", params=params)
+
+    async def search(self, client: httpx.AsyncClient, rng: random.Random):
+        params = {"q": rng.choice(SEARCH_TERMS), "days": 30, "limit": 20}
+        if rng.random() < 0.5:
+            params["agent_id"] = rng.choice(self.agents)["id"]
+        return await client.get("/api/search/messages", params=params)
+
+SCENARIOS = ["public_chat", "history", "agent_list", "analytics", "conversations", "search"]
+
+async def run_scenario(
+    name: str,
+    request: Callable[[httpx.AsyncClient, random.Random], Awaitable[httpx.Response]],
+    base_url: str,
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    seed: int,
+    timeout: float
+) -> Dict:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        measure_from = start + warmup
+        stop_at = measure_from + duration
+
+        async def worker(index: int):
+            nonlocal errors
+            rng = random.Random(f"{seed}:{name}:{index}")
+            while time.perf_counter() < stop_at:
+                began = time.perf_counter()
+                try:
+                    response = await request(client, rng)
+                    status = str(response.status_code)
+                    failed = response.status_code >= 400
+                except httpx.HTTPError as e:
+                    status, failed = type(e).__name__, True
+                if began < measure_from:
+                    continue
+                latencies.append(time.perf_counter() - began)
+                statuses[status] = statuses.get(status, 0) + 1
+                errors += failed
+
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - measure_from
+
+    ms = [value * 1000 for value in latencies]
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "error_rate": round(errors / len(latencies), 4) if latencies else 0.0,
+        "statuses": statuses,
+        "duration": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(ms, 50), 2),
+            "p95": round(percentile(ms, 95), 2),
+            "p99": round(percentile(ms, 99), 2),
+            "max": round(max(ms), 2) if ms else 0.0,
+            "mean": round(sum(ms) / len(ms), 2) if ms else 0.0
+        }
+    }
+
+async def main_async(args) -> Dict:
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    scenarios = Scenarios(manifest)
+
+    results = {}
+    for name in args.scenarios:
+        print(f"▶️  {name}: {args.concurrency} clientes, {args.duration}s")
+        results[name] = await run_scenario(
+            name, getattr(scenarios, name), args.base_url, args.concurrency,
+            args.duration, args.warmup, args.seed, args.timeout
+        )
+        summary = results[name]
+        print(f"   {summary['throughput_rps']} req/s, p50 {summary['latency_ms']['p50']} ms, "
+              f"p99 {summary['latency_ms']['p99']} ms, erros {summary['errors']}")
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "base_url": args.base_url,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "dataset": {k: manifest.get(k) for k in ("seed", "days", "totals")},
+            "python": platform.python_version(),
+            "host": platform.node()
+        },
+        "scenarios": results
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--manifest", default="benchmarks/results/dataset.json")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None, help="Arquivo JSON (default: benchmarks/results/<commit>.json)")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    out = args.out or f"benchmarks/results/{report['meta']['commit']}.json"
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"💾 {out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Gerador de dataset para carga (Postgres) - determinístico por --seed
+
+Cria agentes bench-NNNNN, conversas e mensagens em escala, com a mesma
+forma da produção: poucos agentes concentram a maioria das conversas
+(Zipf), conversas espalhadas em --days dias, mensagens alternando usuário/
+assistente com colunas de uso preenchidas, textos em português com números
+de pedido (para a busca full-text). Conversas e mensagens entram via COPY
+em lotes; partições mensais do período são criadas antes.
+
+Grava um manifesto (--manifest) com slugs e session_ids existentes, usado
+pelos cenários de benchmarks.load (histórico, listagens, analytics).
+
+    python -m benchmarks.seed_dataset --agents 50 --conversations 200000 \\
+        --messages-per-conversation 12 --days 90 --seed 42 [--reset]
+"""
+import argparse
+import io
+import json
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("DATABASE_URL", "postgresql://bench@localhost/bench")
+
+from sqlalchemy import insert, text
+
+from app.api.agents import AgentCreate, agent_values
+from app.core.database import init_database, migration_engine
+from app.core.partitions import ensure_message_partitions, is_messages_partitioned
+from app.models import Agent
+
+SLUG_PREFIX = "bench-"
+COPY_BATCH_ROWS = 50_000
+SAMPLE_SESSIONS_PER_AGENT = 200
+
+PRODUCTS = ["notebook", "celular", "fone", "geladeira", "cadeira", "monitor", "teclado", "tênis"]
+USER_TEMPLATES = [
+    "Olá, meu pedido {order} ainda não chegou, podem verificar?",
+    "Quero trocar o {product} do pedido {order}, veio com defeito",
+    "Qual o prazo de entrega do {product} para o CEP {cep}?",
+    "Gostaria de cancelar o pedido {order} e receber o reembolso",
+    "O {product} tem garantia de quanto tempo?",
+    "Meu cupom não funcionou na compra do {product}",
+    "Vocês entregam no sábado? Comprei um {product}",
+    "Reclamação: atendimento demorou e o pedido {order} veio errado",
+]
+ASSISTANT_TEMPLATES = [
+    "Claro! Verifiquei o pedido {order}: ele está em transporte e deve chegar em até 3 dias úteis.",
+    "Sinto muito pelo problema com o {product}. Abri a solicitação de troca do pedido {order}.",
+    "Para o CEP {cep}, o prazo do {product} é de 5 dias úteis após a confirmação do pagamento.",
+    "O cancelamento do pedido {order} foi registrado; o reembolso aparece em até 2 faturas.",
+    "O {product} tem 12 meses de garantia do fabricante, além dos 90 dias legais.",
+    "Entendo. Pode me enviar o código do cupom? Vou checar a validade para o {product}.",
+]
+
+def zipf_weights(n: int, s: float = 1.1):
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+def fill(template: str, rng: random.Random) -> str:
+    return template.format(
+        order=rng.randint(100000, 999999),
+        product=rng.choice(PRODUCTS),
+        cep=f"{rng.randint(10000, 99999)}-{rng.randint(100, 999)}"
+    )
+
+def reset(conn):
+    conn.execute(text("""
+        DELETE FROM messages WHERE conversation_id IN (
+            SELECT c.id FROM conversations c JOIN agents a ON a.id = c.agent_id WHERE a.slug LIKE :prefix
+        )
+    """), {"prefix": f"{SLUG_PREFIX}%"})
+    conn.execute(text(
+        "DELETE FROM conversations WHERE agent_id IN (SELECT id FROM agents WHERE slug LIKE :prefix)"
+    ), {"prefix": f"{SLUG_PREFIX}%"})
+    conn.execute(text("DELETE FROM agents WHERE slug LIKE :prefix"), {"prefix": f"{SLUG_PREFIX}%"})
+    conn.commit()
+
+def create_agents(conn, n: int, rng: random.Random):
+    rows = []
+    for i in range(n):
+        data = AgentCreate(
+            name=f"Bench Loja {i:05d}",
+            system_prompt=("Você é o atendente virtual da loja. Responda em português, com educação. " * 40)[:rng.randint(800, 6000)],
+            temperature=0.3
+        )
+        rows.append({**agent_values(data, f"{SLUG_PREFIX}{i:05d}"), "id": uuid.UUID(int=rng.getrandbits(128))})
+    conn.execute(insert(Agent), rows)
+    conn.commit()
+    return [(row["id"], row["slug"]) for row in rows]
+
+def _copy(cursor, table: str, columns: str, buffer: io.StringIO):
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN", buffer)
+    buffer.seek(0)
+    buffer.truncate()
+
+CONVERSATION_COLUMNS = (
+    "id, agent_id, user_identifier, channel, status, extra_data, message_count, "
+    "last_message_at, total_tokens, total_cost, created_at, updated_at"
+)
+MESSAGE_COLUMNS = (
+    "id, conversation_id, role, content, tokens, cost, processing_time, agent_id, model, "
+    "input_tokens, output_tokens, cached_tokens, ttft_ms, extra_data, created_at"
+)
+
+def generate(args) -> dict:
+    rng = random.Random(args.seed)
+    engine = migration_engine()
+    init_database()
+
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    start = now - timedelta(days=args.days)
+
+    with engine.connect() as conn:
+        if args.reset:
+            reset(conn)
+        if is_messages_partitioned(conn):
+            ensure_message_partitions(conn, since=start.date())
+            conn.commit()
+        agents = create_agents(conn, args.agents, rng)
+
+    weights = zipf_weights(len(agents))
+    sessions = {slug: [] for _, slug in agents}
+    channels = ["web"] * 8 + ["whatsapp", "email"]
+    totals = {"conversations": 0, "messages": 0}
+    started = time.time()
+
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        conversations, messages = io.StringIO(), io.StringIO()
+        pending = 0
+        for _ in range(args.conversations):
+            agent_id, slug = rng.choices(agents, weights)[0]
+            conversation_id = uuid.UUID(int=rng.getrandbits(128))
+            session_id = str(uuid.UUID(int=rng.getrandbits(128)))
+            if len(sessions[slug]) < SAMPLE_SESSIONS_PER_AGENT:
+                sessions[slug].append(session_id)
+
+            created = start + timedelta(seconds=rng.uniform(0, args.days * 86400 - 3600))
+            count = max(2, int(rng.expovariate(1 / args.messages_per_conversation)))
+            at = created
+            total_tokens, total_cost = 0, 0.0
+            for i in range(count):
+                at += timedelta(seconds=rng.randint(5, 300))
+                if i % 2 == 0:
+                    content = fill(rng.choice(USER_TEMPLATES), rng)
+                    messages.write(
+                        f"{uuid.UUID(int=rng.getrandbits(128))}\t{conversation_id}\tuser\t{content}\t0\t0\t0\t"
+                        f"{agent_id}\t\\N\t\\N\t\\N\t\\N\t\\N\t{{}}\t{at.isoformat()}\n"
+                    )
+                else:
+                    content = fill(rng.choice(ASSISTANT_TEMPLATES), rng)
+                    input_tokens = rng.randint(300, 2500)
+                    output_tokens = rng.randint(20, 300)
+                    cached = input_tokens // 128 * 128 if rng.random() < 0.6 else 0
+                    cost = (input_tokens - cached) * 0.15e-6 + cached * 0.075e-6 + output_tokens * 0.6e-6
+                    total_tokens += input_tokens + output_tokens
+                    total_cost += cost
+                    messages.write(
+                        f"{uuid.UUID(int=rng.getrandbits(128))}\t{conversation_id}\tassistant\t{content}\t"
+                        f"{input_tokens + output_tokens}\t{cost:.8f}\t{rng.uniform(0.3, 4):.3f}\t{agent_id}\t"
+                        f"gpt-4o-mini\t{input_tokens}\t{output_tokens}\t{cached}\t{rng.randint(200, 2500)}\t"
+                        f"{{}}\t{at.isoformat()}\n"
+                    )
+            status = "active" if at > now - timedelta(days=1) else "closed"
+            conversations.write(
+                f"{conversation_id}\t{agent_id}\tpublic_{session_id}\t{rng.choice(channels)}\t{status}\t{{}}\t"
+                f"{count}\t{at.isoformat()}\t{total_tokens}\t{total_cost:.8f}\t{created.isoformat()}\t{at.isoformat()}\n"
+            )
+            totals["conversations"] += 1
+            totals["messages"] += count
+            pending += count
+
+            if pending >= COPY_BATCH_ROWS:
+                _copy(cursor, "conversations", CONVERSATION_COLUMNS, conversations)
+                _copy(cursor, "messages", MESSAGE_COLUMNS, messages)
+                raw.commit()
+                pending = 0
+                print(f"  📦 {totals['conversations']} conversas / {totals['messages']} mensagens")
+
+        _copy(cursor, "conversations", CONVERSATION_COLUMNS, conversations)
+        _copy(cursor, "messages", MESSAGE_COLUMNS, messages)
+        raw.commit()
+        cursor.execute("ANALYZE agents; ANALYZE conversations; ANALYZE messages")
+        raw.commit()
+    finally:
+        raw.close()
+
+    return {
+        "seed": args.seed,
+        "days": args.days,
+        "generated_at": now.isoformat(),
+        "totals": {**totals, "agents": len(agents)},
+        "duration": round(time.time() - started, 3),
+        "agents": [
+            {"id": str(agent_id), "slug": slug, "sessions": sessions[slug]}
+            for agent_id, slug in agents
+        ]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=50)
+    parser.add_argument("--conversations", type=int, default=20000)
+    parser.add_argument("--messages-per-conversation", type=float, default=12, help="Média (exponencial, mínimo 2)")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="Apaga o dataset bench-* anterior")
+    parser.add_argument("--manifest", default="benchmarks/results/dataset.json")
+    args = parser.parse_args()
+
+    manifest = generate(args)
+    os.makedirs(os.path.dirname(args.manifest) or ".", exist_ok=True)
+    with open(args.manifest, "w") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    print(json.dumps({**{k: v for k, v in manifest.items() if k != "agents"}, "manifest": args.manifest}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Micro-benchmark de serialização de respostas
+
+Compara, por resposta, o caminho padrão do FastAPI (validação do
+response_model + jsonable_encoder + json.dumps) com o caminho rápido
+(dicts direto do ORM + orjson) para:
+
+- lista de agentes (GET /api/agents)
+- resposta de chat (POST /api/chat)
+- histórico (GET /api/public/agents/{slug}/history/{session_id})
+
+Uso:
+    python -m benchmarks.serialization_bench [--agents 200] [--messages 50] [--output results.json]
+"""
+import argparse
+import json
+import os
+import timeit
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import List
+
+os.environ.setdefault("DATABASE_URL", "postgresql://bench@localhost/bench")
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.api.agents import AGENT_LIST_FIELDS, AgentResponse
+from app.api.conversations import ChatResponse
+from app.core.serialization import dumps, orjson, rows_to_dicts
+from app.models import AgentStatus, MessageRole
+
+def make_agents(n: int) -> list:
+    now = datetime.utcnow()
+    return [
+        SimpleNamespace(
+            id=uuid.uuid4(), slug=f"agente-{i}", name=f"Agente {i}",
+            description="Agente de benchmark " * 5, avatar_url=None,
+            system_prompt="Você é um assistente prestativo. " * 60,
+            model="gpt-4o-mini", temperature=0.7, max_tokens=1000, top_p=1.0,
+            frequency_penalty=0.0, presence_penalty=0.0, brand_color="#4F46E5",
+            welcome_message="Olá! Como posso ajudar?", input_placeholder="Digite sua mensagem...",
+            is_active=True, allow_public_access=True, rag_enabled=False,
+            whatsapp_enabled=False, email_enabled=False, status=AgentStatus.active,
+            created_at=now - timedelta(minutes=i), updated_at=now
+        )
+        for i in range(n)
+    ]
+
+def make_messages(n: int) -> list:
+    now = datetime.utcnow()
+    return [
+        SimpleNamespace(
+            id=uuid.uuid4(),
+            role=MessageRole.user if i % 2 == 0 else MessageRole.assistant,
+            content="Mensagem de histórico com algum conteúdo realista. " * 4,
+            created_at=now + timedelta(seconds=i)
+        )
+        for i in range(n)
+    ]
+
+def bench(fn, number: int) -> float:
+    """Tempo médio por chamada em microssegundos (melhor de 5)"""
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1_000_000
+
+def run(n_agents: int, n_messages: int, number: int) -> dict:
+    agents = make_agents(n_agents)
+    messages = make_messages(n_messages)
+    chat = {
+        "conversation_id": str(uuid.uuid4()),
+        "response": "Resposta do agente " * 20,
+        "tokens": 420, "cost": 0.000123, "processing_time": 1.23
+    }
+
+    agents_adapter = TypeAdapter(List[AgentResponse])
+
+    def agents_default():
+        models = agents_adapter.validate_python(agents, from_attributes=True)
+        return json.dumps(jsonable_encoder(models)).encode()
+
+    def agents_fast():
+        return dumps(rows_to_dicts(agents, AGENT_LIST_FIELDS))
+
+    def agents_projected_fast():
+        return dumps(rows_to_dicts(agents, ["id", "slug", "name", "is_active", "created_at"]))
+
+    def chat_default():
+        return json.dumps(jsonable_encoder(ChatResponse(**chat))).encode()
+
+    def chat_fast():
+        return dumps(chat)
+
+    def history_payload():
+        return {
+            "conversation_id": chat["conversation_id"],
+            "messages": [
+                {"role": m.role.value, "content": m.content, "created_at": m.created_at.isoformat()}
+                for m in messages
+            ]
+        }
+
+    def history_default():
+        return json.dumps(jsonable_encoder(history_payload())).encode()
+
+    def history_fast():
+        return dumps(history_payload())
+
+    cases = {
+        "agents_list": (agents_default, agents_fast),
+        "agents_list_projected": (agents_default, agents_projected_fast),
+        "chat_response": (chat_default, chat_fast),
+        "history": (history_default, history_fast),
+    }
+
+    results = {}
+    for name, (default_fn, fast_fn) in cases.items():
+        default_us = bench(default_fn, number)
+        fast_us = bench(fast_fn, number)
+        results[name] = {
+            "default_us": round(default_us, 2),
+            "fast_us": round(fast_us, 2),
+            "speedup": round(default_us / fast_us, 2)
+        }
+
+    return {
+        "benchmark": "serialization",
+        "orjson": orjson is not None,
+        "agents": n_agents,
+        "messages": n_messages,
+        "results": results
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--number", type=int, default=50)
+    parser.add_argument("--output", help="Arquivo JSON de saída (default: stdout)")
+    args = parser.parse_args()
+
+    report = run(args.agents, args.messages, args.number)
+    output = json.dumps(report, indent=2)
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(output + "\n")
+    print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark/verificação do loop de function calling (app.services.tools)
+
+Ferramentas locais falsas com latência conhecida e um modelo falso
+(StubOpenAIClient com tool_calls_per_turn) que pede todas na mesma rodada:
+
+1. sequencial vs. paralelo: o turno deve custar ~max(latência), não a soma
+2. cache: repetir a mesma pergunta não reexecuta ferramentas idempotentes
+3. timeout: ferramenta lenta vira {"error": "timeout..."} e o turno termina
+
+Uso:
+    python -m benchmarks.tools_bench [--turns 20] [--model-latency 0.05]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import List
+
+os.environ.setdefault("DATABASE_URL", "postgresql://bench@localhost/bench")
+
+from app.services import tools
+from app.services.llm_stub import StubOpenAIClient
+from app.services.tools import ToolRegistry
+
+TOOL_LATENCIES = {"lookup_order": 0.30, "search_docs": 0.50, "shipping_quote": 0.20}
+
+def build_registry(slow_timeout: float = None) -> ToolRegistry:
+    registry = ToolRegistry()
+
+    @registry.tool("lookup_order", "Status de um pedido.", idempotent=True)
+    async def lookup_order(query: str):
+        await asyncio.sleep(TOOL_LATENCIES["lookup_order"])
+        return {"order": query[:20], "status": "enviado"}
+
+    @registry.tool("search_docs", "Busca na base de conhecimento.", idempotent=True)
+    async def search_docs(query: str):
+        await asyncio.sleep(TOOL_LATENCIES["search_docs"])
+        return [{"doc": "prazos.md", "score": 0.92}]
+
+    @registry.tool("shipping_quote", "Cotação de frete (síncrona).")
+    def shipping_quote(query: str):
+        time.sleep(TOOL_LATENCIES["shipping_quote"])
+        return {"price": 19.9}
+
+    if slow_timeout is not None:
+        @registry.tool("slow_tool", "Nunca responde a tempo.", timeout=slow_timeout)
+        async def slow_tool(query: str):
+            await asyncio.sleep(30)
+
+    return registry
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))], 4)
+
+async def run_turns(registry: ToolRegistry, turns: int, parallel: bool, model_latency: float, unique: bool) -> dict:
+    client = StubOpenAIClient(latency=model_latency, tool_calls_per_turn=len(registry))
+    latencies, cached, statuses = [], 0, {}
+    for i in range(turns):
+        question = f"Onde está meu pedido {i if unique else 0}?"
+        start = time.perf_counter()
+        result = await tools.run_tool_loop(
+            [{"role": "system", "content": "Atendente."}, {"role": "user", "content": question}],
+            client=client, tool_registry=registry, parallel=parallel
+        )
+        latencies.append(time.perf_counter() - start)
+        for call in result["tools"]:
+            cached += call["cached"]
+            statuses[call["status"]] = statuses.get(call["status"], 0) + 1
+    return {
+        "parallel": parallel,
+        "turns": turns,
+        "model_calls": client.chat.completions.calls,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "cached_calls": cached,
+        "statuses": statuses
+    }
+
+async def main_async(args) -> dict:
+    overhead = 2 * args.model_latency
+    report = {
+        "tool_latencies": TOOL_LATENCIES,
+        "expected": {
+            "sequential": round(sum(TOOL_LATENCIES.values()) + overhead, 3),
+            "parallel": round(max(TOOL_LATENCIES.values()) + overhead, 3)
+        }
+    }
+
+    tools.result_cache.clear()
+    report["sequential"] = await run_turns(build_registry(), args.turns, False, args.model_latency, unique=True)
+    tools.result_cache.clear()
+    report["parallel"] = await run_turns(build_registry(), args.turns, True, args.model_latency, unique=True)
+    tools.result_cache.clear()
+    report["cached"] = await run_turns(build_registry(), args.turns, True, args.model_latency, unique=False)
+    tools.result_cache.clear()
+    report["timeout"] = await run_turns(build_registry(slow_timeout=0.2), 3, True, args.model_latency, unique=True)
+
+    report["speedup"] = round(report["sequential"]["p50"] / report["parallel"]["p50"], 2)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--model-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    print(json.dumps(report, indent=2))
+
+    slack = 0.15
+    ok = (
+        report["parallel"]["p50"] <= report["expected"]["parallel"] + slack
+        and report["sequential"]["p50"] >= report["expected"]["sequential"] - slack
+        and report["cached"]["cached_calls"] > 0
+        and report["timeout"]["statuses"].get("timeout") == 3
+    )
+    raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -7,7 +8,9 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+from app.core.pooling import engine_kwargs, migration_url
+
+engine = create_engine(DATABASE_URL, **engine_kwargs())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -18,6 +21,32 @@ def get_db():
     finally:
         db.close()
 
+def get_read_db():
+    """Leituras (listagens, analytics) em réplica quando configurada"""
+    from app.core.replicas import read_session
+    db = read_session(SessionLocal)
+    try:
+        yield db
+    finally:
+        db.close()
+
+def read_db_for(pin_key):
+    """get_read_db que fica no primário se pin_key(request) foi escrita há pouco"""
+    from fastapi import Request
+    from app.core.replicas import read_session
+
+    def dependency(request: Request):
+        db = read_session(SessionLocal, pin_key(request))
+        try:
+            yield db
+        finally:
+            db.close()
+
+    return dependency
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    # DDL por conexão direta (fora do PgBouncer quando MIGRATION_DATABASE_URL existe)
+    url = migration_url(DATABASE_URL)
+    ddl_engine = engine if url == DATABASE_URL else create_engine(url, poolclass=NullPool)
+    Base.metadata.create_all(bind=ddl_engine)
     print("✅ Database tables created WITH deleted_at column")
@@ -0,0 +1,130 @@
+"""
+Gunicorn - modo de produção multi-processo
+
+    gunicorn main:app -c gunicorn.conf.py
+
+- Workers uvicorn (UvicornWorker); quantidade = WEB_CONCURRENCY (default 1)
+  ou, com WEB_CONCURRENCY=auto, CPUs disponíveis ao processo (affinity +
+  cota do cgroup), limitado a WEB_MAX_WORKERS
+- preload_app: o app é importado uma vez no master e os workers nascem por
+  fork (páginas compartilhadas copy-on-write); pools de conexão herdados
+  são descartados em post_fork
+- Migrations rodam uma vez no master (on_starting), não em cada worker
+- SIGTERM: o master repassa aos workers, que param de aceitar conexões e
+  esperam as requisições em andamento (chamadas ao LLM, streams) por até
+  GRACEFUL_TIMEOUT segundos antes do shutdown da aplicação
+- Scheduler: jobs de manutenção e o poller de e-mail só no worker líder
+  (SCHEDULER_LOCK_FILE)
+- Métricas agregadas entre workers via METRICS_MULTIPROC_DIR
+
+Com mais de um worker, o estado em memória deixa de ser global:
+- Idempotency-Key e dedupe do WhatsApp: IDEMPOTENCY_DB_ENABLED é ligado
+  por default (tabela idempotency_keys); desligado à força = aviso
+- Ordem por remetente do WhatsApp vale só dentro de cada worker
+- Read-your-writes das réplicas é por worker: uma leitura logo após a
+  escrita pode ir a uma réplica com até REPLICA_MAX_LAG_SECONDS de atraso
+Por isso o default continua 1 worker; suba WEB_CONCURRENCY sabendo disso.
+
+Cada worker tem seu próprio pool no banco: conexões = workers x
+(DB_POOL_SIZE + DB_MAX_OVERFLOW). Com muitos workers, prefira
+DB_POOL_MODE=pgbouncer (app.core.pooling).
+"""
+import math
+import multiprocessing
+import os
+import shutil
+
+def available_cpus() -> int:
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = multiprocessing.cpu_count()
+    # Cota de CPU do container (cgroup v2): "max 100000" ou "200000 100000"
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+WEB_MAX_WORKERS = int(os.getenv("WEB_MAX_WORKERS", "8"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+
+WEB_CONCURRENCY = os.getenv("WEB_CONCURRENCY", "1")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = min(available_cpus(), WEB_MAX_WORKERS) if WEB_CONCURRENCY == "auto" else max(1, int(WEB_CONCURRENCY))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# Drenagem: maior que o timeout do LLM, para a resposta em andamento terminar
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", str(int(LLM_TIMEOUT) + 30)))
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+
+# Reciclagem opcional de workers (0 = desligado)
+max_requests = int(os.getenv("MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "0"))
+
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "*")
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+# Lidos no import do app (antes do fork): precisam estar no ambiente já aqui
+os.environ.setdefault("SCHEDULER_LOCK_FILE", "/tmp/agentes-scheduler.lock")
+os.environ.setdefault("METRICS_MULTIPROC_DIR", "/tmp/agentes-metrics")
+os.environ["MIGRATE_ON_STARTUP"] = "false"
+if workers > 1:
+    os.environ.setdefault("IDEMPOTENCY_DB_ENABLED", "true")
+
+def multi_worker_warnings():
+    """Garantias que dependem de memória local e não valem com vários workers"""
+    if workers == 1:
+        return []
+    warnings = []
+    if os.environ["IDEMPOTENCY_DB_ENABLED"].lower() != "true":
+        warnings.append("IDEMPOTENCY_DB_ENABLED=false: Idempotency-Key e dedupe do WhatsApp só por worker")
+    if os.getenv("REPLICA_DATABASE_URLS"):
+        warnings.append("réplicas configuradas: read-your-writes só vale dentro do mesmo worker")
+    if os.getenv("WHATSAPP_APP_SECRET"):
+        warnings.append("WhatsApp: ordem por remetente só dentro de cada worker")
+    return warnings
+
+def on_starting(server):
+    """Master, antes dos workers: limpa métricas da execução anterior e migra"""
+    directory = os.environ["METRICS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+    import database as legacy_database
+    from main import run_migrations
+    from app.core.database import dispose_engines
+
+    run_migrations()
+    dispose_engines()
+    legacy_database.engine.dispose()
+    server.log.info(f"🚀 {workers} worker(s), graceful_timeout={graceful_timeout}s")
+    for warning in multi_worker_warnings():
+        server.log.warning(f"⚠️ {warning}")
+
+def post_fork(server, worker):
+    """Worker recém-criado: nada de conexões herdadas do master"""
+    import database as legacy_database
+    from app.core.database import dispose_engines
+
+    dispose_engines(close=False)
+    legacy_database.engine.dispose(close=False)
+
+def worker_exit(server, worker):
+    server.log.info(f"👋 Worker {worker.pid} encerrado")
+
+def child_exit(server, worker):
+    """Master: totais do worker que saiu vão para o arquivo antes de o substituto nascer"""
+    from app.core import metrics
+
+    try:
+        metrics.archive_worker(worker.pid, os.environ["METRICS_MULTIPROC_DIR"])
+    except Exception as e:
+        server.log.warning(f"⚠️ Métricas do worker {worker.pid} não arquivadas: {e}")
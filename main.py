@@ -2,13 +2,44 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from database import init_db
 from routes import auth, agents, analytics
+from services.llm import close_client as close_legacy_llm_client
+from app.api import agent_bulk as agent_bulk_api
+from app.api import agent_conversations as agent_conversations_api
+from app.api import analytics as analytics_api
+from app.api import health as health_api
+from app.api import metrics as metrics_api
+from app.api import public as public_api
+from app.api import replay as replay_api
+from app.api import search as search_api
+from app.api import whatsapp as whatsapp_api
+from app.core import metrics
+from app.core.database import init_database
+from app.core.health import HEALTH_CHECK_INTERVAL, refresh_db_health
+from app.core.partitions import run_partition_maintenance
+from app.core.replicas import REPLICA_DATABASE_URLS, REPLICA_LAG_CHECK_INTERVAL, refresh_lag
+from app.core.serialization import FastJSONResponse
+from app.core.scheduler import register_job, run_as_leader, start_scheduler, stop_scheduler
+from app.services.llm_service import init_llm_client, close_llm_client
+from app.services.hedging import close_fallback_client
+from app.services.idempotency import IDEMPOTENCY_DB_ENABLED, purge_expired_keys
+from app.services.purge import PURGE_INTERVAL, run_purge
+from app.services.reaper import REAPER_INTERVAL, run_reaper
+from app.services.whatsapp_service import whatsapp_dispatcher
+from app.services.email_channel import EMAIL_POLLER_ENABLED, build_worker_from_env
 import os
 
-app = FastAPI(title="Agentes IA API", version="3.0.0-FIXED")
+app = FastAPI(
+    title="Agentes IA API",
+    version="3.0.0-FIXED",
+    default_response_class=FastJSONResponse
+)
 
 # CORS
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "https://agentes.genoibot.com,http://localhost:3000").split(",")
 
+# gunicorn.conf.py roda as migrations uma vez no master e desliga aqui
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "true").lower() == "true"
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=CORS_ORIGINS,
@@ -21,6 +52,20 @@ app.add_middleware(
 app.include_router(auth.router)
 app.include_router(agents.router)
 app.include_router(analytics.router)
+app.include_router(health_api.router, tags=["health"])
+app.include_router(metrics_api.router)
+app.include_router(public_api.router, prefix="/api/public", tags=["public"])
+app.include_router(whatsapp_api.router, prefix="/api", tags=["whatsapp"])
+app.include_router(replay_api.router, prefix="/api", tags=["replay"])
+app.include_router(analytics_api.router, prefix="/api", tags=["analytics"])
+app.include_router(agent_conversations_api.router, prefix="/api", tags=["conversations"])
+app.include_router(agent_bulk_api.router, prefix="/api", tags=["agents"])
+app.include_router(search_api.router, prefix="/api", tags=["search"])
+
+def run_migrations():
+    # Schema completo primeiro; o create_all legado só completa o que faltar
+    init_database()
+    init_db()
 
 @app.on_event("startup")
 async def startup():
@@ -30,10 +75,37 @@ async def startup():
     print(f"🔐 Admin: {os.getenv('ADMIN_USERNAME', 'admin')}")
     print(f"🌐 CORS: {', '.join(CORS_ORIGINS)}")
     print("=" * 80)
-    init_db()
+    if MIGRATE_ON_STARTUP:
+        run_migrations()
+    init_llm_client()
+    refresh_db_health()
+    register_job("db_health", HEALTH_CHECK_INTERVAL, refresh_db_health, initial_delay=0)
+    register_job("message_partitions", 6 * 60 * 60, run_partition_maintenance, initial_delay=60, leader_only=True)
+    register_job("purge", PURGE_INTERVAL, run_purge, initial_delay=600, leader_only=True)
+    register_job("conversation_reaper", REAPER_INTERVAL, run_reaper, initial_delay=120, leader_only=True)
+    if IDEMPOTENCY_DB_ENABLED:
+        register_job("idempotency_purge", 60 * 60, purge_expired_keys, initial_delay=300, leader_only=True)
+    if REPLICA_DATABASE_URLS:
+        register_job("replica_lag", REPLICA_LAG_CHECK_INTERVAL, refresh_lag, initial_delay=0)
+    if metrics.METRICS_MULTIPROC_DIR:
+        register_job("metrics_flush", metrics.METRICS_FLUSH_INTERVAL, metrics.write_snapshot, initial_delay=0)
+    start_scheduler()
+    await whatsapp_dispatcher.start()
+    if EMAIL_POLLER_ENABLED:
+        # Uma caixa, um poller: com vários workers, só o líder faz polling
+        app.state.email_worker = build_worker_from_env()
+        run_as_leader("email_poller", app.state.email_worker.run_forever)
     print("✅ Ready! (with deleted_at column)")
     print("=" * 80)
 
-@app.get("/health")
-async def health():
-    return {"status": "ok", "version": "3.0.0-FIXED"}
+@app.on_event("shutdown")
+async def shutdown():
+    await whatsapp_dispatcher.stop()
+    await stop_scheduler()
+    if EMAIL_POLLER_ENABLED:
+        await app.state.email_worker.close()
+    await close_llm_client()
+    await close_fallback_client()
+    close_legacy_llm_client()
+    if metrics.METRICS_MULTIPROC_DIR:
+        metrics.write_snapshot()
@@ -1,13 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel, validator
 from datetime import datetime
 from slugify import slugify
 import sys
 sys.path.append('..')
-from database import get_db
+from database import get_db, read_db_for
 from models import Agent
+from app.core.http_cache import etag_json_response, public_agent_cache
+from app.core.replicas import mark_written
+from app.core.pagination import apply_keyset, decode_cursor, page_limit, parse_fields, split_page
 
 router = APIRouter(prefix="/api/agents", tags=["agents"])
 
@@ -46,14 +49,37 @@ class AgentCreate(BaseModel):
             return slugify(values['name'], separator='-', lowercase=True)
         return None
 
-@router.get("", response_model=List[AgentResponse])
-async def list_agents(db: Session = Depends(get_db)):
+AGENT_LIST_FIELDS = list(AgentResponse.model_fields)
+
+@router.get("", responses={200: {"model": List[AgentResponse]}})
+async def list_agents(
+    request: Request,
+    limit: Optional[int] = Query(default=None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(read_db_for(lambda request: "agents"))
+):
+    # Keyset por (created_at, id); próxima página em X-Next-Cursor.
+    # Sem limit/cursor devolve todos (clientes antigos não leem o header)
+    selected = parse_fields(fields, AGENT_LIST_FIELDS)
+    columns = list(dict.fromkeys(selected + ["id", "created_at"]))
+    
     # Filtra por deleted_at IS NULL
-    agents = db.query(Agent).filter(Agent.deleted_at.is_(None)).order_by(Agent.created_at.desc()).all()
-    return agents
+    query = db.query(*[getattr(Agent, name) for name in columns]).filter(Agent.deleted_at.is_(None))
+    limit = page_limit(limit, cursor)
+    rows = apply_keyset(query, Agent.created_at, Agent.id, decode_cursor(cursor), limit).all()
+    page, next_cursor = split_page(rows, limit)
+    
+    items = [{name: getattr(row, name) for name in selected} for row in page]
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    
+    return etag_json_response(request, items, headers)
 
 @router.get("/{agent_id}", response_model=AgentResponse)
-async def get_agent(agent_id: str, db: Session = Depends(get_db)):
+async def get_agent(
+    agent_id: str,
+    db: Session = Depends(read_db_for(lambda request: f"agent:{request.path_params['agent_id']}"))
+):
     agent = db.query(Agent).filter(Agent.id == agent_id, Agent.deleted_at.is_(None)).first()
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
@@ -70,6 +96,7 @@ async def create_agent(agent_data: AgentCreate, db: Session = Depends(get_db)):
     db.add(agent)
     db.commit()
     db.refresh(agent)
+    mark_written("agents", f"agent:{agent.id}", f"agent:{agent.slug}")
     return agent
 
 @router.put("/{agent_id}", response_model=AgentResponse)
@@ -91,6 +118,8 @@ async def update_agent(agent_id: str, agent_data: dict, db: Session = Depends(ge
             raise HTTPException(status_code=400, detail="Slug já existe. Escolha outro.")
         agent_data['slug'] = new_slug
     
+    previous_slug = agent.slug
+    
     # Atualizar campos
     for key, value in agent_data.items():
         if hasattr(agent, key):
@@ -98,6 +127,9 @@ async def update_agent(agent_id: str, agent_data: dict, db: Session = Depends(ge
     
     db.commit()
     db.refresh(agent)
+    public_agent_cache.invalidate_tag(previous_slug)
+    public_agent_cache.invalidate_tag(agent.slug)
+    mark_written("agents", f"agent:{agent.id}", f"agent:{previous_slug}", f"agent:{agent.slug}")
     return agent
 
 @router.delete("/{agent_id}")
@@ -108,4 +140,6 @@ async def delete_agent(agent_id: str, db: Session = Depends(get_db)):
     # Soft delete
     agent.deleted_at = datetime.utcnow()
     db.commit()
+    public_agent_cache.invalidate_tag(agent.slug)
+    mark_written("agents", f"agent:{agent.id}", f"agent:{agent.slug}")
     return {"message": "Agent deleted successfully"}
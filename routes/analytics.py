@@ -4,13 +4,13 @@ from sqlalchemy import func
 from datetime import datetime, timedelta
 import sys
 sys.path.append('..')
-from database import get_db
+from database import get_read_db
 from models import Agent
 
 router = APIRouter(prefix="/api/analytics", tags=["analytics"])
 
 @router.get("/overview")
-async def get_analytics_overview(period: str = "7d", db: Session = Depends(get_db)):
+async def get_analytics_overview(period: str = "7d", db: Session = Depends(get_read_db)):
     """
     Retorna métricas globais do sistema
     
@@ -71,7 +71,7 @@ async def get_analytics_overview(period: str = "7d", db: Session = Depends(get_d
     }
 
 @router.get("/agents/{agent_id}")
-async def get_agent_analytics(agent_id: str, period: str = "7d", db: Session = Depends(get_db)):
+async def get_agent_analytics(agent_id: str, period: str = "7d", db: Session = Depends(get_read_db)):
     """
     Métricas específicas de um agente
     """
@@ -1,40 +1,46 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, or_
 from uuid import UUID, uuid4
 from datetime import datetime
 import time
 
-from database import get_db
+from database import get_db, read_db_for
 from models import Agent, Conversation, Message
 from schemas import ChatRequest, ChatResponse
 from utils import normalize_slug
 from services.llm import LLMService
+from app.core.http_cache import (
+    PUBLIC_AGENT_CACHE_CONTROL, cached_body_response, dump_json,
+    public_agent_cache, strong_etag
+)
 
 router = APIRouter(prefix="/api/public", tags=["public"])
 
 @router.get("/agents/{slug}")
-async def get_public_agent(slug: str, db: Session = Depends(get_db)):
-    normalized = normalize_slug(slug)
+async def get_public_agent(
+    slug: str,
+    request: Request,
+    db: Session = Depends(read_db_for(lambda request: f"agent:{request.path_params['slug']}"))
+):
+    # Corpo pré-serializado por slug; sem query enquanto o cache vale
+    entry = public_agent_cache.get(("routes", slug))
+    if entry is not None:
+        return cached_body_response(request, entry, PUBLIC_AGENT_CACHE_CONTROL)
+    
+    # Uma única query: slug normalizado tem prioridade sobre o literal
+    normalized = normalize_slug(slug).lower()
     agent = db.query(Agent).filter(
-        func.lower(Agent.slug) == normalized.lower(),
+        or_(func.lower(Agent.slug) == normalized, Agent.slug == slug),
         Agent.is_active == True,
         Agent.allow_public_access == True,
         Agent.deleted_at.is_(None)
-    ).first()
-    
-    if not agent:
-        agent = db.query(Agent).filter(
-            Agent.slug == slug,
-            Agent.is_active == True,
-            Agent.allow_public_access == True,
-            Agent.deleted_at.is_(None)
-        ).first()
+    ).order_by((func.lower(Agent.slug) == normalized).desc()).first()
     
     if not agent:
         raise HTTPException(404, "Agent not found")
     
-    return {
+    body = dump_json({
         "id": str(agent.id),
         "slug": agent.slug,
         "name": agent.name,
@@ -44,7 +50,12 @@ async def get_public_agent(slug: str, db: Session = Depends(get_db)):
         "input_placeholder": agent.input_placeholder,
         "meta_title": agent.meta_title,
         "meta_description": agent.meta_description
-    }
+    })
+    entry = public_agent_cache.set(
+        ("routes", slug), body, strong_etag("routes", agent.id, agent.updated_at), tag=agent.slug
+    )
+    
+    return cached_body_response(request, entry, PUBLIC_AGENT_CACHE_CONTROL)
 
 @router.post("/agents/{slug}/chat", response_model=ChatResponse)
 async def public_chat(slug: str, chat: ChatRequest, db: Session = Depends(get_db)):
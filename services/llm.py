@@ -1,10 +1,36 @@
 import os
+import threading
+import httpx
 from openai import OpenAI
 from utils import calculate_token_cost
+from app.services.llm_service import http_client_options, track_connection
+
+# Cliente único por processo (pool HTTP com keep-alive reaproveitado)
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> OpenAI:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                http_client = httpx.Client(
+                    **http_client_options(),
+                    event_hooks={"response": [lambda r: track_connection(r, "legacy")]}
+                )
+                _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client)
+    return _client
+
+def close_client():
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
 
 class LLMService:
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = get_client()
     
     def generate(self, messages, model="gpt-4o-mini", temperature=0.7, max_tokens=1500):
         response = self.client.chat.completions.create(
@@ -0,0 +1,89 @@
+"""
+Canal de e-mail (app.services.email_channel): anti-loop e cabeçalhos da
+resposta, com handler e sender em memória.
+
+    python -m pytest -q tests/test_email_channel.py
+"""
+import asyncio
+import os
+
+os.environ.setdefault("DATABASE_URL", "postgresql://test@localhost/test")
+
+import pytest
+
+from app.services.email_channel import EmailChannelWorker, build_reply, parse_email
+
+AGENT = "vendas@loja.com"
+AGENTS = {AGENT: "agent-1", "suporte@loja.com": "agent-2"}
+
+def raw_email(sender="cliente@gmail.com", to=AGENT, **headers) -> bytes:
+    lines = [f"From: {sender}", f"To: {to}", "Subject: Pedido", "Message-ID: <m1@gmail.com>"]
+    lines += [f"{name.replace('_', '-')}: {value}" for name, value in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\nOnde está meu pedido?\r\n").encode()
+
+class MemorySender:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    async def close(self):
+        pass
+
+def run_worker(raw: bytes):
+    sender = MemorySender()
+    calls = []
+
+    async def handler(agent_id, inbound):
+        calls.append(agent_id)
+        return "Já verifiquei, chega amanhã."
+
+    worker = EmailChannelWorker(source=None, sender=sender, handler=handler, resolve_agents=lambda _: AGENTS)
+    result = asyncio.run(worker._process(parse_email(raw, "1"), AGENTS))
+    return result, calls, sender.sent
+
+def test_regular_email_gets_a_reply():
+    result, calls, sent = run_worker(raw_email())
+    assert result == "replied"
+    assert calls == ["agent-1"]
+    assert sent[0]["To"] == "cliente@gmail.com"
+
+@pytest.mark.parametrize("headers", [
+    {"Auto_Submitted": "auto-replied"},
+    {"Auto_Submitted": "auto-generated"},
+    {"Precedence": "bulk"},
+    {"Precedence": "junk"},
+    {"Precedence": "List"},
+    {"List_Id": "<clientes.loja.com>"},
+    {"Return_Path": "<>"},
+])
+def test_automated_headers_are_skipped(headers):
+    result, calls, sent = run_worker(raw_email(**headers))
+    assert result == "skipped"
+    assert calls == [] and sent == []
+
+@pytest.mark.parametrize("sender", [
+    "MAILER-DAEMON@mx.gmail.com",
+    "postmaster@loja.com",
+    "no-reply@banco.com",
+    "noreply@banco.com",
+    "do-not-reply@banco.com",
+    "suporte@loja.com",
+])
+def test_automated_and_own_senders_are_skipped(sender):
+    result, calls, sent = run_worker(raw_email(sender=sender))
+    assert result == "skipped"
+    assert calls == [] and sent == []
+
+def test_auto_submitted_no_is_answered():
+    result, _, _ = run_worker(raw_email(Auto_Submitted="no"))
+    assert result == "replied"
+
+def test_reply_is_marked_auto_replied():
+    inbound = parse_email(raw_email(), "1")
+    reply = build_reply(inbound, AGENT, "Oi")
+    assert reply["Auto-Submitted"] == "auto-replied"
+    assert reply["In-Reply-To"] == "<m1@gmail.com>"
+    # A resposta de um agente, se voltar à caixa, não é respondida de novo
+    assert parse_email(bytes(reply), "2").automated == "auto_submitted"
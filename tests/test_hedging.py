@@ -0,0 +1,174 @@
+"""
+Hedged requests (app.services.hedging) com dois clientes stub de latência
+controlada: um para a requisição original, outro para o hedge.
+
+    python -m pytest -q tests/test_hedging.py
+"""
+import asyncio
+import os
+from types import SimpleNamespace
+
+os.environ.setdefault("DATABASE_URL", "postgresql://test@localhost/test")
+
+import pytest
+
+from app.core import metrics
+from app.services import hedging, prompt_builder
+from app.services.conversation_service import ConversationService
+from app.services.hedging import HedgePolicy, LatencyTracker
+from app.services.llm_service import LLMService
+from app.services.llm_stub import StubCompletions, StubOpenAIClient
+
+MODEL = "gpt-4o-mini"
+FALLBACK_MODEL = "gpt-4o"
+THRESHOLD = 0.1
+MESSAGES = [{"role": "system", "content": "Atendente."}, {"role": "user", "content": "Onde está meu pedido?"}]
+
+class TrackedCompletions(StubCompletions):
+    """Stub que conta requisições canceladas (não-stream e stream)"""
+
+    def __init__(self, latency):
+        super().__init__(latency=latency)
+        self.cancelled = 0
+
+    async def create(self, **kwargs):
+        try:
+            return await super().create(**kwargs)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+    async def _stream(self, *args):
+        try:
+            async for chunk in super()._stream(*args):
+                yield chunk
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+def stub_client(latency):
+    client = StubOpenAIClient(latency=latency)
+    client.chat.completions = TrackedCompletions(latency)
+    return client
+
+@pytest.fixture(autouse=True)
+def warm_tracker(monkeypatch):
+    """Janela já cheia: o percentil de resposta e de 1º token fica em THRESHOLD"""
+    monkeypatch.setattr(hedging, "HEDGE_MIN_DELAY", 0.01)
+    monkeypatch.setattr(hedging, "HEDGE_MAX_RATIO", 1.0)
+    tracker = LatencyTracker()
+    for _ in range(hedging.HEDGE_MIN_SAMPLES):
+        tracker.record("response", MODEL, THRESHOLD)
+        tracker.record("first_token", MODEL, THRESHOLD)
+    monkeypatch.setattr(hedging, "tracker", tracker)
+    return tracker
+
+def hedge_cost(model):
+    series = metrics.snapshot()["counters"].get("llm_hedge_cost_usd_total", [])
+    return sum(s["value"] for s in series if s["labels"] == {"model": model})
+
+def generate(primary, fallback, policy=HedgePolicy(fallback_model=FALLBACK_MODEL)):
+    return asyncio.run(hedging.generate_response(
+        MESSAGES, MODEL, policy=policy, client=primary, fallback_client=fallback
+    ))
+
+async def collect(stream):
+    return [event async for event in stream]
+
+def stream(primary, fallback, policy=HedgePolicy(fallback_model=FALLBACK_MODEL)):
+    return asyncio.run(collect(hedging.stream_response(
+        MESSAGES, MODEL, policy=policy, client=primary, fallback_client=fallback
+    )))
+
+def test_no_hedge_below_threshold():
+    primary, fallback = stub_client(0.01), stub_client(0.01)
+
+    result = generate(primary, fallback)
+
+    assert "hedge" not in result
+    assert result["model"] == MODEL
+    assert fallback.chat.completions.calls == 0
+
+def test_no_hedge_without_policy():
+    primary, fallback = stub_client(0.3), stub_client(0.01)
+
+    result = generate(primary, fallback, policy=None)
+
+    assert "hedge" not in result
+    assert fallback.chat.completions.calls == 0
+
+def test_hedge_wins_and_slow_original_is_cancelled():
+    primary, fallback = stub_client(1.0), stub_client(0.01)
+    cost_before = hedge_cost(MODEL)
+
+    result = generate(primary, fallback)
+
+    assert result["model"] == FALLBACK_MODEL
+    assert result["hedge"]["winner"] == "hedge"
+    assert result["hedge"]["discarded_model"] == MODEL
+    assert primary.chat.completions.cancelled == 1
+    # A original descartada é estimada pelo prompt (sem tokens de saída)
+    expected = LLMService.calculate_cost(MODEL, result["input_tokens"], 0)
+    assert result["hedge"]["discarded_cost"] == expected
+    assert hedge_cost(MODEL) == pytest.approx(cost_before + expected)
+
+def test_original_wins_when_hedge_is_slower():
+    primary, fallback = stub_client(0.15), stub_client(1.0)
+    cost_before = hedge_cost(FALLBACK_MODEL)
+
+    result = generate(primary, fallback)
+
+    assert result["model"] == MODEL
+    assert result["hedge"]["winner"] == "primary"
+    assert result["hedge"]["discarded_model"] == FALLBACK_MODEL
+    assert fallback.chat.completions.cancelled == 1
+    assert hedge_cost(FALLBACK_MODEL) == pytest.approx(cost_before + result["hedge"]["discarded_cost"])
+
+def test_hedge_cost_is_saved_in_extra_data(monkeypatch):
+    saved = {}
+    monkeypatch.setattr(prompt_builder, "record_usage", lambda agent_id, response: None)
+    monkeypatch.setattr(ConversationService, "add_message", staticmethod(lambda db, cid, role, content, **fields: saved.update(fields)))
+
+    result = generate(stub_client(1.0), stub_client(0.01))
+    ConversationService.save_assistant_message(None, "conv-1", result, SimpleNamespace(hash="h"), "agent-1")
+
+    assert saved["extra_data"]["hedge"] == result["hedge"]
+    assert saved["cost"] == result["cost"]
+
+def test_stream_no_hedge_below_threshold():
+    primary, fallback = stub_client(0.01), stub_client(0.01)
+
+    events = stream(primary, fallback)
+
+    assert events[-1]["type"] == "done"
+    assert "hedge" not in events[-1]
+    assert fallback.chat.completions.calls == 0
+
+def test_stream_hedge_wins_first_token_and_original_is_cancelled():
+    primary, fallback = stub_client(1.0), stub_client(0.01)
+    cost_before = hedge_cost(MODEL)
+
+    events = stream(primary, fallback)
+    done = events[-1]
+
+    assert done["type"] == "done"
+    assert done["model"] == FALLBACK_MODEL
+    assert done["content"].startswith(f"[stub:{FALLBACK_MODEL}]")
+    assert "".join(e["content"] for e in events if e["type"] == "delta") == done["content"]
+    assert done["hedge"]["winner"] == "hedge"
+    assert done["hedge"]["discarded_model"] == MODEL
+    assert primary.chat.completions.cancelled == 1
+    expected = LLMService.calculate_cost(MODEL, done["input_tokens"], 0)
+    assert done["hedge"]["discarded_cost"] == expected
+    assert hedge_cost(MODEL) == pytest.approx(cost_before + expected)
+
+def test_stream_original_wins_when_hedge_is_slower():
+    primary, fallback = stub_client(0.15), stub_client(1.0)
+
+    events = stream(primary, fallback)
+    done = events[-1]
+
+    assert done["model"] == MODEL
+    assert done["hedge"]["winner"] == "primary"
+    assert done["hedge"]["discarded_model"] == FALLBACK_MODEL
+    assert fallback.chat.completions.cancelled == 1
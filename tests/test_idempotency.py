@@ -0,0 +1,246 @@
+"""
+Idempotency-Key (app.services.idempotency): duplicatas concorrentes,
+conflito de corpo, liberação em erro, cancelamento, LRU e a reserva entre
+réplicas com uma tabela idempotency_keys em memória.
+
+    python -m pytest -q tests/test_idempotency.py
+"""
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("DATABASE_URL", "postgresql://test@localhost/test")
+
+import pytest
+
+from app.services import idempotency
+from app.services.idempotency import (
+    IdempotencyConflict, IdempotencyInProgress, IdempotencyStore, StoredResponse, fingerprint
+)
+
+OK = StoredResponse(200, b'{"response": "oi"}')
+
+def counting_handler(response=OK, delay=0.05):
+    calls = []
+
+    async def handler():
+        calls.append(time.monotonic())
+        await asyncio.sleep(delay)
+        if isinstance(response, BaseException):
+            raise response
+        return response
+
+    return handler, calls
+
+def test_concurrent_duplicate_waits_and_gets_replay():
+    store = IdempotencyStore()
+    handler, calls = counting_handler(delay=0.1)
+
+    async def scenario():
+        return await asyncio.gather(
+            store.execute("k1", "fp", handler),
+            store.execute("k1", "fp", handler)
+        )
+
+    (first, first_replayed), (second, second_replayed) = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert first == second == OK
+    assert (first_replayed, second_replayed) == (False, True)
+
+def test_later_duplicate_is_replayed_from_memory():
+    store = IdempotencyStore()
+    handler, calls = counting_handler()
+
+    async def scenario():
+        await store.execute("k1", "fp", handler)
+        return await store.execute("k1", "fp", handler)
+
+    response, replayed = asyncio.run(scenario())
+    assert replayed and response == OK
+    assert len(calls) == 1
+
+def test_same_key_with_other_body_conflicts():
+    store = IdempotencyStore()
+    handler, _ = counting_handler()
+
+    asyncio.run(store.execute("k1", fingerprint("a", "oi"), handler))
+    with pytest.raises(IdempotencyConflict):
+        asyncio.run(store.execute("k1", fingerprint("a", "tchau"), handler))
+
+def test_5xx_releases_key():
+    store = IdempotencyStore()
+    handler, calls = counting_handler(StoredResponse(502, b"{}"))
+
+    asyncio.run(store.execute("k1", "fp", handler))
+    response, replayed = asyncio.run(store.execute("k1", "fp", handler))
+    assert not replayed
+    assert len(calls) == 2
+    assert len(store) == 0
+
+def test_exception_releases_key_and_reaches_waiters():
+    store = IdempotencyStore()
+    handler, calls = counting_handler(RuntimeError("LLM fora"))
+
+    async def scenario():
+        return await asyncio.gather(
+            store.execute("k1", "fp", handler),
+            store.execute("k1", "fp", handler),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert len(calls) == 1
+    assert len(store) == 0
+
+    ok_handler, ok_calls = counting_handler()
+    assert asyncio.run(store.execute("k1", "fp", ok_handler)) == (OK, False)
+    assert len(ok_calls) == 1
+
+def test_waiter_takes_over_when_original_is_cancelled():
+    store = IdempotencyStore()
+    handler, calls = counting_handler(delay=0.1)
+
+    async def scenario():
+        original = asyncio.create_task(store.execute("k1", "fp", handler))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(store.execute("k1", "fp", handler))
+        await asyncio.sleep(0.01)
+        original.cancel()
+        return await waiter, original.cancelled()
+
+    (response, replayed), cancelled = asyncio.run(scenario())
+    assert cancelled
+    assert response == OK and not replayed
+    assert len(calls) == 2
+
+def test_waiter_gives_up_after_wait_seconds():
+    store = IdempotencyStore(wait_seconds=0.05)
+    handler, _ = counting_handler(delay=0.3)
+
+    async def scenario():
+        original = asyncio.create_task(store.execute("k1", "fp", handler))
+        await asyncio.sleep(0.01)
+        with pytest.raises(IdempotencyInProgress):
+            await store.execute("k1", "fp", handler)
+        return await original
+
+    assert asyncio.run(scenario()) == (OK, False)
+
+def test_lru_cap_evicts_oldest_keys():
+    store = IdempotencyStore(max_keys=3)
+    handler, calls = counting_handler(delay=0)
+
+    async def scenario():
+        for key in ("k1", "k2", "k3"):
+            await store.execute(key, "fp", handler)
+        await store.execute("k1", "fp", handler)  # replay: k1 vira o mais recente
+        await store.execute("k4", "fp", handler)  # expulsa k2
+
+    asyncio.run(scenario())
+    assert len(store) == 3
+    assert list(store._entries) == ["k3", "k1", "k4"]
+    assert len(calls) == 4
+
+def test_expired_key_executes_again():
+    store = IdempotencyStore(ttl=0.05)
+    handler, calls = counting_handler(delay=0)
+
+    asyncio.run(store.execute("k1", "fp", handler))
+    time.sleep(0.06)
+    assert asyncio.run(store.execute("k1", "fp", handler)) == (OK, False)
+    assert len(calls) == 2
+
+class FakeTable:
+    """idempotency_keys em memória, compartilhada pelas réplicas do teste"""
+
+    def __init__(self):
+        self.rows = {}
+
+    def session(self):
+        return FakeSession(self)
+
+class FakeSession:
+    def __init__(self, table):
+        self.table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def commit(self):
+        pass
+
+    def execute(self, statement, params):
+        sql = str(statement)
+        rows = self.table.rows
+        key = params["key"]
+        if sql.lstrip().startswith("INSERT"):
+            if key in rows:
+                return SimpleNamespace(scalar=lambda: None)
+            rows[key] = SimpleNamespace(fingerprint=params["fingerprint"], status_code=None, response=None)
+            return SimpleNamespace(scalar=lambda: key)
+        if sql.lstrip().startswith("SELECT"):
+            return SimpleNamespace(first=lambda: rows.get(key))
+        if sql.lstrip().startswith("UPDATE"):
+            rows[key].status_code = params["status_code"]
+            rows[key].response = params["response"]
+        elif sql.lstrip().startswith("DELETE") and rows.get(key) and rows[key].status_code is None:
+            del rows[key]
+        return SimpleNamespace()
+
+@pytest.fixture
+def table(monkeypatch):
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_POLL_INTERVAL", 0.01)
+    return FakeTable()
+
+def test_other_replica_waits_for_the_stored_response(table):
+    replica_a = IdempotencyStore(session_factory=table.session)
+    replica_b = IdempotencyStore(session_factory=table.session)
+    handler, calls = counting_handler(delay=0.1)
+
+    async def scenario():
+        return await asyncio.gather(
+            replica_a.execute("k1", "fp", handler),
+            replica_b.execute("k1", "fp", handler)
+        )
+
+    (first, first_replayed), (second, second_replayed) = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert first == second == OK
+    # Qualquer uma das réplicas pode ganhar o INSERT; a outra recebe o replay
+    assert sorted([first_replayed, second_replayed]) == [False, True]
+    assert table.rows["k1"].status_code == 200
+
+def test_other_replica_with_other_body_conflicts(table):
+    replica_a = IdempotencyStore(session_factory=table.session)
+    replica_b = IdempotencyStore(session_factory=table.session)
+    handler, _ = counting_handler(delay=0)
+
+    asyncio.run(replica_a.execute("k1", "fp-a", handler))
+    with pytest.raises(IdempotencyConflict):
+        asyncio.run(replica_b.execute("k1", "fp-b", handler))
+
+def test_failed_request_releases_the_row(table):
+    replica_a = IdempotencyStore(session_factory=table.session)
+    replica_b = IdempotencyStore(session_factory=table.session)
+    failing, _ = counting_handler(RuntimeError("LLM fora"), delay=0)
+    handler, calls = counting_handler(delay=0)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(replica_a.execute("k1", "fp", failing))
+    assert "k1" not in table.rows
+
+    assert asyncio.run(replica_b.execute("k1", "fp", handler)) == (OK, False)
+    assert len(calls) == 1
+
+def test_claim_or_wait_times_out_while_owner_is_running(table):
+    table.rows["k1"] = SimpleNamespace(fingerprint="fp", status_code=None, response=None)
+    store = IdempotencyStore(wait_seconds=0.05, session_factory=table.session)
+
+    assert asyncio.run(store._claim_or_wait("k2", "fp")) is None
+    with pytest.raises(IdempotencyInProgress):
+        asyncio.run(store._claim_or_wait("k1", "fp"))
@@ -0,0 +1,85 @@
+"""
+Métricas entre workers (app.core.metrics): snapshots por worker, arquivo
+dos workers que saíram e PID reaproveitado.
+
+    python -m pytest -q tests/test_metrics.py
+"""
+import json
+import os
+
+os.environ.setdefault("DATABASE_URL", "postgresql://test@localhost/test")
+
+from app.core import metrics
+
+def write_worker(directory, pid, requests, gauge=1.0, seconds=0.2):
+    data = metrics._as_snapshot(
+        {"http_requests_total": {metrics._key({"status": "200"}): requests}},
+        {"db_pool_checked_out": {(): gauge}},
+        {"llm_request_seconds": {(): [1.0, seconds] + [0.0, 0.0, 1.0] + [0.0] * 7}}
+    )
+    with open(os.path.join(directory, f"worker-{pid}.json"), "w") as f:
+        json.dump(data, f)
+
+def counter(data, name):
+    return sum(item["value"] for item in data["counters"].get(name, []))
+
+def test_aggregate_sums_workers_and_keeps_live_gauges(tmp_path):
+    write_worker(tmp_path, os.getpid(), 5)
+    write_worker(tmp_path, 999999999, 7)  # PID que não existe
+
+    data = metrics.aggregate(str(tmp_path))
+
+    assert counter(data, "http_requests_total") == 12
+    assert data["gauges"]["db_pool_checked_out"] == [{"labels": {"worker": str(os.getpid())}, "value": 1.0}]
+    assert data["histograms"]["llm_request_seconds"][0]["count"] == 2
+
+def test_archived_worker_totals_survive_pid_reuse(tmp_path):
+    pid = os.getpid()
+    write_worker(tmp_path, pid, 100)
+    metrics.archive_worker(pid, str(tmp_path))
+    assert not (tmp_path / f"worker-{pid}.json").exists()
+
+    # Worker novo com o mesmo PID começa do zero: o total não regride
+    write_worker(tmp_path, pid, 3)
+    data = metrics.aggregate(str(tmp_path))
+    assert counter(data, "http_requests_total") == 103
+    assert data["histograms"]["llm_request_seconds"][0]["count"] == 2
+    assert data["histograms"]["llm_request_seconds"][0]["sum"] == 0.4
+
+    metrics.archive_worker(pid, str(tmp_path))
+    data = metrics.aggregate(str(tmp_path))
+    assert counter(data, "http_requests_total") == 103
+    assert data["gauges"] == {}
+
+def test_archive_without_snapshot_is_a_no_op(tmp_path):
+    metrics.archive_worker(12345, str(tmp_path))
+    assert os.listdir(tmp_path) == []
+
+def metrics_client(monkeypatch, token):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.api import metrics as metrics_api
+
+    monkeypatch.setattr(metrics_api, "METRICS_TOKEN", token)
+    app = FastAPI()
+    app.include_router(metrics_api.router)
+    return TestClient(app)
+
+def test_metrics_endpoint_is_closed_without_configured_token(monkeypatch):
+    client = metrics_client(monkeypatch, None)
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer qualquer"}).status_code == 403
+
+def test_metrics_endpoint_requires_bearer_token(monkeypatch):
+    client = metrics_client(monkeypatch, "s3cr3t")
+    metrics.inc("http_requests_total", status="200")
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer errado"}).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Basic s3cr3t"}).status_code == 401
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer s3cr3t"})
+    assert response.status_code == 200
+    assert "http_requests_total" in response.text
+    assert client.get("/metrics?format=json", headers={"Authorization": "bearer s3cr3t"}).json()["counters"]
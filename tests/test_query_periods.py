@@ -0,0 +1,76 @@
+"""
+Período [start, end) dos endpoints de consulta (app.core.periods): datas com
+e sem fuso na query string, com um banco falso que só registra os parâmetros.
+
+    python -m pytest -q tests/test_query_periods.py
+"""
+import os
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("DATABASE_URL", "postgresql://test@localhost/test")
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import analytics, search
+from app.core.database import get_read_db
+
+class RecordingSession:
+    def __init__(self):
+        self.params = []
+
+    def execute(self, statement, params=None):
+        self.params.append(params)
+        return self
+
+    def fetchall(self):
+        return []
+
+@pytest.fixture
+def session():
+    return RecordingSession()
+
+@pytest.fixture
+def client(session):
+    app = FastAPI()
+    app.include_router(search.router, prefix="/api")
+    app.include_router(analytics.router, prefix="/api")
+    app.dependency_overrides[get_read_db] = lambda: session
+    return TestClient(app)
+
+def search_messages(client, **params):
+    return client.get("/api/search/messages", params={"q": "pedido", **params})
+
+def test_search_accepts_aware_start_without_end(client, session):
+    start = datetime.now(timezone(timedelta(hours=-3))).replace(microsecond=0) - timedelta(days=1)
+    response = search_messages(client, start=start.isoformat())
+    assert response.status_code == 200
+    assert session.params[0]["start"] == start.astimezone(timezone.utc).replace(tzinfo=None)
+    assert session.params[0]["end"].tzinfo is None
+
+def test_search_accepts_mixed_naive_and_aware_pair(client, session):
+    response = search_messages(client, start="2024-05-01T00:00:00", end="2024-05-02T00:00:00Z")
+    assert response.status_code == 200
+    assert response.json()["end"] == "2024-05-02T00:00:00"
+    assert session.params[0]["end"] == datetime(2024, 5, 2)
+
+def test_search_compares_aware_values_in_utc(client):
+    # 22:00 em -03:00 é 01:00 UTC do dia seguinte, depois do end
+    response = search_messages(client, start="2024-05-01T22:00:00-03:00", end="2024-05-02T00:30:00Z")
+    assert response.status_code == 400
+
+def test_search_rejects_period_longer_than_limit(client):
+    response = search_messages(client, start="2023-01-01T00:00:00Z", end="2024-05-01T00:00:00Z")
+    assert response.status_code == 400
+
+def test_usage_accepts_aware_and_naive_values(client, session):
+    response = client.get("/api/analytics/usage", params={"start": "2024-05-01T00:00:00-03:00", "end": "2024-05-08T00:00:00"})
+    assert response.status_code == 200
+    assert response.json()["start"] == "2024-05-01T03:00:00"
+    assert session.params[0] == {"start": datetime(2024, 5, 1, 3), "end": datetime(2024, 5, 8)}
+
+def test_usage_with_aware_end_only_uses_days(client, session):
+    response = client.get("/api/analytics/usage", params={"end": "2024-05-08T12:00:00+02:00", "days": 2})
+    assert response.status_code == 200
+    assert session.params[0] == {"start": datetime(2024, 5, 6, 10), "end": datetime(2024, 5, 8, 10)}
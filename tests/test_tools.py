@@ -0,0 +1,163 @@
+"""
+Loop de function calling (app.services.tools) com ferramentas locais e o
+modelo falso do StubOpenAIClient (tool_calls_per_turn): nada de rede nem banco.
+
+    python -m pytest -q tests/test_tools.py
+"""
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "postgresql://test@localhost/test")
+
+import pytest
+
+from app.services import tools
+from app.services.llm_stub import StubCompletions, StubOpenAIClient
+from app.services.tools import ToolRegistry, ToolResultCache
+
+QUESTION = [{"role": "system", "content": "Atendente."}, {"role": "user", "content": "Onde está meu pedido 42?"}]
+
+class InsistentCompletions(StubCompletions):
+    """Modelo que pede ferramentas sempre que elas são oferecidas"""
+
+    def _tool_calls(self, messages, tools):
+        if not tools:
+            return None
+        return super()._tool_calls(messages[:-1] + [{"role": "user", "content": "de novo"}], tools)
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(tools, "result_cache", ToolResultCache())
+
+def run(coro):
+    return asyncio.run(coro)
+
+def counting_registry(delay: float = 0.05):
+    """Ferramentas que registram execuções e o pico de chamadas simultâneas"""
+    registry = ToolRegistry()
+    state = {"running": 0, "peak": 0, "calls": []}
+
+    def make(name):
+        async def tool(query: str):
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+            state["calls"].append(name)
+            await asyncio.sleep(delay)
+            state["running"] -= 1
+            return {"tool": name, "query": query}
+        return tool
+
+    for name in ("lookup_order", "search_docs", "shipping_quote"):
+        registry.tool(name, name, idempotent=True)(make(name))
+    return registry, state
+
+def test_tools_in_a_round_run_in_parallel():
+    registry, state = counting_registry(delay=0.2)
+    client = StubOpenAIClient(latency=0, tool_calls_per_turn=3)
+
+    start = time.perf_counter()
+    result = run(tools.run_tool_loop(QUESTION, client=client, tool_registry=registry))
+    elapsed = time.perf_counter() - start
+
+    assert state["peak"] == 3
+    assert elapsed < 0.5
+    assert [call["status"] for call in result["tools"]] == ["ok", "ok", "ok"]
+    assert result["content"].startswith("[stub:")
+    assert client.chat.completions.calls == 2
+
+def test_identical_calls_in_a_round_execute_once():
+    registry, state = counting_registry()
+    # 6 chamadas = cada uma das 3 ferramentas duas vezes, mesmos argumentos
+    client = StubOpenAIClient(latency=0, tool_calls_per_turn=6)
+
+    result = run(tools.run_tool_loop(QUESTION, client=client, tool_registry=registry))
+
+    assert sorted(state["calls"]) == ["lookup_order", "search_docs", "shipping_quote"]
+    assert len(result["tools"]) == 6
+    assert all(call["status"] == "ok" for call in result["tools"])
+
+def test_idempotent_results_are_cached_until_ttl(monkeypatch):
+    monkeypatch.setattr(tools, "result_cache", ToolResultCache(ttl=0.2))
+    registry, state = counting_registry(delay=0)
+    client = StubOpenAIClient(latency=0, tool_calls_per_turn=3)
+
+    first = run(tools.run_tool_loop(QUESTION, client=client, tool_registry=registry))
+    second = run(tools.run_tool_loop(QUESTION, client=client, tool_registry=registry))
+    assert [call["cached"] for call in first["tools"]] == [False] * 3
+    assert [call["cached"] for call in second["tools"]] == [True] * 3
+    assert len(state["calls"]) == 3
+
+    time.sleep(0.25)
+    third = run(tools.run_tool_loop(QUESTION, client=client, tool_registry=registry))
+    assert [call["cached"] for call in third["tools"]] == [False] * 3
+    assert len(state["calls"]) == 6
+
+def test_non_idempotent_tools_are_not_cached():
+    registry = ToolRegistry()
+    calls = []
+
+    @registry.tool("create_ticket", "Abre um chamado.")
+    def create_ticket(query: str):
+        calls.append(query)
+        return {"ticket": len(calls)}
+
+    client = StubOpenAIClient(latency=0, tool_calls_per_turn=1)
+    for _ in range(2):
+        result = run(tools.run_tool_loop(QUESTION, client=client, tool_registry=registry))
+        assert result["tools"][0]["cached"] is False
+    assert len(calls) == 2
+
+def test_timeout_becomes_error_result():
+    registry = ToolRegistry()
+
+    @registry.tool("slow_tool", "Nunca responde a tempo.", timeout=0.05)
+    async def slow_tool(query: str):
+        await asyncio.sleep(5)
+
+    client = StubOpenAIClient(latency=0, tool_calls_per_turn=1)
+    start = time.perf_counter()
+    result = run(tools.run_tool_loop(QUESTION, client=client, tool_registry=registry))
+
+    assert time.perf_counter() - start < 1
+    assert result["tools"][0]["status"] == "timeout"
+    assert "error" in json.loads(result["tools"][0]["preview"])
+    assert result["content"].startswith("[stub:")
+
+def test_tool_exception_and_unknown_tool_become_error_results():
+    registry = ToolRegistry()
+
+    @registry.tool("broken", "Sempre falha.")
+    def broken(query: str):
+        raise RuntimeError("falhou")
+
+    executed = run(tools.execute_tool_calls([
+        {"id": "a", "name": "broken", "arguments": "{}"},
+        {"id": "b", "name": "missing", "arguments": "{}"},
+        {"id": "c", "name": "broken", "arguments": "not json"},
+    ], registry))
+
+    assert [item["status"] for item in executed] == ["error"] * 3
+    assert [item["tool_call_id"] for item in executed] == ["a", "b", "c"]
+    assert all("error" in json.loads(item["content"]) for item in executed)
+
+def test_last_round_forces_text_answer():
+    registry, state = counting_registry(delay=0)
+    client = StubOpenAIClient(latency=0, tool_calls_per_turn=1)
+    client.chat.completions = InsistentCompletions(latency=0, tool_calls_per_turn=1)
+    offered = []
+    create = client.chat.completions.create
+
+    async def spy(**kwargs):
+        offered.append(bool(kwargs.get("tools")))
+        return await create(**kwargs)
+
+    client.chat.completions.create = spy
+
+    result = run(tools.run_tool_loop(QUESTION, client=client, tool_registry=registry, max_rounds=2))
+
+    assert offered == [True, True, False]
+    assert [call["round"] for call in result["tools"]] == [1, 2]
+    assert result["content"].startswith("[stub:")
+    assert not result.get("tool_calls")
@@ -0,0 +1,226 @@
+"""
+Canal WhatsApp (app.services.whatsapp_service): assinatura do webhook, fila
+por remetente, dedupe e drenagem no shutdown, com um cliente de saída falso
+no lugar da Cloud API.
+
+    python -m pytest -q tests/test_whatsapp_service.py
+"""
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "postgresql://test@localhost/test")
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import whatsapp as whatsapp_api
+from app.core import database
+from app.services import whatsapp_service
+from app.services.conversation_service import ConversationService
+from app.services.whatsapp_service import InboundMessage, QueueFullError, WhatsAppDispatcher, sign_body
+
+SECRET = "segredo-do-app"
+
+class StubClient:
+    """Cliente de saída que só registra os envios"""
+
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+
+    async def send_text(self, phone_number_id, to, text, access_token=None):
+        self.sent.append((to, text))
+
+    async def close(self):
+        self.closed = True
+
+class RecordingDispatcher(WhatsAppDispatcher):
+    """handle falso: `delay` por mensagem, registra ordem e pico por remetente"""
+
+    def __init__(self, delay=0.05, **kwargs):
+        super().__init__(client=StubClient(), **kwargs)
+        self.delay = delay
+        self.handled = []
+        self.running = {}
+        self.peak = {}
+
+    async def handle(self, message):
+        sender = message.sender
+        self.running[sender] = self.running.get(sender, 0) + 1
+        self.peak[sender] = max(self.peak.get(sender, 0), self.running[sender])
+        await asyncio.sleep(self.delay)
+        self.running[sender] -= 1
+        self.handled.append(message.message_id)
+        await self.client.send_text(message.phone_number_id, sender, f"resposta {message.message_id}")
+
+def inbound(message_id, sender="5511999990001", text="oi"):
+    return InboundMessage(message_id, "pn-1", "+55 11 4000-0000", sender, text, time.time())
+
+def webhook_payload(*messages):
+    return {"entry": [{"changes": [{"value": {
+        "metadata": {"phone_number_id": "pn-1", "display_phone_number": "551140000000"},
+        "messages": [
+            {"id": m.message_id, "from": m.sender, "type": "text", "text": {"body": m.text}}
+            for m in messages
+        ]
+    }}]}]}
+
+@pytest.fixture
+def webhook(monkeypatch):
+    monkeypatch.setattr(whatsapp_service, "WHATSAPP_APP_SECRET", SECRET)
+    dispatcher = WhatsAppDispatcher(queue_size=2, client=StubClient())
+    dispatcher._ready = asyncio.Queue()
+    monkeypatch.setattr(whatsapp_api, "whatsapp_dispatcher", dispatcher)
+    app = FastAPI()
+    app.include_router(whatsapp_api.router)
+    return TestClient(app), dispatcher
+
+def post_webhook(client, body: bytes, signature):
+    headers = {"Content-Type": "application/json"}
+    if signature:
+        headers["X-Hub-Signature-256"] = signature
+    return client.post("/webhooks/whatsapp", content=body, headers=headers)
+
+def test_webhook_rejects_missing_or_wrong_signature(webhook):
+    client, dispatcher = webhook
+    body = json.dumps(webhook_payload(inbound("m1"))).encode()
+
+    assert post_webhook(client, body, None).status_code == 401
+    assert post_webhook(client, body, sign_body(body, "outro-segredo")).status_code == 401
+    assert post_webhook(client, body + b" ", sign_body(body, SECRET)).status_code == 401
+    assert dispatcher.depth == 0
+
+def test_webhook_accepts_valid_signature_and_dedupes(webhook):
+    client, dispatcher = webhook
+    body = json.dumps(webhook_payload(inbound("m1"), inbound("m1"))).encode()
+
+    response = post_webhook(client, body, sign_body(body, SECRET))
+    assert response.status_code == 200
+    assert response.json() == {"status": "accepted", "queued": 1, "duplicates": 1}
+
+    retry = post_webhook(client, body, sign_body(body, SECRET))
+    assert retry.json()["queued"] == 0
+    assert dispatcher.depth == 1
+
+def test_webhook_returns_503_when_queue_is_full(webhook):
+    client, dispatcher = webhook
+    body = json.dumps(webhook_payload(inbound("m1"), inbound("m2"), inbound("m3"))).encode()
+
+    response = post_webhook(client, body, sign_body(body, SECRET))
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "30"
+    assert dispatcher.depth == 0
+
+def test_enqueue_overflow_keeps_what_is_already_queued():
+    async def scenario():
+        dispatcher = RecordingDispatcher(queue_size=3, workers=1)
+        await dispatcher.start()
+        dispatcher.enqueue([inbound("m1"), inbound("m2")])
+        with pytest.raises(QueueFullError):
+            dispatcher.enqueue([inbound("m3"), inbound("m4")])
+        # Nada do lote rejeitado foi marcado como visto: o retry do provedor entra
+        await dispatcher.stop()
+        return dispatcher
+
+    dispatcher = asyncio.run(scenario())
+    assert dispatcher.handled == ["m1", "m2"]
+    assert "m3" not in dispatcher._seen
+
+def test_messages_from_one_sender_are_processed_in_order():
+    async def scenario():
+        dispatcher = RecordingDispatcher(delay=0.01, workers=4)
+        await dispatcher.start()
+        for i in range(10):
+            dispatcher.enqueue([inbound(f"a{i}", sender="A")])
+        await dispatcher.stop()
+        return dispatcher
+
+    dispatcher = asyncio.run(scenario())
+    assert dispatcher.handled == [f"a{i}" for i in range(10)]
+    assert dispatcher.peak["A"] == 1
+    assert [text for _, text in dispatcher.client.sent] == [f"resposta a{i}" for i in range(10)]
+
+def test_burst_from_one_sender_does_not_hold_every_worker():
+    async def scenario():
+        dispatcher = RecordingDispatcher(delay=0.1, workers=2)
+        await dispatcher.start()
+        dispatcher.enqueue([inbound(f"a{i}", sender="A") for i in range(10)])
+        dispatcher.enqueue([inbound(f"{s}0", sender=s) for s in "BCD"])
+        started = time.perf_counter()
+        while not all(f"{s}0" in dispatcher.handled for s in "BCD"):
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        await dispatcher.stop()
+        return dispatcher, elapsed
+
+    dispatcher, elapsed = asyncio.run(scenario())
+    # A ocupa um worker; B, C e D dividem o outro (~0.3s), sem esperar a rajada de 1s
+    assert elapsed < 0.6
+    assert dispatcher.peak["A"] == 1
+    assert len(dispatcher.handled) == 13
+
+def test_stop_drains_in_flight_and_queued_messages():
+    async def scenario():
+        dispatcher = RecordingDispatcher(delay=0.05, workers=2)
+        await dispatcher.start()
+        dispatcher.enqueue([inbound(f"{s}{i}", sender=s) for s in "AB" for i in range(3)])
+        await asyncio.sleep(0.01)  # dois em processamento
+        await dispatcher.stop(drain_timeout=5)
+        return dispatcher
+
+    dispatcher = asyncio.run(scenario())
+    assert sorted(dispatcher.handled) == ["A0", "A1", "A2", "B0", "B1", "B2"]
+    assert dispatcher.depth == 0
+    assert dispatcher.client.closed
+
+def test_stop_gives_up_after_drain_timeout():
+    async def scenario():
+        dispatcher = RecordingDispatcher(delay=1, workers=1)
+        await dispatcher.start()
+        dispatcher.enqueue([inbound(f"a{i}", sender="A") for i in range(3)])
+        started = time.perf_counter()
+        await dispatcher.stop(drain_timeout=0.1)
+        return dispatcher, time.perf_counter() - started
+
+    dispatcher, elapsed = asyncio.run(scenario())
+    assert elapsed < 0.5
+    assert dispatcher.handled == []
+
+class FakeSession:
+    def close(self):
+        pass
+
+def test_handle_skips_message_already_claimed_by_another_worker(monkeypatch):
+    """Retry que cai em outro worker: claim_event na tabela compartilhada barra a 2ª resposta"""
+    claimed = set()
+    turns = []
+
+    def claim_event(db, key, ttl=None):
+        if key in claimed:
+            return False
+        claimed.add(key)
+        return True
+
+    async def process_message(**kwargs):
+        turns.append(kwargs["user_message"])
+        return {"response": "Seu pedido chega amanhã."}
+
+    monkeypatch.setattr(whatsapp_service, "IDEMPOTENCY_DB_ENABLED", True)
+    monkeypatch.setattr(whatsapp_service, "claim_event", claim_event)
+    monkeypatch.setattr(whatsapp_service, "resolve_agent", lambda db, message: (type("Agent", (), {"id": "agent-1"}), None))
+    monkeypatch.setattr(database, "SessionLocal", FakeSession)
+    monkeypatch.setattr(ConversationService, "process_message", staticmethod(process_message))
+
+    # Dois workers (dispatchers distintos, memórias de dedupe separadas)
+    first, second = WhatsAppDispatcher(client=StubClient()), WhatsAppDispatcher(client=StubClient())
+    message = inbound("wamid.1", text="cadê meu pedido?")
+    asyncio.run(first.handle(message))
+    asyncio.run(second.handle(message))
+
+    assert claimed == {"whatsapp:wamid.1"}
+    assert turns == ["cadê meu pedido?"]
+    assert first.client.sent == [("5511999990001", "Seu pedido chega amanhã.")]
+    assert second.client.sent == []